@@ -0,0 +1,116 @@
+from __future__ import annotations
+from typing import BinaryIO, Iterator, Tuple
+
+import os
+import bz2
+import gzip
+import lzma
+import tarfile
+import zipfile
+
+from session import SessionTypeForPath
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Suffixes of the tar and zip archives scanned by IterSessionStreams. Tar
+# archives can be compressed with gzip, bzip2 or xz.
+kTarSuffixes = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz', '.tbz2', '.tar.xz', '.txz')
+kZipSuffixes = ('.zip',)
+
+# Opens a decompressing stream over a stream, per suffix of compressed
+# session files. Closing the decompressing stream does not close the stream.
+kCompressedSuffixes = {
+  '.gz' : lambda stream: gzip.GzipFile(fileobj=stream, mode='rb'),
+  '.bz2' : bz2.BZ2File,
+  '.xz' : lzma.LZMAFile,
+  '.lzma' : lzma.LZMAFile,
+}
+
+# Exceptions raised while reading a damaged or truncated archive or compressed
+# file (gzip.BadGzipFile is an OSError).
+kArchiveReadErrors = (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile, lzma.LZMAError)
+
+# Returns true if |path| names a tar or zip archive.
+def IsArchivePath(path : str) -> bool:
+  name = os.path.basename(path).lower()
+  return name.endswith(kTarSuffixes) or name.endswith(kZipSuffixes)
+
+# Returns true if |path| names a compressed file that is not an archive.
+def IsCompressedPath(path : str) -> bool:
+  return not IsArchivePath(path) and os.path.splitext(path)[1].lower() in kCompressedSuffixes
+
+# Returns |path| without its compression suffix, e.g. "Current Session" for
+# "Current Session.gz".
+def StripCompressedSuffix(path : str) -> str:
+  root, suffix = os.path.splitext(path)
+  if suffix.lower() in kCompressedSuffixes:
+    return root
+  return path
+
+# Returns |stream| (the contents of the file |name|), wrapped in a
+# decompressing stream if |name| has a compression suffix. Data is
+# decompressed as it is read, one chunk at a time.
+def OpenDecompressingStream(stream : BinaryIO, name : str) -> BinaryIO:
+  open_stream = kCompressedSuffixes.get(os.path.splitext(name)[1].lower())
+  if open_stream is None:
+    return stream
+  return open_stream(stream)
+
+# Returns true if |name|, once its compression suffix is removed, is the name
+# of a session file.
+def _IsSessionFileName(name : str) -> bool:
+  return SessionTypeForPath(StripCompressedSuffix(name)) is not None
+
+# Yields a (name, stream) pair for each session file in the archive or
+# compressed file at |path|, where name is |path| followed by the name of the
+# member in the archive (or |path| itself for a compressed file) and stream
+# reads the decompressed contents of the file. Archive members are only
+# yielded if they are named as session files (optionally compressed) unless
+# |all_members| is set.
+#
+# Nothing is written to disk: members are decompressed on the fly as the
+# stream is read, tar archives are read in a single forward pass, and each
+# stream is closed when the next pair is requested, so memory stays bounded
+# by the decompressors' buffers.
+def IterSessionStreams(path : str, all_members : bool = False) -> Iterator[Tuple[str, BinaryIO]]:
+  name = os.path.basename(path).lower()
+  if name.endswith(kTarSuffixes):
+    with tarfile.open(path, 'r|*') as archive:
+      for member in archive:
+        if not member.isfile() or not (all_members or _IsSessionFileName(member.name)):
+          continue
+        with archive.extractfile(member) as member_stream, OpenDecompressingStream(member_stream, member.name) as stream:
+          yield (os.path.join(path, member.name), stream)
+  elif name.endswith(kZipSuffixes):
+    with zipfile.ZipFile(path) as archive:
+      for member in archive.infolist():
+        if member.is_dir() or not (all_members or _IsSessionFileName(member.filename)):
+          continue
+        with archive.open(member) as member_stream, OpenDecompressingStream(member_stream, member.filename) as stream:
+          yield (os.path.join(path, member.filename), stream)
+  else:
+    with open(path, 'rb') as file_stream, OpenDecompressingStream(file_stream, path) as stream:
+      yield (path, stream)
@@ -0,0 +1,42 @@
+# Measures reading only some fields of each navigation (--fields) against
+# reading whole records, on a synthetic session file with large content
+# states.
+
+import os
+import argparse
+import tempfile
+
+import benchutil
+from constants import SessionType, const
+from extract import IterNavigationRecords
+from synthetic import SyntheticSessionGenerator
+
+kProjections = (
+  ('all fields', None),
+  ('url', ('virtual_url',)),
+  ('url,title,transition', ('virtual_url', 'title', 'transition_type')),
+  ('referrer', ('referrer_url',)),
+)
+
+def main():
+  parser = argparse.ArgumentParser(description="Field projection benchmark")
+  parser.add_argument("--tabs", type=int, default=1000, help="Tabs in the session file")
+  parser.add_argument("--navigations", type=int, default=20, help="Navigations per tab")
+  parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per projection")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, const.kCurrentSessionFileName)
+    generator = SyntheticSessionGenerator(seed=1, windows=10, tabs_per_window=args.tabs // 10,
+                                          navigations_per_tab=args.navigations, content_state_size=(256, 4096))
+    generator.Write(path, SessionType.SESSION_RESTORE)
+
+    baseline = None
+    for name, fields in kProjections:
+      elapsed = benchutil.BestOf(lambda: list(IterNavigationRecords(path, SessionType.SESSION_RESTORE, fields=fields)), args.repeat)
+      if baseline is None:
+        baseline = elapsed
+      print("%-22s %8.3f s  %6.2fx" % (name, elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+  main()
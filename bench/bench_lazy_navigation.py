@@ -0,0 +1,36 @@
+# Measures the "just list URLs" workload with TabNavigation, which decodes
+# every field, and LazyTabNavigation, which only decodes what is accessed.
+
+import argparse
+
+import benchutil
+from chromepickle import Pickle, FastPickleIterator
+from tabnavigation import TabNavigation, LazyTabNavigation
+
+def ListUrls(pickles : list, navigation_class) -> int:
+  urls = 0
+  for data in pickles:
+    iterator = FastPickleIterator(Pickle(data))
+    status, tab_id = iterator.ReadInt()
+    navigation = navigation_class()
+    if status and navigation.ReadFromPickle(iterator):
+      urls += len(navigation.virtual_url())
+  return urls
+
+def main():
+  parser = argparse.ArgumentParser(description="LazyTabNavigation benchmark")
+  parser.add_argument("--count", type=int, default=100000, help="Number of navigations to decode")
+  parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per class")
+  args = parser.parse_args()
+
+  pickles = benchutil.NavigationPickles(args.count)
+  baseline = None
+  for navigation_class in (TabNavigation, LazyTabNavigation):
+    elapsed = benchutil.BestOf(lambda: ListUrls(pickles, navigation_class), args.repeat)
+    rate = args.count / elapsed
+    if baseline is None:
+      baseline = rate
+    print("%-20s %12.0f navigations/s  %6.2fx" % (navigation_class.__name__, rate, rate / baseline))
+
+if __name__ == "__main__":
+  main()
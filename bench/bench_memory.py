@@ -0,0 +1,41 @@
+# Reports the memory held per navigation when a synthetic session's
+# navigations are kept in memory, for each navigation class.
+
+import argparse
+import tracemalloc
+
+import benchutil
+from chromepickle import Pickle, FastPickleIterator
+from session import SessionCommand
+from tabnavigation import TabNavigation, LazyTabNavigation
+
+def HoldNavigations(pickles : list, navigation_class) -> list:
+  navigations = []
+  for data in pickles:
+    command = SessionCommand(1, data)
+    iterator = FastPickleIterator(command.PayloadAsPickle())
+    status, tab_id = iterator.ReadInt()
+    navigation = navigation_class()
+    if status and navigation.ReadFromPickle(iterator):
+      # Touch the fields the command line tool prints.
+      navigation.title()
+      navigation.virtual_url()
+      navigations.append(navigation)
+  return navigations
+
+def main():
+  parser = argparse.ArgumentParser(description="Navigation memory benchmark")
+  parser.add_argument("--count", type=int, default=100000, help="Number of navigations to hold in memory")
+  args = parser.parse_args()
+
+  pickles = benchutil.NavigationPickles(args.count)
+  for navigation_class in (TabNavigation, LazyTabNavigation):
+    tracemalloc.start()
+    navigations = HoldNavigations(pickles, navigation_class)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-20s %10.1f bytes/navigation  (peak %.1f MiB)" % (navigation_class.__name__, current / len(navigations), peak / (1024.0 * 1024.0)))
+    del navigations
+
+if __name__ == "__main__":
+  main()
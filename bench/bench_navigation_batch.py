@@ -0,0 +1,51 @@
+# Compares decoding the navigations of a session file into TabNavigation
+# objects with decoding them into NavigationBatch columns.
+
+import os
+import argparse
+import tempfile
+
+import benchutil
+from chromepickle import FastPickleIterator
+from session import MappedSessionFileReader
+from constants import SessionType, const
+from tabnavigation import TabNavigation
+from navigationbatch import NavigationBatch
+
+def DecodeObjects(path : str) -> int:
+  reader = MappedSessionFileReader(path)
+  navigations = []
+  for command in reader.IterCommands(SessionType.TAB_RESTORE):
+    if command.command_id() == const.TabNavigation_kCommandUpdateTabNavigation:
+      iterator = FastPickleIterator(command.PayloadAsPickle())
+      status, tab_id = iterator.ReadInt()
+      navigation = TabNavigation()
+      if status and navigation.ReadFromPickle(iterator):
+        navigations.append((tab_id, navigation))
+  return len(navigations)
+
+def DecodeColumns(path : str) -> int:
+  reader = MappedSessionFileReader(path)
+  batch = NavigationBatch()
+  batch.DecodeFile(reader, SessionType.TAB_RESTORE)
+  return batch.size()
+
+def main():
+  parser = argparse.ArgumentParser(description="NavigationBatch decode benchmark")
+  parser.add_argument("--count", type=int, default=100000, help="Number of navigations in the session file")
+  parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per decoder")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'Current Tabs')
+    benchutil.WriteNavigationFile(path, benchutil.NavigationPickles(args.count))
+    baseline = None
+    for name, decode in (('TabNavigation', DecodeObjects), ('NavigationBatch', DecodeColumns)):
+      elapsed = benchutil.BestOf(lambda: decode(path), args.repeat)
+      rate = args.count / elapsed
+      if baseline is None:
+        baseline = rate
+      print("%-20s %12.0f navigations/s  %6.2fx" % (name, rate, rate / baseline))
+
+if __name__ == "__main__":
+  main()
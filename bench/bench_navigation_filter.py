@@ -0,0 +1,48 @@
+# Measures a selective "navigations on one host" scan with the filter applied
+# right after the URL is read, against reading every navigation in full and
+# filtering the records afterwards.
+
+import os
+import argparse
+import tempfile
+
+import benchutil
+from constants import SessionType, const
+from extract import IterNavigationRecords
+from navigationfilter import NavigationFilter
+from synthetic import SyntheticSessionGenerator
+
+def main():
+  parser = argparse.ArgumentParser(description="NavigationFilter benchmark")
+  parser.add_argument("--tabs", type=int, default=1000, help="Tabs in the session file")
+  parser.add_argument("--navigations", type=int, default=20, help="Navigations per tab")
+  parser.add_argument("--host", default="host1?.example.com", help="Host glob of the scan")
+  parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs")
+  args = parser.parse_args()
+
+  navigation_filter = NavigationFilter([args.host])
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, const.kCurrentSessionFileName)
+    generator = SyntheticSessionGenerator(seed=1, windows=10, tabs_per_window=args.tabs // 10,
+                                          navigations_per_tab=args.navigations, content_state_size=(0, 1024))
+    generator.Write(path, SessionType.SESSION_RESTORE)
+
+    def PostFilter():
+      return [record for record in IterNavigationRecords(path, SessionType.SESSION_RESTORE) if navigation_filter.MatchesRecord(record)]
+    def Pushdown():
+      return list(IterNavigationRecords(path, SessionType.SESSION_RESTORE, navigation_filter=navigation_filter))
+
+    total = len(list(IterNavigationRecords(path, SessionType.SESSION_RESTORE)))
+    matched = len(Pushdown())
+    if PostFilter() != Pushdown():
+      raise SystemExit("filtered records differ")
+    print("%d of %d navigations match %s" % (matched, total, args.host))
+    baseline = None
+    for name, fn in (("post-filter", PostFilter), ("pushdown", Pushdown)):
+      elapsed = benchutil.BestOf(fn, args.repeat)
+      if baseline is None:
+        baseline = elapsed
+      print("%-12s %8.3f s  %6.2fx" % (name, elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,47 @@
+# Measures how decoding the navigations of one large "Last Session" file
+# scales with the number of worker processes, against the sequential reader.
+
+import os
+import argparse
+import tempfile
+
+import benchutil
+from constants import SessionType, const
+from extract import ExtractFileParallel, IterNavigationRecords
+from synthetic import SyntheticSessionGenerator
+
+def main():
+  parser = argparse.ArgumentParser(description="Single file parallel decode benchmark")
+  parser.add_argument("--tabs", type=int, default=2000, help="Tabs in the session file")
+  parser.add_argument("--navigations", type=int, default=50, help="Navigations per tab")
+  parser.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts to time (default: 1, 2, 4, ... up to the number of CPUs)")
+  parser.add_argument("--spans-per-task", type=int, default=4096, help="Commands decoded per worker task")
+  parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per worker count")
+  args = parser.parse_args()
+
+  workers = args.workers
+  if workers is None:
+    workers = [1]
+    while workers[-1] * 2 <= (os.cpu_count() or 1):
+      workers.append(workers[-1] * 2)
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, const.kLastSessionFileName)
+    generator = SyntheticSessionGenerator(seed=1, windows=10, tabs_per_window=args.tabs // 10,
+                                          navigations_per_tab=args.navigations, content_state_size=(0, 256))
+    generator.Write(path, SessionType.SESSION_RESTORE)
+    print("%s: %.1f MiB" % (const.kLastSessionFileName, os.path.getsize(path) / (1024.0 * 1024.0)))
+
+    expected = list(IterNavigationRecords(path, SessionType.SESSION_RESTORE))
+    elapsed = benchutil.BestOf(lambda: list(IterNavigationRecords(path, SessionType.SESSION_RESTORE)), args.repeat)
+    baseline = elapsed
+    print("%-11s %8.3f s  %6.2fx" % ("sequential", elapsed, 1.0))
+    for count in workers:
+      records = list(ExtractFileParallel(path, SessionType.SESSION_RESTORE, count, args.spans_per_task))
+      if records != expected:
+        raise SystemExit("%d workers: records differ from the sequential reader" % (count,))
+      elapsed = benchutil.BestOf(lambda: list(ExtractFileParallel(path, SessionType.SESSION_RESTORE, count, args.spans_per_task)), args.repeat)
+      print("%3d workers %8.3f s  %6.2fx" % (count, elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,51 @@
+# Measures how extracting many profiles scales with the number of worker
+# processes, on a synthetic corpus of profile directories.
+
+import os
+import argparse
+import tempfile
+
+import benchutil
+from constants import const
+from extract import FindSessionFiles, ExtractFiles, kSessionFileNames
+
+def WriteCorpus(directory : str, profiles : int, navigations : int):
+  pickles = benchutil.NavigationPickles(navigations)
+  for profile in range(profiles):
+    profile_directory = os.path.join(directory, 'Profile %d' % (profile,))
+    os.makedirs(profile_directory)
+    for name in (const.kCurrentTabSessionFileName, const.kLastTabSessionFileName):
+      benchutil.WriteNavigationFile(os.path.join(profile_directory, name), pickles)
+
+def ExtractAll(paths : list, workers : int) -> int:
+  records = 0
+  for path, status, file_records in ExtractFiles(paths, workers):
+    records += len(file_records)
+  return records
+
+def main():
+  parser = argparse.ArgumentParser(description="Parallel extraction benchmark")
+  parser.add_argument("--profiles", type=int, default=64, help="Number of synthetic profiles")
+  parser.add_argument("--navigations", type=int, default=2000, help="Navigations per session file")
+  parser.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts to time (default: 1, 2, 4, ... up to the number of CPUs)")
+  parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per worker count")
+  args = parser.parse_args()
+
+  workers = args.workers
+  if workers is None:
+    workers = [1]
+    while workers[-1] * 2 <= (os.cpu_count() or 1):
+      workers.append(workers[-1] * 2)
+
+  with tempfile.TemporaryDirectory() as directory:
+    WriteCorpus(directory, args.profiles, args.navigations)
+    paths = FindSessionFiles([directory])
+    baseline = None
+    for count in workers:
+      elapsed = benchutil.BestOf(lambda: ExtractAll(paths, count), args.repeat)
+      if baseline is None:
+        baseline = elapsed
+      print("%3d workers %8.3f s  %6.2fx" % (count, elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+  main()
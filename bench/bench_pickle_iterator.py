@@ -0,0 +1,36 @@
+# Measures per-navigation decode throughput of TabNavigation.ReadFromPickle
+# with PickleIterator and with FastPickleIterator.
+
+import argparse
+
+import benchutil
+from chromepickle import Pickle, PickleIterator, FastPickleIterator
+from tabnavigation import TabNavigation
+
+def DecodeAll(pickles : list, iterator_class) -> int:
+  decoded = 0
+  for data in pickles:
+    iterator = iterator_class(Pickle(data))
+    status, tab_id = iterator.ReadInt()
+    navigation = TabNavigation()
+    if status and navigation.ReadFromPickle(iterator):
+      decoded += 1
+  return decoded
+
+def main():
+  parser = argparse.ArgumentParser(description="PickleIterator decode benchmark")
+  parser.add_argument("--count", type=int, default=100000, help="Number of navigations to decode")
+  parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per iterator")
+  args = parser.parse_args()
+
+  pickles = benchutil.NavigationPickles(args.count)
+  baseline = None
+  for iterator_class in (PickleIterator, FastPickleIterator):
+    elapsed = benchutil.BestOf(lambda: DecodeAll(pickles, iterator_class), args.repeat)
+    rate = args.count / elapsed
+    if baseline is None:
+      baseline = rate
+    print("%-20s %12.0f navigations/s  %6.2fx" % (iterator_class.__name__, rate, rate / baseline))
+
+if __name__ == "__main__":
+  main()
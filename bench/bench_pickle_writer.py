@@ -0,0 +1,57 @@
+# Measures Pickle write throughput for TabNavigation-shaped records: the tab
+# id followed by TabNavigation.WriteToPickle, as in a kCommandUpdateTabNavigation
+# command. The written pickles are checked against the reference layout.
+
+import argparse
+
+import benchutil
+from chromepickle import Pickle, FastPickleIterator
+from tabnavigation import TabNavigation
+
+# Decodes the pickles returned by benchutil.NavigationPickles into
+# (tab_id, navigation) pairs to write back.
+def Records(pickles : list) -> list:
+  records = []
+  for data in pickles:
+    iterator = FastPickleIterator(Pickle(data))
+    status, tab_id = iterator.ReadInt()
+    navigation = TabNavigation()
+    if not status or not navigation.ReadFromPickle(iterator):
+      raise ValueError("could not decode benchmark pickle")
+    records.append((tab_id, navigation))
+  return records
+
+def WriteRecords(records : list) -> list:
+  pickles = []
+  for tab_id, navigation in records:
+    pickle = Pickle()
+    pickle.WriteInt(tab_id)
+    navigation.WriteToPickle(pickle)
+    pickles.append(pickle)
+  return pickles
+
+def WriteInts(count : int) -> Pickle:
+  pickle = Pickle()
+  for i in range(count):
+    pickle.WriteInt(i)
+  return pickle
+
+def main():
+  parser = argparse.ArgumentParser(description="Pickle writer benchmark")
+  parser.add_argument("--count", type=int, default=100000, help="Number of navigations to write")
+  parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs")
+  args = parser.parse_args()
+
+  pickles = benchutil.NavigationPickles(args.count)
+  records = Records(pickles)
+  for data, pickle in zip(pickles, WriteRecords(records)):
+    if bytes(pickle.data()[0:pickle.size()]) != data:
+      raise ValueError("written pickle differs from the reference layout")
+
+  elapsed = benchutil.BestOf(lambda: WriteRecords(records), args.repeat)
+  print("%-20s %12.0f pickles/s" % ("TabNavigation", args.count / elapsed))
+  elapsed = benchutil.BestOf(lambda: WriteInts(args.count), args.repeat)
+  print("%-20s %12.0f ints/s" % ("WriteInt", args.count / elapsed))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,71 @@
+# Measures writing navigations with SessionFileWriter and reading them back
+# with SessionFileReader, comparing batched writes against flushing after
+# every command.
+
+import os
+import argparse
+import random
+import tempfile
+
+import benchutil
+from chromepickle import FastPickleIterator
+from constants import SessionType, const
+from session import SessionFileReader, SessionFileWriter
+from tabnavigation import TabNavigation, Referrer, CreateUpdateTabNavigationCommand
+
+# Returns |count| navigations with a deterministic mix of URL, title and
+# content state sizes.
+def Navigations(count : int, seed : int = 0) -> list:
+  rng = random.Random(seed)
+  navigations = []
+  for i in range(count):
+    navigation = TabNavigation()
+    navigation.set_index(i % 10)
+    host = 'host%d.example.com' % (rng.randrange(1000),)
+    path = '/'.join('segment%d' % (rng.randrange(100),) for _ in range(rng.randrange(1, 8)))
+    navigation.set_virtual_url('https://%s/%s?q=%d' % (host, path, i))
+    navigation.set_title('Page title %d %s' % (i, 'x' * rng.randrange(80)))
+    navigation.set_content_state(bytes(rng.randrange(2048)))
+    navigation.set_referrer(Referrer('https://referrer.example.com/', 1))
+    navigation.set_original_request_url(navigation.virtual_url())
+    navigations.append(navigation)
+  return navigations
+
+def Write(path : str, navigations : list, buffer_size : int):
+  writer = SessionFileWriter(path, buffer_size=buffer_size)
+  for i, navigation in enumerate(navigations):
+    writer.AppendCommand(CreateUpdateTabNavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, i // 10, navigation))
+  writer.Close()
+
+def Read(path : str) -> int:
+  reader = SessionFileReader(path)
+  count = 0
+  for command in reader.IterCommands(SessionType.TAB_RESTORE):
+    iterator = FastPickleIterator(command.PayloadAsPickle())
+    iterator.ReadInt()
+    navigation = TabNavigation()
+    if navigation.ReadFromPickle(iterator):
+      count += 1
+  reader.Close()
+  return count
+
+def main():
+  parser = argparse.ArgumentParser(description="SessionFileWriter round trip benchmark")
+  parser.add_argument("--count", type=int, default=20000, help="Number of navigations to write")
+  parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per step")
+  args = parser.parse_args()
+
+  navigations = Navigations(args.count)
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, const.kCurrentTabSessionFileName)
+    for name, buffer_size in (("unbatched", 0), ("batched", const.kFileWriteBufferSize)):
+      write = benchutil.BestOf(lambda: Write(path, navigations, buffer_size), args.repeat)
+      megabytes = os.path.getsize(path) / (1024 * 1024)
+      read = benchutil.BestOf(lambda: Read(path), args.repeat)
+      if Read(path) != args.count:
+        raise ValueError("round trip lost navigations")
+      print("%-10s %7.1f MB  write %7.1f MB/s  read %7.1f MB/s  round trip %7.1f MB/s" %
+            (name, megabytes, megabytes / write, megabytes / read, megabytes / (write + read)))
+
+if __name__ == "__main__":
+  main()
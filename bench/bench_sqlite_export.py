@@ -0,0 +1,53 @@
+# Measures SQLiteExporter rows/s when exporting a synthetic corpus of profiles
+# into one database, for several executemany batch sizes.
+
+import os
+import argparse
+import tempfile
+
+import benchutil
+from constants import SessionType, const
+from sqliteexport import SQLiteExporter, kDefaultBatchSize
+from synthetic import SyntheticSessionGenerator
+
+def WriteCorpus(directory : str, profiles : int, tabs : int) -> list:
+  paths = []
+  for profile in range(profiles):
+    profile_directory = os.path.join(directory, 'Profile %d' % (profile,))
+    os.makedirs(profile_directory)
+    generator = SyntheticSessionGenerator(seed=profile, windows=2, tabs_per_window=tabs // 2, navigations_per_tab=10, content_state_size=(0, 256))
+    for name, session_type in ((const.kCurrentSessionFileName, SessionType.SESSION_RESTORE),
+                               (const.kCurrentTabSessionFileName, SessionType.TAB_RESTORE)):
+      path = os.path.join(profile_directory, name)
+      generator.Write(path, session_type)
+      paths.append(path)
+  return paths
+
+def Export(paths : list, database_path : str, batch_size : int) -> int:
+  for suffix in ('', '-wal', '-shm'):
+    if os.path.exists(database_path + suffix):
+      os.remove(database_path + suffix)
+  exporter = SQLiteExporter(database_path, batch_size)
+  for path in paths:
+    exporter.AddFile(path)
+  exporter.Close()
+  return exporter.row_count()
+
+def main():
+  parser = argparse.ArgumentParser(description="SQLite export benchmark")
+  parser.add_argument("--profiles", type=int, default=20, help="Number of synthetic profiles")
+  parser.add_argument("--tabs", type=int, default=200, help="Tabs per session file")
+  parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, kDefaultBatchSize], help="executemany batch sizes to time")
+  parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per batch size")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    paths = WriteCorpus(directory, args.profiles, args.tabs)
+    database_path = os.path.join(directory, 'tabs.db')
+    for batch_size in args.batch_sizes:
+      rows = Export(paths, database_path, batch_size)
+      elapsed = benchutil.BestOf(lambda: Export(paths, database_path, batch_size), args.repeat)
+      print("batch %-8d %10d rows  %10.0f rows/s" % (batch_size, rows, rows / elapsed))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,218 @@
+# Times each stage of the read pipeline on synthetic files of several sizes
+# and reports the results as JSON, to track regressions between versions.
+#
+# The stages are cumulative: each one streams the file through the stages
+# before it and adds its own work, so that memory stays bounded on large
+# files. stage_seconds is the difference to the stage before it in kStages,
+# or null if that stage was not run; framing has nothing before it and main
+# is timed on its own, so their stage_seconds is their total. The print stage
+# times its PrintNavigation calls directly instead, since the difference of
+# two best-of times is too noisy for the small cost of printing.
+#
+#   framing     SessionFileReader header check and command framing
+#   pickle      + a Pickle over each command's contents
+#   primitives  + PickleIterator reads of each navigation's fields
+#   navigation  + TabNavigation.ReadFromPickle instead of the plain reads
+#   print       + PrintNavigation of each navigation
+#   main        chrometabs.main() end to end
+#
+# Every (size, stage) pair runs in its own process so that the reported peak
+# RSS belongs to that stage alone.
+
+import os
+import sys
+import json
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import contextlib
+from typing import Tuple
+from timeit import default_timer as timer
+
+import benchutil
+import chrometabs
+from chromepickle import FastPickleIterator
+from constants import SessionType, const
+from session import SessionFileReader
+from synthetic import SyntheticSessionGenerator
+from tabnavigation import TabNavigation
+
+kStages = ('framing', 'pickle', 'primitives', 'navigation', 'print', 'main')
+
+# Navigations per synthetic tab and most tabs per window; files are sized by
+# their number of tabs.
+_kTabsPerWindow = 50
+_kNavigationsPerTab = 10
+
+def ParseSize(value : str) -> int:
+  units = {'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30}
+  if value[-1:].upper() in units:
+    return int(float(value[:-1]) * units[value[-1:].upper()])
+  return int(value)
+
+def Generator(tabs : int, seed : int) -> SyntheticSessionGenerator:
+  windows = (tabs + _kTabsPerWindow - 1) // _kTabsPerWindow
+  tabs_per_window = (tabs + windows - 1) // windows
+  return SyntheticSessionGenerator(seed, windows, tabs_per_window, _kNavigationsPerTab, legacy_rate=0.05)
+
+# Writes a tabs file of about |size| bytes into |directory|, unless an earlier
+# run already did, and returns its path.
+def SyntheticFile(directory : str, size : int, seed : int) -> str:
+  path = os.path.join(directory, 'tabs-%d-%d' % (size, seed))
+  if not os.path.isfile(path):
+    Generator(1, seed).Write(path, SessionType.TAB_RESTORE)
+    tabs = max(1, round(size / os.path.getsize(path)))
+    Generator(tabs, seed).Write(path, SessionType.TAB_RESTORE)
+  return path
+
+def PeakRSS() -> int:
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kilobytes, macOS bytes.
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+# Runs |stage| over the file at |path|. Returns the number of commands and,
+# for the print stage, the seconds spent in PrintNavigation (None otherwise).
+def RunStage(stage : str, path : str, output) -> Tuple[int, float]:
+  if stage == 'main':
+    argv = sys.argv
+    sys.argv = ['chrometabs.py', '--path', path]
+    try:
+      with contextlib.redirect_stdout(output):
+        chrometabs.main()
+    finally:
+      sys.argv = argv
+    return (0, None)
+
+  # stdout is redirected once for the whole file, as chrometabs.main() writes
+  # to it, so the print stage has no per-navigation redirection cost.
+  with contextlib.redirect_stdout(output):
+    return _ReadStages(stage, path)
+
+def _ReadStages(stage : str, path : str) -> Tuple[int, float]:
+  reader = SessionFileReader(path)
+  count = 0
+  print_seconds = 0.0
+  for command in reader.IterCommands(SessionType.TAB_RESTORE):
+    count += 1
+    if stage == 'framing':
+      continue
+    pickle = command.PayloadAsPickle()
+    if stage == 'pickle' or command.command_id() != const.TabNavigation_kCommandUpdateTabNavigation:
+      continue
+    iterator = FastPickleIterator(pickle)
+    iterator.ReadInt()
+    if stage == 'primitives':
+      iterator.ReadInt()
+      iterator.ReadString()
+      iterator.ReadString16()
+      iterator.ReadBinaryString()
+      iterator.ReadInt()
+      if iterator.ReadInt()[0]:
+        iterator.ReadString()
+        iterator.ReadInt()
+        iterator.ReadString()
+        iterator.ReadBool()
+      continue
+    navigation = TabNavigation()
+    if navigation.ReadFromPickle(iterator) and stage == 'print':
+      start = timer()
+      chrometabs.PrintNavigation(navigation)
+      print_seconds += timer() - start
+  reader.Close()
+  return (count, print_seconds if stage == 'print' else None)
+
+# Entry point of the per-stage child process; prints its result as JSON. The
+# print stage also reports the best of its PrintNavigation times.
+def RunChild(stage : str, path : str, repeat : int):
+  print_seconds = []
+  def Run():
+    print_seconds.append(RunStage(stage, path, output)[1])
+  with open(os.devnull, 'w') as output:
+    count = RunStage(stage, path, output)[0]
+    seconds = benchutil.BestOf(Run, repeat)
+  result = {'commands' : count, 'seconds' : seconds, 'peak_rss_bytes' : PeakRSS()}
+  if stage == 'print':
+    result['print_seconds'] = min(print_seconds)
+  print(json.dumps(result))
+
+def CountCommands(path : str) -> int:
+  return RunStage('framing', path, None)[0]
+
+# Returns the stage_seconds of |stage| (see the top of the file), given the
+# seconds of the stages already timed on the same file.
+def StageSeconds(stage : str, result : dict, stage_totals : dict) -> float:
+  if stage == 'print':
+    return result['print_seconds']
+  position = kStages.index(stage)
+  if stage == 'main' or position == 0:
+    return result['seconds']
+  previous = stage_totals.get(kStages[position - 1])
+  if previous is None:
+    return None
+  return result['seconds'] - previous
+
+def main():
+  parser = argparse.ArgumentParser(description="Pipeline stage benchmark")
+  parser.add_argument("--sizes", nargs="+", default=["64K", "1M", "16M"], help="File sizes to time, with an optional K, M or G suffix (default: 64K 1M 16M)")
+  parser.add_argument("--stages", nargs="+", choices=kStages, default=list(kStages), help="Stages to time (default: all)")
+  parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per stage")
+  parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic files")
+  parser.add_argument("--data-dir", default=None, help="Directory keeping the synthetic files between runs (default: a temporary directory)")
+  parser.add_argument("--label", default=None, help="Label stored with the results, e.g. the version being measured")
+  parser.add_argument("--output", default=None, help="File to write the JSON results to (default: stdout)")
+  parser.add_argument("--run-stage", nargs=2, metavar=("STAGE", "PATH"), help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.run_stage is not None:
+    RunChild(args.run_stage[0], args.run_stage[1], args.repeat)
+    return
+
+  with contextlib.ExitStack() as stack:
+    directory = args.data_dir
+    if directory is None:
+      directory = stack.enter_context(tempfile.TemporaryDirectory())
+    else:
+      os.makedirs(directory, exist_ok=True)
+
+    results = []
+    for size in args.sizes:
+      path = SyntheticFile(directory, ParseSize(size), args.seed)
+      file_size = os.path.getsize(path)
+      commands = CountCommands(path)
+      stage_totals = {}
+      # Stages run in kStages order, so each one's previous stage is timed
+      # before it.
+      for stage in sorted(set(args.stages), key=kStages.index):
+        child = subprocess.run([sys.executable, '-B', os.path.abspath(__file__), '--repeat', str(args.repeat), '--run-stage', stage, path],
+                               check=True, capture_output=True, text=True)
+        result = json.loads(child.stdout)
+        seconds = result['seconds']
+        stage_totals[stage] = seconds
+        results.append({
+          'size_bytes' : file_size,
+          'stage' : stage,
+          'commands' : commands,
+          'seconds' : seconds,
+          'stage_seconds' : StageSeconds(stage, result, stage_totals),
+          'commands_per_second' : commands / seconds,
+          'mb_per_second' : file_size / (1024 * 1024) / seconds,
+          'peak_rss_bytes' : result['peak_rss_bytes'],
+        })
+
+  report = {
+    'label' : args.label,
+    'python' : platform.python_version(),
+    'platform' : platform.platform(),
+    'results' : results,
+  }
+  if args.output is None:
+    json.dump(report, sys.stdout, indent=2)
+    print()
+  else:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,73 @@
+# Measures the memory and decode time saved by reading navigations through a
+# StringPool, on a synthetic profile whose "Current Session" and
+# "Last Session" largely hold the same tabs, as they do after a restart, and
+# the size of the records of a file as pickled back by the workers of
+# extract.ExtractFiles.
+
+import os
+import pickle
+import argparse
+import tempfile
+import tracemalloc
+
+import benchutil
+from chromepickle import StringPool
+from constants import SessionType, const
+from session import SessionFileReader
+from sessionmodel import SessionModelBuilder
+from synthetic import SyntheticSessionGenerator
+from tabnavigation import TabNavigation
+from extract import IterNavigationRecords
+
+# Reads every file in |paths| into a SessionModel with TabNavigations, sharing
+# one StringPool across the files if |interning| is set.
+def BuildModels(paths : list, interning : bool) -> list:
+  string_pool = StringPool() if interning else None
+  models = []
+  for path in paths:
+    reader = SessionFileReader(path)
+    builder = SessionModelBuilder(SessionType.SESSION_RESTORE, TabNavigation, string_pool)
+    builder.AddCommands(reader.IterCommands(SessionType.SESSION_RESTORE))
+    reader.Close()
+    models.append(builder.model())
+  return models
+
+def main():
+  parser = argparse.ArgumentParser(description="StringPool benchmark")
+  parser.add_argument("--tabs", type=int, default=500, help="Tabs per session file")
+  parser.add_argument("--navigations", type=int, default=20, help="Navigations per tab")
+  parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    paths = []
+    for name in (const.kCurrentSessionFileName, const.kLastSessionFileName):
+      path = os.path.join(directory, name)
+      generator = SyntheticSessionGenerator(seed=1, windows=5, tabs_per_window=args.tabs // 5,
+                                            navigations_per_tab=args.navigations, content_state_size=(0, 64))
+      generator.Write(path, SessionType.SESSION_RESTORE)
+      paths.append(path)
+
+    results = {}
+    for interning in (False, True):
+      tracemalloc.start()
+      models = BuildModels(paths, interning)
+      memory = tracemalloc.get_traced_memory()[0]
+      tracemalloc.stop()
+      del models
+      elapsed = benchutil.BestOf(lambda: BuildModels(paths, interning), args.repeat)
+      results[interning] = (memory, elapsed)
+      print("%-12s %8.1f MiB held  %8.3f s" % ("interned" if interning else "plain", memory / (1024.0 * 1024.0), elapsed))
+
+    (plain_memory, plain_time), (interned_memory, interned_time) = results[False], results[True]
+    print("saved        %8.1f MiB (%.0f%%)  %8.3f s (%.0f%%)" %
+          ((plain_memory - interned_memory) / (1024.0 * 1024.0), 100.0 * (plain_memory - interned_memory) / plain_memory,
+           plain_time - interned_time, 100.0 * (plain_time - interned_time) / plain_time))
+
+    for interning in (False, True):
+      records = list(IterNavigationRecords(paths[0], SessionType.SESSION_RESTORE, string_pool=StringPool() if interning else None))
+      size = len(pickle.dumps(records, pickle.HIGHEST_PROTOCOL))
+      print("%-12s %8.1f MiB pickled records" % ("interned" if interning else "plain", size / (1024.0 * 1024.0)))
+
+if __name__ == "__main__":
+  main()
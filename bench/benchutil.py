@@ -0,0 +1,81 @@
+# Shared helpers for the chrometabs benchmarks.
+#
+# The benchmarks are run as scripts from the repository root, e.g.
+#
+#   python3 -B bench/bench_pickle_iterator.py
+#
+# so the repository modules are made importable here.
+
+import os
+import sys
+import struct
+import random
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+_kUTF16Codec = 'utf-16-be' if sys.byteorder == "big" else 'utf-16-le'
+
+def _Align(data : bytes) -> bytes:
+  return data + bytes((4 - len(data) % 4) % 4)
+
+def _PackString(value : str) -> bytes:
+  data = value.encode('utf-8')
+  return struct.pack(_kByteOrder + 'i', len(data)) + _Align(data)
+
+def _PackString16(value : str) -> bytes:
+  data = value.encode(_kUTF16Codec)
+  return struct.pack(_kByteOrder + 'i', len(data) // 2) + _Align(data)
+
+def _PackBinaryString(data : bytes) -> bytes:
+  return struct.pack(_kByteOrder + 'i', len(data)) + _Align(data)
+
+# Returns the Pickle data (header + payload) of a kCommandUpdateTabNavigation
+# command, laid out as TabNavigation.ReadFromPickle expects it.
+def NavigationPickleData(tab_id : int, index : int, url : str, title : str, content_state : bytes = b'') -> bytes:
+  payload = struct.pack(_kByteOrder + 'ii', tab_id, index)
+  payload += _PackString(url)
+  payload += _PackString16(title)
+  payload += _PackBinaryString(content_state)
+  payload += struct.pack(_kByteOrder + 'ii', 0, 0)
+  payload += _PackString('https://referrer.example.com/')
+  payload += struct.pack(_kByteOrder + 'i', 1)
+  payload += _PackString(url)
+  payload += struct.pack(_kByteOrder + 'i', 0)
+  return struct.pack(_kByteOrder + 'I', len(payload)) + payload
+
+# Returns |count| navigation pickles with a deterministic mix of URL, title
+# and content state sizes.
+def NavigationPickles(count : int, seed : int = 0) -> list:
+  rng = random.Random(seed)
+  pickles = []
+  for i in range(count):
+    host = 'host%d.example.com' % (rng.randrange(1000),)
+    path = '/'.join('segment%d' % (rng.randrange(100),) for _ in range(rng.randrange(1, 8)))
+    url = 'https://%s/%s?q=%d' % (host, path, i)
+    title = 'Page title %d %s' % (i, 'x' * rng.randrange(80))
+    content_state = bytes(rng.randrange(2048))
+    pickles.append(NavigationPickleData(i // 10, i % 10, url, title, content_state))
+  return pickles
+
+# Calls |fn| |repeat| times and returns the best wall clock time in seconds.
+def BestOf(fn, repeat : int = 5) -> float:
+  best = None
+  for _ in range(repeat):
+    start = timer()
+    fn()
+    elapsed = timer() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+# Writes a session file holding kCommandUpdateTabNavigation commands for
+# |pickles|, as returned by NavigationPickles.
+def WriteNavigationFile(path : str, pickles : list):
+  from constants import const
+  with open(path, 'wb') as f:
+    f.write(struct.pack(_kByteOrder + 'II', const.kFileSignature, const.kFileCurrentVersion))
+    for data in pickles:
+      f.write(struct.pack(_kByteOrder + 'HB', len(data) + 1, const.TabNavigation_kCommandUpdateTabNavigation))
+      f.write(data)
@@ -79,7 +79,7 @@ class PickleIterator:
     read_from : int = self.GetReadPointerAndAdvance(SizeOf.UINT16)
     if read_from is None:
       return (False, False)
-    result : int = struct.unpack_from(self.byteorder_ + 'h', self.bytes_, read_from)
+    result : int = struct.unpack_from(self.byteorder_ + 'H', self.bytes_, read_from)
     return (True, result[0])
 
   def ReadUInt32(self) -> Tuple[bool, int]:
@@ -107,10 +107,10 @@ class PickleIterator:
   def ReadBinaryString(self) -> Tuple[bool, bytes]:
     status, length = self.ReadInt()
     if status == False:
-      return False
+      return (False, bytes())
     read_from : int = self.GetReadPointerAndAdvance(length)
     if read_from is None:
-      return False
+      return (False, bytes())
     
     if length != 0:
       return (True, self.bytes_[read_from : read_from + length].tobytes())
@@ -120,10 +120,10 @@ class PickleIterator:
   def ReadString(self) -> Tuple[bool, str]:
     status, length = self.ReadInt()
     if status == False:
-      return False
+      return (False, '')
     read_from : int = self.GetReadPointerAndAdvance(length)
     if read_from is None:
-      return False
+      return (False, '')
     
     if length != 0:
       return (True, self.bytes_[read_from : read_from + length].tobytes().decode('utf-8'))
@@ -133,10 +133,10 @@ class PickleIterator:
   def ReadWString(self) -> Tuple[bool, str]:
     status, length = self.ReadInt()
     if status == False:
-      return False
+      return (False, '')
     read_from : int = self.GetReadPointerAndAdvance(length, SizeOf.UINT32)
     if read_from is None:
-      return False
+      return (False, '')
     
     if length != 0:
       if self.byteorder_ == '<':
@@ -150,10 +150,10 @@ class PickleIterator:
   def ReadString16(self) -> Tuple[bool, str]:
     status, length = self.ReadInt()
     if status == False:
-      return False
+      return (False, '')
     read_from : int = self.GetReadPointerAndAdvance(length, SizeOf.UINT16)
     if read_from is None:
-      return False
+      return (False, '')
     
     if length != 0:
       if self.byteorder_ == '<':
@@ -164,6 +164,41 @@ class PickleIterator:
     else:
       return (True, '')
 
+  # Reads the length prefix of a string of |size_element| byte characters
+  # (1 for ReadString and ReadBinaryString, 2 for ReadString16) and skips
+  # over its contents without decoding them. On success the value is the
+  # (offset, size in bytes) of the contents within data(), so the string can
+  # be decoded later.
+  def ReadStringSpan(self, size_element : int = 1) -> Tuple[bool, Tuple[int, int]]:
+    status, length = self.ReadInt()
+    if status == False:
+      return (False, (0, 0))
+    read_from : int = self.GetReadPointerAndAdvance(length, size_element)
+    if read_from is None:
+      return (False, (0, 0))
+    return (True, (read_from, length * size_element))
+
+  # Skip over a string written by WriteString, WriteString16 or WriteData
+  # (read by ReadBinaryString) using only its length prefix, without copying
+  # or decoding its contents. Return false if the string is truncated.
+  def SkipString(self) -> bool:
+    return self.ReadStringSpan(SizeOf.UINT8)[0]
+
+  def SkipString16(self) -> bool:
+    return self.ReadStringSpan(SizeOf.UINT16)[0]
+
+  def SkipBinaryString(self) -> bool:
+    return self.ReadStringSpan(SizeOf.UINT8)[0]
+
+  # Returns the payload being read; offsets returned by ReadStringSpan are
+  # relative to it.
+  def data(self) -> memoryview:
+    return self.bytes_
+
+  # Returns the StringPool strings read are shared through, or None.
+  def string_pool(self) -> StringPool:
+    return None
+
   # Safer version of ReadInt() checks for the result not being negative.
   # Use it for reading the object sizes.
   def ReadLength(self) -> Tuple[bool, int]:
@@ -189,6 +224,235 @@ class PickleIterator:
 
     return self.ReadBytes(length)
 
+# Precompiled decoders for the fixed size types read by FastPickleIterator.
+# Like PickleIterator they use the native byte order with standard sizes.
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+_kBoolStruct = struct.Struct(_kByteOrder + '?')
+_kIntStruct = struct.Struct(_kByteOrder + 'i')
+_kLongStruct = struct.Struct(_kByteOrder + 'l')
+_kUInt16Struct = struct.Struct(_kByteOrder + 'H')
+_kUInt32Struct = struct.Struct(_kByteOrder + 'I')
+_kInt64Struct = struct.Struct(_kByteOrder + 'q')
+_kUInt64Struct = struct.Struct(_kByteOrder + 'Q')
+# Plain int sizes, to avoid IntEnum attribute lookups and arithmetic.
+_kSizeBool = int(SizeOf.BOOL)
+_kSizeInt = int(SizeOf.INT)
+_kSizeLong = int(SizeOf.LONG)
+_kSizeUInt16 = int(SizeOf.UINT16)
+_kSizeUInt32 = int(SizeOf.UINT32)
+_kSizeInt64 = int(SizeOf.INT64)
+_kSizeUInt64 = int(SizeOf.UINT64)
+_kUTF16Codec = 'utf-16-be' if sys.byteorder == "big" else 'utf-16-le'
+_kUTF32Codec = 'utf-32-be' if sys.byteorder == "big" else 'utf-32-le'
+
+# Results returned on failure; shared so that failed reads do not allocate.
+_kReadFailed = (False, False)
+_kReadStringFailed = (False, '')
+_kReadBytesFailed = (False, bytes())
+_kReadSpanFailed = (False, (0, 0))
+
+# Zero bytes written after a value of length n to keep the next one uint32
+# aligned, indexed by n % 4, and the number of them. Shared so that writes do
+# not allocate padding.
+_kPaddingBytes = (bytes(), bytes(3), bytes(2), bytes(1))
+_kPadding = (0, 3, 2, 1)
+
+# FastPickleIterator is a drop-in replacement for PickleIterator in hot
+# decode loops such as TabNavigation.ReadFromPickle. It returns the same
+# (status, value) results, but unpacks with the precompiled structs above,
+# inlines the bounds check and uint32 alignment of GetReadPointerAndAdvance,
+# and decodes strings straight from the payload memoryview without an
+# intermediate bytes copy.
+class FastPickleIterator(PickleIterator):
+  def ReadBool(self) -> Tuple[bool, bool]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeBool:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeUInt32
+    return (True, _kBoolStruct.unpack_from(self.bytes_, read_ptr)[0])
+
+  def ReadInt(self) -> Tuple[bool, int]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeInt:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeInt
+    return (True, _kIntStruct.unpack_from(self.bytes_, read_ptr)[0])
+
+  def ReadLong(self) -> Tuple[bool, int]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeLong:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeLong
+    return (True, _kLongStruct.unpack_from(self.bytes_, read_ptr)[0])
+
+  def ReadUInt16(self) -> Tuple[bool, int]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeUInt16:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeUInt32
+    return (True, _kUInt16Struct.unpack_from(self.bytes_, read_ptr)[0])
+
+  def ReadUInt32(self) -> Tuple[bool, int]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeUInt32:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeUInt32
+    return (True, _kUInt32Struct.unpack_from(self.bytes_, read_ptr)[0])
+
+  def ReadInt64(self) -> Tuple[bool, int]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeInt64:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeInt64
+    return (True, _kInt64Struct.unpack_from(self.bytes_, read_ptr)[0])
+
+  def ReadUInt64(self) -> Tuple[bool, int]:
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeUInt64:
+      return _kReadFailed
+    self.read_ptr_ = read_ptr + _kSizeUInt64
+    return (True, _kUInt64Struct.unpack_from(self.bytes_, read_ptr)[0])
+
+  # Reads the length prefix of a string of |size_element| byte characters and
+  # advances past its uint32 aligned contents. Returns the offset and size in
+  # bytes of the contents, or None if the string is truncated.
+  def _ReadStringBounds(self, size_element : int):
+    read_ptr = self.read_ptr_
+    if self.read_end_ptr_ - read_ptr < _kSizeInt:
+      return None
+    num_bytes = _kIntStruct.unpack_from(self.bytes_, read_ptr)[0] * size_element
+    read_ptr += _kSizeInt
+    self.read_ptr_ = read_ptr
+    if num_bytes < 0 or self.read_end_ptr_ - read_ptr < num_bytes:
+      return None
+    self.read_ptr_ = read_ptr + ((num_bytes + 3) & ~3)
+    return (read_ptr, num_bytes)
+
+  def ReadStringSpan(self, size_element : int = 1) -> Tuple[bool, Tuple[int, int]]:
+    bounds = self._ReadStringBounds(size_element)
+    if bounds is None:
+      return _kReadSpanFailed
+    return (True, bounds)
+
+  def SkipString(self) -> bool:
+    return self._ReadStringBounds(1) is not None
+
+  def SkipString16(self) -> bool:
+    return self._ReadStringBounds(_kSizeUInt16) is not None
+
+  def SkipBinaryString(self) -> bool:
+    return self._ReadStringBounds(1) is not None
+
+  def ReadBinaryString(self) -> Tuple[bool, bytes]:
+    bounds = self._ReadStringBounds(1)
+    if bounds is None:
+      return _kReadBytesFailed
+    read_from, num_bytes = bounds
+    return (True, self.bytes_[read_from : read_from + num_bytes].tobytes())
+
+  def ReadString(self) -> Tuple[bool, str]:
+    bounds = self._ReadStringBounds(1)
+    if bounds is None:
+      return _kReadStringFailed
+    read_from, num_bytes = bounds
+    return (True, str(self.bytes_[read_from : read_from + num_bytes], 'utf-8'))
+
+  def ReadWString(self) -> Tuple[bool, str]:
+    bounds = self._ReadStringBounds(_kSizeUInt32)
+    if bounds is None:
+      return _kReadStringFailed
+    read_from, num_bytes = bounds
+    return (True, str(self.bytes_[read_from : read_from + num_bytes], _kUTF32Codec))
+
+  def ReadString16(self) -> Tuple[bool, str]:
+    bounds = self._ReadStringBounds(_kSizeUInt16)
+    if bounds is None:
+      return _kReadStringFailed
+    read_from, num_bytes = bounds
+    return (True, str(self.bytes_[read_from : read_from + num_bytes], _kUTF16Codec))
+
+# StringPool -----------------------------------------------------------------
+
+# StringPool shares one str object between identical strings read by an
+# InterningPickleIterator. Referrers, original request URLs and hosts repeat
+# across the navigations of a tab and across tabs, so a pool used for a whole
+# file (or many files) keeps one copy of each, and skips decoding the repeats.
+#
+# Strings are keyed on their raw bytes, per encoding. Once |max_entries|
+# strings are pooled, new strings are decoded without being added.
+class StringPool:
+  def __init__(self, max_entries : int = 1 << 20):
+    self.max_entries_ = max_entries
+    self.strings_ = {}
+    self.strings16_ = {}
+    self.miss_count_ = 0
+
+  def __len__(self) -> int:
+    return len(self.strings_) + len(self.strings16_)
+
+  # Number of reads that decoded their string.
+  def miss_count(self) -> int:
+    return self.miss_count_
+
+  # Returns the str of the UTF-8 (|utf16| false) or UTF-16 bytes |raw|.
+  def Intern(self, raw, utf16 : bool = False) -> str:
+    strings = self.strings16_ if utf16 else self.strings_
+    key = bytes(raw)
+    value = strings.get(key)
+    if value is None:
+      value = self.__Add(strings, key, _kUTF16Codec if utf16 else 'utf-8')
+    return value
+
+  # Decodes |key| and pools the result, unless the pool is full.
+  def __Add(self, strings : dict, key : bytes, codec : str) -> str:
+    self.miss_count_ += 1
+    value = str(key, codec)
+    if len(strings) < self.max_entries_:
+      strings[key] = value
+    return value
+
+  def Clear(self):
+    self.strings_.clear()
+    self.strings16_.clear()
+
+# InterningPickleIterator is a FastPickleIterator whose ReadString and
+# ReadString16 return strings shared through |string_pool|. Navigations read
+# with it share their repeated URLs: TabNavigation reads them through
+# ReadString, LazyTabNavigation interns them through string_pool() when they
+# are decoded. The pool lookup is inlined, since it runs for every string
+# read.
+class InterningPickleIterator(FastPickleIterator):
+  def __init__(self, pickle, string_pool : StringPool):
+    super().__init__(pickle)
+    self.string_pool_ = string_pool
+    self.strings_ = string_pool.strings_
+    self.strings16_ = string_pool.strings16_
+
+  def string_pool(self) -> StringPool:
+    return self.string_pool_
+
+  def ReadString(self) -> Tuple[bool, str]:
+    bounds = self._ReadStringBounds(1)
+    if bounds is None:
+      return _kReadStringFailed
+    read_from, num_bytes = bounds
+    key = self.bytes_[read_from : read_from + num_bytes].tobytes()
+    value = self.strings_.get(key)
+    if value is None:
+      return (True, self.string_pool_.Intern(key))
+    return (True, value)
+
+  def ReadString16(self) -> Tuple[bool, str]:
+    bounds = self._ReadStringBounds(_kSizeUInt16)
+    if bounds is None:
+      return _kReadStringFailed
+    read_from, num_bytes = bounds
+    key = self.bytes_[read_from : read_from + num_bytes].tobytes()
+    value = self.strings16_.get(key)
+    if value is None:
+      return (True, self.string_pool_.Intern(key, True))
+    return (True, value)
+
 # Payload follows after allocation of Header (header size is customizable).
 # struct Header {
 #   uint32 payload_size;  # Specifies the size of the payload.
@@ -288,8 +552,9 @@ class Pickle:
         self.header_ = bytearray(new_capacity)
     else:
       if self.header_ is not None:
-        extend_length = new_capacity - self.capacity_
-        self.header_.extend(bytearray(extend_length))
+        # bytes(n) is a calloc'd block; growth is geometric (see BeginWrite),
+        # so this happens O(log n) times.
+        self.header_.extend(bytes(new_capacity - self.capacity_))
       else:
         self.header_size_ = SizeOf.HEADER
         self.header_ = bytearray(new_capacity)
@@ -335,10 +600,18 @@ class Pickle:
   # location that the data should be written at is returned, or NULL if there
   # was an error. Call EndWrite with the returned offset and the given length
   # to pad out for the next write.
+  #
+  # The capacity at least doubles when it runs out, so writing n bytes resizes
+  # O(log n) times.
   def BeginWrite(self, length : int) -> int:
+    if self.capacity_ == const.kCapacityReadOnly:
+      raise ValueError('oops: pickle is readonly')
+    if length > const.kuint32max:
+      raise ValueError('BeginWrite: length exceeds limit')
+
     # write at a uint32-aligned offset from the beginning of the header
-    payload_size : int = struct.unpack_from(self.byteorder_ + 'I', self.header_, 0)
-    offset : int = AlignInt(payload_size[0], SizeOf.UINT32)
+    payload_size : int = _kUInt32Struct.unpack_from(self.header_, 0)[0]
+    offset : int = payload_size + _kPadding[payload_size & 3]
 
     new_size : int = offset + length
     needed_size : int = self.header_size_ + new_size
@@ -346,11 +619,8 @@ class Pickle:
       if False == self.Resize(max(self.capacity_ * 2, needed_size)):
         return None
 
-    if length > const.kuint32max:
-      raise ValueError('BeginWrite: length exceeds limit')
-
-    struct.pack_into(self.byteorder_ + 'I', self.header_, 0, int(new_size))
-    return self.payload() + offset
+    _kUInt32Struct.pack_into(self.header_, 0, new_size)
+    return self.header_size_ + offset
 
   # Completes the write operation by padding the data with NULL bytes until it
   # is padded. Should be paired with BeginWrite, but it does not necessarily
@@ -358,21 +628,44 @@ class Pickle:
   def EndWrite(self, dest, length : int):
     # Zero-pad to keep tools like valgrind from complaining about uninitialized
     # memory.
-    if length % SizeOf.UINT32:
-      self.header_[(dest + length) : (dest + length) + (SizeOf.UINT32 - (length % SizeOf.UINT32))] = bytearray(SizeOf.UINT32 - (length % SizeOf.UINT32))
+    padding = _kPaddingBytes[length & 3]
+    if padding:
+      end = dest + length
+      self.header_[end : end + len(padding)] = padding
+
+  # Writes |value| packed with the struct.Struct |packer| straight into the
+  # buffer.
+  def __WriteStruct(self, packer : struct.Struct, value) -> bool:
+    dest = self.BeginWrite(packer.size)
+    if dest is None:
+      return False
+    packer.pack_into(self.header_, dest, value)
+    self.EndWrite(dest, packer.size)
+    return True
+
+  # Writes the int |length| followed by |data|; the layout of WriteInt and
+  # WriteBytes with a single BeginWrite, since an int keeps the alignment.
+  def __WriteLengthAndBytes(self, length : int, data, data_len : int) -> bool:
+    dest = self.BeginWrite(_kSizeInt + data_len)
+    if dest is None:
+      return False
+    _kIntStruct.pack_into(self.header_, dest, length)
+    start = dest + _kSizeInt
+    self.header_[start : start + data_len] = data
+    self.EndWrite(dest, _kSizeInt + data_len)
+    return True
 
   # "Bytes" is a blob with no length. The caller must specify the lenght both
   # when reading and writing. It is normally used to serialize PoD types of a
   # known size. See also WriteData.
   def WriteBytes(self, data, data_len : int) -> bool:
-    if self.capacity_ == const.kCapacityReadOnly:
-      raise ValueError('oops: pickle is readonly')
     dest = self.BeginWrite(data_len)
     if dest is None:
       return False
 
-    v = memoryview(data)
-    self.header_[dest : (dest + data_len)] = v[0:data_len]
+    if len(data) != data_len:
+      data = memoryview(data)[0:data_len]
+    self.header_[dest : (dest + data_len)] = data
     self.EndWrite(dest, data_len)
     return True
 
@@ -382,63 +675,45 @@ class Pickle:
   # to the Pickle.
 
   def WriteInt(self, value : int) -> bool:
-    return self.WriteBytes(value.to_bytes(SizeOf.INT, sys.byteorder), SizeOf.INT)
+    return self.__WriteStruct(_kIntStruct, value)
 
   def WriteBool(self, value : bool) -> bool:
-    return self.WriteInt(1 if value else 0)
+    return self.__WriteStruct(_kIntStruct, 1 if value else 0)
 
   def WriteUInt16(self, value : uint16) -> bool:
-    return self.WriteBytes(value.to_bytes(SizeOf.UINT16, sys.byteorder), SizeOf.UINT16)
+    return self.__WriteStruct(_kUInt16Struct, value)
   
   def WriteUInt32(self, value : uint32) -> bool:
-    return self.WriteBytes(value.to_bytes(SizeOf.UINT32, sys.byteorder), SizeOf.UINT32)
+    return self.__WriteStruct(_kUInt32Struct, value)
   
   def WriteInt64(self, value : int64) -> bool:
-    return self.WriteBytes(value.to_bytes(SizeOf.INT64, sys.byteorder), SizeOf.INT64)
+    return self.__WriteStruct(_kInt64Struct, value)
   
   def WriteUInt64(self, value : uint64) -> bool:
-    return self.WriteBytes(value.to_bytes(SizeOf.UINT64, sys.byteorder), SizeOf.UINT64)
+    return self.__WriteStruct(_kUInt64Struct, value)
   
   def WriteString(self, value : str) -> bool:
-    # https://docs.python.org/3/library/codecs.html
-    # utf-8, utf-16, utf-32, utf-16-be, utf-16-le, utf-32-be, utf-32-le
     data : bytes = value.encode('utf-8')
-    if False == self.WriteInt(len(data)):
-      return False
-    return self.WriteBytes(data, len(data))
+    return self.__WriteLengthAndBytes(len(data), data, len(data))
 
   def WriteWString(self, value : str) -> bool:
-    # https://docs.python.org/3/library/codecs.html
-    # utf-8, utf-16, utf-32, utf-16-be, utf-16-le, utf-32-be, utf-32-le
-    if sys.byteorder == 'big':
-      encoding = 'utf-32-be'
-    else:
-      encoding = 'utf-32-le'
-    data : bytes = value.encode(encoding)
-    if False == self.WriteInt(len(data)):
-      return False
-    return self.WriteBytes(data, len(data))
+    data : bytes = value.encode(_kUTF32Codec)
+    # The length is in characters, as ReadWString expects.
+    return self.__WriteLengthAndBytes(len(data) // _kSizeUInt32, data, len(data))
 
   def WriteString16(self, value : str) -> bool:
-    # https://docs.python.org/3/library/codecs.html
-    # utf-8, utf-16, utf-32, utf-16-be, utf-16-le, utf-32-be, utf-32-le
-    if sys.byteorder == 'big':
-      encoding = 'utf-16-be'
-    else:
-      encoding = 'utf-16-le'
-    data : bytes = value.encode(encoding)
-    if False == self.WriteInt(len(data)):
-      return False
-    return self.WriteBytes(data, len(data))
+    data : bytes = value.encode(_kUTF16Codec)
+    # The length is in UTF-16 code units, as ReadString16 expects.
+    return self.__WriteLengthAndBytes(len(data) // _kSizeUInt16, data, len(data))
 
   # "Data" is a blob with a length. When you read it out you will be given the
   # length. See also WriteBytes.
   def WriteData(self, data, length : int) -> bool:
     if length < 0:
       return False
-    if False == self.WriteInt(length):
-      return False
-    return self.WriteBytes(data, length)
+    if len(data) != length:
+      data = memoryview(data)[0:length]
+    return self.__WriteLengthAndBytes(length, data, length)
 
   # Same as WriteData, but allows the caller to write directly into the
   # Pickle. This saves a copy in cases where the data is not already
@@ -3,13 +3,26 @@ import os
 import argparse
 import sys
 import json
+import csv
+import re
 from datetime import datetime, timedelta, timezone
 from pprint import pprint
+from timeit import default_timer as timer
 
-from pickle import Pickle, PickleIterator
-from session import SessionCommand, SessionFileReader
+from chromepickle import Pickle, PickleIterator, FastPickleIterator
+from session import SessionCommand, SessionFileReader, MappedSessionFileReader, SessionTypeForPath
 from constants import SessionType, const
-from tabnavigation import TabNavigation
+from sessionmodel import SessionModelBuilder
+from extract import FindSessionFiles, ExtractFiles, ExtractFileParallel, IterNavigationRecords, ReadNavigationFromCommand, NavigationRecordFromCommand, NavigationRecordFromNavigation, NavigationFieldsForRecordFields, ResolveRecordFields, NavigationRecord, kUpdateTabNavigationCommandIds, kRecordFieldAliases
+from output import OpenOutput, OpenRecordWriter, kRecordWriters
+from dedup import NormalizeUrl, UrlIndex, UrlEntry, BloomUrlFilter
+from sqliteexport import SQLiteExporter
+from follow import SessionFileFollower
+import stats
+from parsecache import ParseCache, kDefaultCacheDirectory, kDefaultCacheMaxBytes
+from commandindex import OpenCommandIndex
+from navigationfilter import NavigationFilter
+from archive import IsArchivePath, IsCompressedPath, IterSessionStreams, kArchiveReadErrors
 
 #
 # MIT License
@@ -36,59 +49,421 @@ from tabnavigation import TabNavigation
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+# Prints a navigation in the text format: its title, its timestamp twice, and
+# its URL, each on its own line. Session files do not store timestamps, so the
+# timestamp lines are left out when |timestamp| is None.
+def PrintTitleTimestampAndUrl(title, timestamp, url):
+  print(title)
+  if timestamp is not None:
+    formatted = timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
+    print(formatted)
+    print(formatted)
+  print(url)
+
+def PrintNavigation(navigation):
+  PrintTitleTimestampAndUrl(navigation.title(), navigation.timestamp(), navigation.virtual_url())
+
+def PrintNavigationRecord(record):
+  PrintTitleTimestampAndUrl(record.title, record.timestamp, record.virtual_url)
+
+def PrintUpdateTabNavigation(command):
+  status, tab_id, navigation = ReadNavigationFromCommand(command)
+  if navigation is None:
+    print("Could not read tab id %s." % (tab_id,))
+    sys.exit(1)
+  PrintNavigation(navigation)
+
+# Commands printed by main(), keyed on (session_type, command_id). The other
+# commands known to SessionModelBuilder are only used with --current.
+kPrintHandlers = {
+  (SessionType.TAB_RESTORE, const.TabNavigation_kCommandUpdateTabNavigation) : PrintUpdateTabNavigation,
+  (SessionType.SESSION_RESTORE, const.kCommandUpdateTabNavigation) : PrintUpdateTabNavigation,
+}
+
+kSessionTypes = {
+  "tabs" : SessionType.TAB_RESTORE,
+  "session" : SessionType.SESSION_RESTORE,
+}
+
+# Prints the navigations of every session file found under |patterns|,
+# reading the files in parallel. Files are printed in sorted path order. If
+# |writer| is given the navigations are written to it instead. Only the
+# navigations matching |navigation_filter| are printed if it is given, and
+# only what is needed for the record |fields| is decoded.
+def ExtractMany(patterns, workers, cache, writer=None, navigation_filter=None, fields=None):
+  paths = FindSessionFiles(patterns)
+  if len(paths) == 0:
+    print("No tabs or session files found.")
+    sys.exit(1)
+
+  failed = False
+  for path, status, records in ExtractFiles(paths, workers, cache=cache, navigation_filter=navigation_filter, fields=fields):
+    if status == False:
+      print("Could not read commands from %s." % (path,), file=sys.stderr)
+      failed = True
+      continue
+    for record in records:
+      if writer is None:
+        PrintNavigationRecord(record)
+      else:
+        writer.Write(record)
+
+  if failed:
+    sys.exit(1)
+
+# Prints the navigations of the file at |path| and then those appended to it,
+# until interrupted. The append-to-print latency is summarized on stderr. If
+# |writer| is given the navigations are written to it instead. Only the
+# navigations matching |navigation_filter| are printed if it is given, and
+# only what is needed for the record |fields| is decoded.
+def Follow(path, session_type, poll_interval, writer=None, navigation_filter=None, fields=None):
+  follower = SessionFileFollower(path, session_type, poll_interval)
+  navigation_fields = NavigationFieldsForRecordFields(fields)
+  try:
+    for command in follower.Follow():
+      if writer is not None or navigation_filter is not None:
+        if command.command_id() == kUpdateTabNavigationCommandIds[session_type]:
+          record = NavigationRecordFromCommand(path, session_type, command, navigation_filter, navigation_fields)
+          if record is None:
+            continue
+          if writer is None:
+            PrintNavigationRecord(record)
+            sys.stdout.flush()
+          else:
+            writer.Write(record)
+            writer.Flush()
+        continue
+      handler = kPrintHandlers.get((session_type, command.command_id()))
+      if handler is not None:
+        handler(command)
+        sys.stdout.flush()
+  except KeyboardInterrupt:
+    pass
+
+  latencies = follower.latencies()
+  if len(latencies) > 0:
+    print("Latency: mean %.3f s, max %.3f s over %d polls, %d rewrites" %
+          (sum(latencies) / len(latencies), max(latencies), len(latencies), follower.restart_count()), file=sys.stderr)
+
+# Adds the session files in the archive or compressed file at |path| to
+# |exporter|. Returns false if any of them could not be read; those read
+# before are kept.
+def ExportSQLiteArchive(exporter, path, session_type):
+  status = True
+  name = path
+  try:
+    for name, stream in IterSessionStreams(path):
+      if not exporter.AddStream(name, stream, session_type):
+        print("Could not read commands from %s." % (name,), file=sys.stderr)
+        status = False
+      name = path
+  except kArchiveReadErrors:
+    print("Could not read commands from %s." % (name,), file=sys.stderr)
+    status = False
+  return status
+
+# Exports the windows, tabs and navigations of every session file found under
+# |patterns| into the SQLite database at |database_path|. Archives and
+# compressed files are read without temporary files.
+def ExportSQLite(patterns, session_type, mapped, database_path):
+  paths = FindSessionFiles(patterns)
+  if len(paths) == 0:
+    print("No tabs or session files found.")
+    sys.exit(1)
+
+  start = timer()
+  exporter = SQLiteExporter(database_path)
+  failed = False
+  try:
+    for path in paths:
+      if IsArchivePath(path) or IsCompressedPath(path):
+        if not ExportSQLiteArchive(exporter, path, session_type):
+          failed = True
+      elif not exporter.AddFile(path, session_type, mapped):
+        print("Could not read commands from %s." % (path,), file=sys.stderr)
+        failed = True
+  finally:
+    exporter.Close()
+  elapsed = timer() - start
+  print("Wrote %d rows from %d files to %s (%.0f rows/s)." %
+        (exporter.row_count(), len(paths), database_path, exporter.row_count() / elapsed if elapsed > 0 else 0), file=sys.stderr)
+
+  if failed:
+    sys.exit(1)
+
+# Writes each distinct URL of the session files found under |patterns| once,
+# as tab separated values. URLs are compared in normalized form (see
+# dedup.NormalizeUrl). Without |bloom_capacity| every URL is written with its
+# number of occurrences and the first and last file and tab it was seen in,
+# keeping each distinct URL in memory; without |keep_urls| the 64-bit hash of
+# the URL is written in its place, so memory stays at about 40 bytes per
+# distinct URL. With |bloom_capacity|, URLs are written as they are first
+# seen, using a Bloom filter sized for that many URLs, so memory stays fixed
+# however many URLs are read. Only the URLs of navigations matching
+# |navigation_filter| are counted if it is given.
+def Dedup(patterns, workers, cache, bloom_capacity, output_path, navigation_filter=None, keep_urls=True):
+  paths = FindSessionFiles(patterns)
+  if len(paths) == 0:
+    print("No tabs or session files found.")
+    sys.exit(1)
+
+  stream = OpenOutput(output_path)
+  writer = csv.writer(stream, delimiter='\t', lineterminator='\n')
+  if bloom_capacity is None:
+    index = UrlIndex(keep_urls)
+  else:
+    seen = BloomUrlFilter(bloom_capacity)
+    writer.writerow(('url', 'path', 'tab_id'))
+
+  failed = False
+  try:
+    for path, status, records in ExtractFiles(paths, workers, cache=cache, navigation_filter=navigation_filter):
+      if status == False:
+        print("Could not read commands from %s." % (path,), file=sys.stderr)
+        failed = True
+        continue
+      for record in records:
+        if bloom_capacity is None:
+          index.Add(record.virtual_url, record.path, record.tab_id)
+        elif seen.Add(record.virtual_url):
+          writer.writerow((NormalizeUrl(record.virtual_url), record.path, record.tab_id))
+
+    if bloom_capacity is None:
+      writer.writerow(UrlEntry._fields)
+      writer.writerows(index.entries())
+  finally:
+    stream.close()
+
+  if failed:
+    sys.exit(1)
+
+# Yields the records of the selected navigation of each tab in the file at
+# |path|, as printed by --current.
+def IterCurrentNavigationRecords(path, session_type, mapped):
+  file_reader = MappedSessionFileReader(path) if mapped else SessionFileReader(path)
+  model_builder = SessionModelBuilder(session_type)
+  model_builder.AddCommands(file_reader.IterCommands(session_type))
+  for tab in model_builder.model().tabs():
+    navigation = tab.current_navigation()
+    if navigation is not None:
+      yield NavigationRecordFromNavigation(path, session_type, tab.tab_id(), navigation)
+
+# Yields the records of the navigations of the tab |tab_id| in the file at
+# |path|, read through a CommandIndex so that only that tab's commands are
+# decoded. The index is kept in |sidecar_path| if it is given.
+def IterTabNavigationRecords(path, session_type, tab_id, sidecar_path, navigation_filter=None, fields=None):
+  navigation_fields = NavigationFieldsForRecordFields(fields)
+  index = OpenCommandIndex(path, session_type, sidecar_path)
+  positions = index.PositionsForTab(tab_id, kUpdateTabNavigationCommandIds[session_type])
+  for command in index.ReadCommands(positions):
+    record = NavigationRecordFromCommand(path, session_type, command, navigation_filter, navigation_fields)
+    if record is not None:
+      yield record
+
+# Writes the navigations of the file at |path| with |writer|, or prints them
+# if |writer| is None. Only those matching args['navigation_filter'] are
+# written if it is set, and only the args['fields'] of them are decoded.
+def WriteNavigationRecords(path, session_type, args, cache, writer):
+  navigation_filter = args['navigation_filter']
+  fields = args['fields']
+  if args['tab'] is not None:
+    records = IterTabNavigationRecords(path, session_type, args['tab'], args['index_sidecar'], navigation_filter, fields)
+  elif args['parallel']:
+    records = ExtractFileParallel(path, session_type, args['workers'], navigation_filter=navigation_filter, fields=fields)
+  elif args['current'] or cache is not None:
+    if args['current']:
+      records = IterCurrentNavigationRecords(path, session_type, args['mmap'])
+    else:
+      records = cache.GetNavigationRecords(path, session_type)
+    if navigation_filter is not None:
+      records = (record for record in records if navigation_filter.MatchesRecord(record))
+  else:
+    records = IterNavigationRecords(path, session_type, args['mmap'], navigation_filter, fields)
+  try:
+    for record in records:
+      if writer is None:
+        PrintNavigationRecord(record)
+      else:
+        writer.Write(record)
+  except (ValueError, OSError):
+    print("Could not read commands from tabs file.", file=sys.stderr)
+    sys.exit(1)
+
 def main():
   parser = argparse.ArgumentParser(description="chrometabs")
-  parser.add_argument("--path", help="Path of the Chrome tabs file")
+  parser.add_argument("--path", nargs="+", help="Path of the Chrome tabs or session file. Several paths, directories (searched for \"Current Tabs\", \"Last Tabs\", \"Current Session\" and \"Last Session\" files) and glob patterns can be given to read many profiles at once")
+  parser.add_argument("--workers", type=int, default=None, help="Number of processes used to read many files (default: number of CPUs)")
+  parser.add_argument("--type", choices=sorted(kSessionTypes), help="Type of the file; by default it is derived from the file name (\"Current Session\" and \"Last Session\" are session files, anything else is a tabs file)")
+  parser.add_argument("--mmap", action="store_true", help="Memory-map the tabs file instead of reading it through a buffer")
+  parser.add_argument("--current", action="store_true", help="Only print the selected navigation of each tab")
+  parser.add_argument("--follow", action="store_true", help="Keep printing navigations as they are appended to the file")
+  parser.add_argument("--cache", action="store_true", help="Keep the parsed navigations of each file in a cache and only parse what was appended since")
+  parser.add_argument("--cache-dir", default=kDefaultCacheDirectory, help="Directory of the --cache entries (default: %(default)s)")
+  parser.add_argument("--cache-size", type=int, default=kDefaultCacheMaxBytes, help="Maximum size in bytes of the --cache entries; the least recently used are evicted (default: %(default)s)")
+  parser.add_argument("--stats", action="store_true", help="Print counters and timings of the run to stderr")
+  parser.add_argument("--format", choices=["text"] + sorted(kRecordWriters), default="text", help="Output format: text prints title and URL on separate lines (with the timestamp twice between them when it is known); jsonl, csv and tsv write one record per navigation with all its fields; columnar writes a binary file of fixed width columns and string tables (see output.py)")
+  parser.add_argument("--output", default=None, help="File to write --format output to (default: stdout)")
+  parser.add_argument("--sqlite", metavar="DATABASE", default=None, help="Export the windows, tabs and navigations of the files to this SQLite database instead of printing them; files already in it are replaced")
+  parser.add_argument("--dedup", action="store_true", help="Write each distinct URL once, with its number of occurrences and the first and last file and tab it was seen in; every distinct URL is kept in memory (see --dedup-hashes)")
+  parser.add_argument("--dedup-hashes", action="store_true", help="Like --dedup, but keep and write the 64-bit hash of each distinct URL instead of the URL (about 40 bytes per distinct URL)")
+  parser.add_argument("--dedup-bloom", type=int, metavar="CAPACITY", default=None, help="Write each distinct URL once as it is first seen, using a Bloom filter sized for CAPACITY URLs (fixed memory, about 0.1%% of new URLs are missed)")
+  parser.add_argument("--parallel", action="store_true", help="Decode the navigations of a single file in --workers processes; they are printed in the same order as without it")
+  parser.add_argument("--tab", type=int, metavar="TAB_ID", default=None, help="Only print the navigations of this tab, seeking to them through an index of the commands of the file")
+  parser.add_argument("--index-sidecar", metavar="PATH", default=None, help="File to keep the --tab command index in; it is rebuilt when the size or modification time of the tabs file changes")
+  parser.add_argument("--host", nargs="+", metavar="GLOB", default=None, help="Only print navigations whose URL host matches one of these patterns, e.g. \"*.corp.example.com\" (case-insensitive); other navigations are skipped right after their URL is read")
+  parser.add_argument("--scheme", nargs="+", default=None, help="Only print navigations whose URL has one of these schemes, e.g. https")
+  parser.add_argument("--url-regex", metavar="REGEX", default=None, help="Only print navigations whose URL contains a match of this regular expression")
+  parser.add_argument("--fields", default=None, help="Comma separated record fields to write with --format, e.g. url,title,transition; the other fields of each navigation are skipped without being decoded. Fields: %s (or %s)" % (", ".join(NavigationRecord._fields), ", ".join(sorted(kRecordFieldAliases))))
+  parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between checks for appended commands with --follow")
  
   args = vars(parser.parse_args())
 
-  tabsPath = os.path.abspath(os.path.expanduser(args['path']))
+  if args['path'] is None:
+    parser.error("--path is required")
+  dedup = args['dedup'] or args['dedup_hashes'] or args['dedup_bloom'] is not None
+  if args['dedup_bloom'] is not None and (args['dedup'] or args['dedup_hashes']):
+    parser.error("--dedup-bloom cannot be combined with --dedup or --dedup-hashes")
+  if args['dedup_bloom'] is not None and args['dedup_bloom'] <= 0:
+    parser.error("--dedup-bloom: CAPACITY must be positive")
+  if args['output'] is not None and args['format'] == 'text' and not dedup:
+    parser.error("--output requires --format")
+  if args['follow'] and args['format'] == 'columnar':
+    parser.error("--follow cannot write --format columnar")
+  if args['tab'] is not None and (args['follow'] or args['current']):
+    parser.error("--tab cannot be combined with --follow or --current")
+  if args['parallel'] and (args['follow'] or args['current'] or args['cache'] or args['tab'] is not None):
+    parser.error("--parallel cannot be combined with --follow, --current, --cache or --tab")
+  if args['index_sidecar'] is not None and args['tab'] is None:
+    parser.error("--index-sidecar requires --tab")
+  if args['fields'] is not None:
+    if args['format'] == 'text' or dedup or args['sqlite'] is not None:
+      parser.error("--fields requires --format, and cannot be combined with --dedup or --sqlite")
+    try:
+      args['fields'] = ResolveRecordFields(name.strip() for name in args['fields'].split(',') if name.strip())
+    except ValueError as e:
+      parser.error("--fields: %s" % (e,))
+    if len(args['fields']) == 0:
+      parser.error("--fields: no fields given")
+  args['navigation_filter'] = None
+  if args['host'] is not None or args['scheme'] is not None or args['url_regex'] is not None:
+    if args['sqlite'] is not None:
+      parser.error("--host, --scheme and --url-regex cannot be combined with --sqlite")
+    try:
+      args['navigation_filter'] = NavigationFilter(args['host'], args['scheme'], args['url_regex'])
+    except re.error as e:
+      parser.error("invalid --url-regex: %s" % (e,))
+
+  if args['stats']:
+    run_stats = stats.Enable()
+    start = timer()
+    try:
+      Run(args)
+    finally:
+      run_stats.AddTime('run', timer() - start)
+      print("Stats:\n" + run_stats.Summary(), file=sys.stderr)
+  else:
+    Run(args)
+
+# Reads the files named by the parsed command line |args| and prints their
+# navigations.
+def Run(args):
+  if args['sqlite'] is not None:
+    session_type = kSessionTypes[args['type']] if args['type'] is not None else None
+    ExportSQLite(args['path'], session_type, args['mmap'], args['sqlite'])
+    return
+
+  cache = None
+  if args['cache']:
+    cache = ParseCache(args['cache_dir'], args['cache_size'])
+
+  if args['dedup'] or args['dedup_hashes'] or args['dedup_bloom'] is not None:
+    Dedup(args['path'], args['workers'], cache, args['dedup_bloom'], args['output'], args['navigation_filter'],
+          keep_urls=not args['dedup_hashes'])
+    return
 
-  file_reader = SessionFileReader(tabsPath)
+  writer = None
+  if args['format'] != 'text':
+    writer = OpenRecordWriter(args['format'], args['output'], args['fields'])
+  try:
+    RunWithWriter(args, cache, writer)
+  finally:
+    if writer is not None:
+      writer.Close()
 
-  status, commands = file_reader.Read(SessionType.TAB_RESTORE)
+# Run() once the output is set up; |writer| is None for --format text.
+def RunWithWriter(args, cache, writer):
+  path = os.path.expanduser(args['path'][0])
+  if len(args['path']) > 1 or not os.path.isfile(path) or IsArchivePath(path) or IsCompressedPath(path):
+    ExtractMany(args['path'], args['workers'], cache, writer, args['navigation_filter'], args['fields'])
+    return
 
-  if status == False:
+  tabsPath = os.path.abspath(os.path.expanduser(args['path'][0]))
+
+  if args['type'] is not None:
+    session_type = kSessionTypes[args['type']]
+  else:
+    session_type = SessionTypeForPath(tabsPath)
+    if session_type is None:
+      session_type = SessionType.TAB_RESTORE
+
+  if args['follow']:
+    Follow(tabsPath, session_type, args['poll_interval'], writer, args['navigation_filter'], args['fields'])
+    return
+
+  if writer is not None or args['tab'] is not None or args['parallel'] or args['navigation_filter'] is not None:
+    WriteNavigationRecords(tabsPath, session_type, args, cache, writer)
+    return
+
+  if cache is not None and not args['current']:
+    try:
+      records = cache.GetNavigationRecords(tabsPath, session_type)
+    except (ValueError, OSError):
+      print("Could not read commands from tabs file.")
+      sys.exit(1)
+    for record in records:
+      PrintNavigationRecord(record)
+    return
+
+  if args['mmap']:
+    file_reader = MappedSessionFileReader(tabsPath)
+  else:
+    file_reader = SessionFileReader(tabsPath)
+
+  # With --current the commands are replayed into a session model as they are
+  # read, and only the selected navigation of each tab is printed at the end.
+  model_builder = None
+  if args['current']:
+    model_builder = SessionModelBuilder(session_type)
+
+  # A corrupt or truncated command ends the read with the same message
+  # wherever it is in the file.
+  try:
+    for command in file_reader.IterCommands(session_type):
+      if model_builder is not None:
+        model_builder.AddCommand(command)
+      else:
+        handler = kPrintHandlers.get((session_type, command.command_id()))
+        if handler is not None:
+          handler(command)
+        elif not SessionModelBuilder.IsKnownCommand(session_type, command.command_id()):
+          print("Unknown command %s" % (str(command.command_id()),))
+          if stats.Get() is not None:
+            stats.Get().Add('commands.unknown')
+  except ValueError:
+    print("Could not read commands from tabs file.")
+    sys.exit(1)
+
+  if file_reader.errored():
     print("Could not read commands from tabs file.")
     sys.exit(1)
 
-  for command in commands:
-    if command.command_id() == const.TabNavigation_kCommandUpdateTabNavigation:
-      pickle = command.PayloadAsPickle()
-      if pickle is None:
-        print("Could create pickle for command.")
-        sys.exit(1)
+  if model_builder is not None:
+    if stats.Get() is not None:
+      stats.Get().Add('commands.failed', model_builder.failed_count())
+    for tab in model_builder.model().tabs():
+      navigation = tab.current_navigation()
+      if navigation is not None:
+        PrintNavigation(navigation)
 
-      iterator = PickleIterator(pickle)
-  
-      status, tab_id = iterator.ReadInt()
-      if status == False:
-        print("Could not read tab id %s." % (tab_id,))
-        sys.exit(1)
-
-      navigation = TabNavigation()
-      navigation.ReadFromPickle(iterator)
-      print(navigation.title())
-      print(navigation.timestamp().strftime('%Y-%m-%d %H:%M:%S.%f'))
-      print(navigation.timestamp().strftime('%Y-%m-%d %H:%M:%S.%f'))
-      print(navigation.virtual_url())
-    elif command.command_id() == const.TabNavigation_kCommandRestoredEntry:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandWindow:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandSelectedNavigationInTab:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandPinnedState:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandSetExtensionAppID:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandSetWindowAppName:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandSetTabUserAgentOverride:
-      pass
-    elif command.command_id() == const.TabNavigation_kCommandUnknown:
-      pass
-    else:
-      print("Unknown command %s" % (str(command.command_id()),))
 if __name__ == "__main__":
   main()
@@ -0,0 +1,247 @@
+from __future__ import annotations
+from typing import Iterable, Iterator
+
+import os
+import sys
+import array
+import struct
+
+from session import SessionCommand, MappedSessionFileReader
+from constants import SessionType, SizeOf, const
+from extract import SessionTypeOrDefault
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+_kIntStruct = struct.Struct(_kByteOrder + 'i')
+
+# Offset of the tab id within the contents of the commands that carry one,
+# keyed on (session_type, command_id). Pickled payloads start with the
+# 4 byte Pickle header; the fixed size payloads are described in
+# sessionmodel.py.
+kTabIdOffsets = {
+  (SessionType.TAB_RESTORE, const.TabNavigation_kCommandUpdateTabNavigation) : SizeOf.HEADER,
+  (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSelectedNavigationInTab) : 0,
+  (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSetExtensionAppID) : SizeOf.HEADER,
+  (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSetTabUserAgentOverride) : SizeOf.HEADER,
+
+  (SessionType.SESSION_RESTORE, const.kCommandSetTabWindow) : SizeOf.INT32,
+  (SessionType.SESSION_RESTORE, const.kCommandSetTabIndexInWindow) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandTabClosedObsolete) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandTabNavigationPathPrunedFromBack) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandUpdateTabNavigation) : SizeOf.HEADER,
+  (SessionType.SESSION_RESTORE, const.kCommandSetSelectedNavigationIndex) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandTabNavigationPathPrunedFromFront) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandSetPinnedState) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandSetExtensionAppID) : SizeOf.HEADER,
+  (SessionType.SESSION_RESTORE, const.kCommandTabClosed) : 0,
+  (SessionType.SESSION_RESTORE, const.kCommandSetTabUserAgentOverride) : SizeOf.HEADER,
+  (SessionType.SESSION_RESTORE, const.kCommandSessionStorageAssociated) : SizeOf.HEADER,
+}
+
+# Tab id recorded for commands that do not carry one.
+kNoTabId = -1
+
+# Sidecar file layout (integers in the byte order given in the header):
+#
+#   char[8]  magic "CTIDX001"
+#   char     byte order, '<' or '>'
+#   uint8[3] padding
+#   int32    session type
+#   uint64   size of the session file
+#   int64    modification time of the session file, in nanoseconds
+#   uint64   number of commands (n)
+#   uint64[n] offsets, uint16[n] sizes, uint8[n] command ids, int32[n] tab ids
+kSidecarMagic = b'CTIDX001'
+_kSidecarHeader = struct.Struct(_kByteOrder + '8sc3xiQqQ')
+
+# CommandIndex ---------------------------------------------------------------
+
+# CommandIndex records where each command of a session file is: the offset
+# and size of its contents, its id and, for the commands that name a tab, the
+# tab id. It is built in one pass that only reads the size and id prefixes
+# (and the 4 bytes of each tab id), so a tab's navigations or every command of
+# one id can then be read by seeking straight to them, without decoding the
+# rest of the file.
+#
+# The table is kept in flat arrays (15 bytes per command), and can be saved
+# to a sidecar file that is only reused while the session file's size and
+# modification time are unchanged.
+class CommandIndex:
+  def __init__(self, path : str, session_type : int = None):
+    self.path_ = os.path.abspath(path)
+    self.session_type_ = SessionTypeOrDefault(self.path_) if session_type is None else session_type
+    self.file_size_ = 0
+    self.mtime_ns_ = 0
+    self.offsets_ = array.array('Q')
+    self.sizes_ = array.array('H')
+    self.command_ids_ = array.array('B')
+    self.tab_ids_ = array.array('i')
+    # Positions in the table per tab id, built on the first lookup by tab.
+    self.tab_positions_ = None
+
+  def __len__(self) -> int:
+    return len(self.offsets_)
+
+  def path(self) -> str:
+    return self.path_
+
+  def session_type(self) -> int:
+    return self.session_type_
+
+  # Builds the table from the session file. Raises ValueError if it is not a
+  # session file.
+  def Build(self):
+    reader = MappedSessionFileReader(self.path_)
+    # The size and mtime of the file that is mapped, even if the file at
+    # path_ is replaced meanwhile.
+    stat = reader.stat()
+    try:
+      view = reader.view()
+      session_type = self.session_type_
+      offsets = array.array('Q')
+      sizes = array.array('H')
+      command_ids = array.array('B')
+      tab_ids = array.array('i')
+      for command_id, offset, size in reader.IterCommandSpans(session_type):
+        offsets.append(offset)
+        sizes.append(size)
+        command_ids.append(command_id)
+        tab_id_offset = kTabIdOffsets.get((session_type, command_id))
+        if tab_id_offset is not None and tab_id_offset + SizeOf.INT32 <= size:
+          tab_ids.append(_kIntStruct.unpack_from(view, offset + tab_id_offset)[0])
+        else:
+          tab_ids.append(kNoTabId)
+      view = None
+    finally:
+      reader.Close()
+    self.file_size_ = stat.st_size
+    self.mtime_ns_ = stat.st_mtime_ns
+    self.offsets_, self.sizes_, self.command_ids_, self.tab_ids_ = offsets, sizes, command_ids, tab_ids
+    self.tab_positions_ = None
+
+  # Returns true if the table still describes the session file.
+  def IsCurrent(self) -> bool:
+    try:
+      stat = os.stat(self.path_)
+    except OSError:
+      return False
+    return stat.st_size == self.file_size_ and stat.st_mtime_ns == self.mtime_ns_
+
+  # Saves the table to |sidecar_path|.
+  def WriteSidecar(self, sidecar_path : str):
+    temporary_path = '%s.%d.tmp' % (sidecar_path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+      f.write(_kSidecarHeader.pack(kSidecarMagic, _kByteOrder.encode('ascii'), int(self.session_type_),
+                                   self.file_size_, self.mtime_ns_, len(self.offsets_)))
+      for column in (self.offsets_, self.sizes_, self.command_ids_, self.tab_ids_):
+        f.write(column)
+    os.replace(temporary_path, sidecar_path)
+
+  # Loads the table from |sidecar_path|. Returns false, leaving the table
+  # unchanged, if the sidecar is missing, unreadable, or does not match the
+  # session file's type, size and modification time.
+  def ReadSidecar(self, sidecar_path : str) -> bool:
+    try:
+      stat = os.stat(self.path_)
+      with open(sidecar_path, 'rb') as f:
+        header = f.read(_kSidecarHeader.size)
+        if len(header) != _kSidecarHeader.size:
+          return False
+        magic, byteorder, session_type, file_size, mtime_ns, count = _kSidecarHeader.unpack(header)
+        if magic != kSidecarMagic or byteorder != _kByteOrder.encode('ascii'):
+          return False
+        if session_type != int(self.session_type_) or file_size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+          return False
+        columns = (array.array('Q'), array.array('H'), array.array('B'), array.array('i'))
+        for column in columns:
+          column.fromfile(f, count)
+    except (OSError, EOFError, ValueError, struct.error):
+      # array.fromfile raises EOFError, or ValueError if the sidecar ends
+      # inside an item.
+      return False
+    self.file_size_ = file_size
+    self.mtime_ns_ = mtime_ns
+    self.offsets_, self.sizes_, self.command_ids_, self.tab_ids_ = columns
+    self.tab_positions_ = None
+    return True
+
+  # Returns the positions in the table of the commands of |tab_id|, and of
+  # those only the ones of |command_id| if it is given, in file order.
+  def PositionsForTab(self, tab_id : int, command_id : int = None) -> list:
+    if self.tab_positions_ is None:
+      tab_positions = {}
+      for position, command_tab_id in enumerate(self.tab_ids_):
+        if command_tab_id != kNoTabId:
+          positions = tab_positions.get(command_tab_id)
+          if positions is None:
+            positions = tab_positions[command_tab_id] = array.array('I')
+          positions.append(position)
+      self.tab_positions_ = tab_positions
+    positions = self.tab_positions_.get(tab_id, ())
+    if command_id is None:
+      return list(positions)
+    command_ids = self.command_ids_
+    return [position for position in positions if command_ids[position] == command_id]
+
+  # Returns the positions in the table of the commands of |command_id|.
+  def PositionsForCommand(self, command_id : int) -> list:
+    # bytes.find scans the id column in C.
+    ids = self.command_ids_.tobytes()
+    positions = []
+    position = ids.find(command_id)
+    while position != -1:
+      positions.append(position)
+      position = ids.find(command_id, position + 1)
+    return positions
+
+  # Returns the ids of the tabs that have commands in the file.
+  def tab_ids(self) -> list:
+    return sorted(set(self.tab_ids_) - {kNoTabId})
+
+  # Yields the commands at |positions| in the table, reading only their
+  # contents from the session file.
+  def ReadCommands(self, positions : Iterable[int]) -> Iterator[SessionCommand]:
+    with open(self.path_, 'rb') as f:
+      for position in positions:
+        size = self.sizes_[position]
+        f.seek(self.offsets_[position])
+        contents = f.read(size)
+        if len(contents) != size:
+          raise ValueError('ReadCommands: session file is shorter than its index')
+        yield SessionCommand(self.command_ids_[position], contents)
+
+# Returns the CommandIndex of the session file at |path|. If |sidecar_path| is
+# given, the index is loaded from it while it is current, and otherwise built
+# and saved there. Raises ValueError if the file is not a session file.
+def OpenCommandIndex(path : str, session_type : int = None, sidecar_path : str = None) -> CommandIndex:
+  index = CommandIndex(path, session_type)
+  if sidecar_path is not None and index.ReadSidecar(sidecar_path):
+    return index
+  index.Build()
+  if sidecar_path is not None:
+    index.WriteSidecar(sidecar_path)
+  return index
@@ -42,6 +42,15 @@ class SessionType(IntEnum):
   SESSION_RESTORE = 0
   TAB_RESTORE = 1
 
+# Types of the values that can be read from a Pickle, used to describe the
+# layout of a pickled record (see TabNavigation_kPickleSchema).
+class PickleFieldType(IntEnum):
+  INT = 0
+  BOOL = 1
+  STRING = 2
+  STRING16 = 3
+  BINARY_STRING = 4
+
 # https://chromium.googlesource.com/external/WebKit/Source/Platform/chromium/public/+/ad66491450101178db06dc094cb1836fb3d80825/WebReferrerPolicy.h
 class WebKitWebReferrerPolicy(IntEnum):
   WebReferrerPolicyAlways = 0
@@ -191,34 +200,36 @@ const.kFileCurrentVersion = 1
 # The signature at the beginning of the file = SSNS (Sessions).
 const.kFileSignature = 0x53534E53
 const.kFileReadBufferSize = 1024
+# Bytes of framed commands SessionFileWriter collects before writing them.
+const.kFileWriteBufferSize = 1024 * 1024
 
 # chromium/chrome/browser/sessions/session_service.cc
 
-# # Identifier for commands written to file.
-# const.kCommandSetTabWindow = 0
-# # OBSOLETE Superseded by kCommandSetWindowBounds3.
-# # const.kCommandSetWindowBounds = 1
-# const.kCommandSetTabIndexInWindow = 2
-# # Original kCommandTabClosed/kCommandWindowClosed. See comment in
-# # MigrateClosedPayload for details on why they were replaced.
-# const.kCommandTabClosedObsolete = 3
-# const.kCommandWindowClosedObsolete = 4
-# const.kCommandTabNavigationPathPrunedFromBack = 5
-# const.kCommandUpdateTabNavigation = 6
-# const.kCommandSetSelectedNavigationIndex = 7
-# const.kCommandSetSelectedTabInIndex = 8
-# const.kCommandSetWindowType = 9
-# # OBSOLETE Superseded by kCommandSetWindowBounds3. Except for data migration.
-# # const.kCommandSetWindowBounds2 = 10;
-# const.kCommandTabNavigationPathPrunedFromFront = 11
-# const.kCommandSetPinnedState = 12
-# const.kCommandSetExtensionAppID = 13
-# const.kCommandSetWindowBounds3 = 14
-# const.kCommandSetWindowAppName = 15
-# const.kCommandTabClosed = 16
-# const.kCommandWindowClosed = 17
-# const.kCommandSetTabUserAgentOverride = 18
-# const.kCommandSessionStorageAssociated = 19
+# Identifier for commands written to file.
+const.kCommandSetTabWindow = 0
+# OBSOLETE Superseded by kCommandSetWindowBounds3.
+# const.kCommandSetWindowBounds = 1
+const.kCommandSetTabIndexInWindow = 2
+# Original kCommandTabClosed/kCommandWindowClosed. See comment in
+# MigrateClosedPayload for details on why they were replaced.
+const.kCommandTabClosedObsolete = 3
+const.kCommandWindowClosedObsolete = 4
+const.kCommandTabNavigationPathPrunedFromBack = 5
+const.kCommandUpdateTabNavigation = 6
+const.kCommandSetSelectedNavigationIndex = 7
+const.kCommandSetSelectedTabInIndex = 8
+const.kCommandSetWindowType = 9
+# OBSOLETE Superseded by kCommandSetWindowBounds3. Except for data migration.
+const.kCommandSetWindowBounds2 = 10
+const.kCommandTabNavigationPathPrunedFromFront = 11
+const.kCommandSetPinnedState = 12
+const.kCommandSetExtensionAppID = 13
+const.kCommandSetWindowBounds3 = 14
+const.kCommandSetWindowAppName = 15
+const.kCommandTabClosed = 16
+const.kCommandWindowClosed = 17
+const.kCommandSetTabUserAgentOverride = 18
+const.kCommandSessionStorageAssociated = 19
 
 
 # Tab Navigation
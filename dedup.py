@@ -0,0 +1,231 @@
+from __future__ import annotations
+from typing import Iterator, NamedTuple
+from urllib.parse import urlparse, urlunparse
+
+import array
+import hashlib
+import math
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Default ports dropped from normalized URLs.
+_kDefaultPorts = {'http' : 80, 'https' : 443, 'ftp' : 21, 'ws' : 80, 'wss' : 443}
+
+# Returns |url| in a normal form, so that URLs that only differ in the case of
+# the scheme or host, a default port, an empty path or the fragment compare
+# equal. URLs that cannot be parsed are returned unchanged.
+def NormalizeUrl(url : str) -> str:
+  try:
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = parsed.hostname
+    port = parsed.port
+  except ValueError:
+    return url
+  if host is None:
+    return urlunparse((scheme, parsed.netloc, parsed.path, parsed.params, parsed.query, ''))
+  netloc = host
+  if ':' in host:
+    netloc = '[%s]' % (host,)
+  if port is not None and port != _kDefaultPorts.get(scheme):
+    netloc += ':%d' % (port,)
+  if parsed.username is not None:
+    userinfo = parsed.username
+    if parsed.password is not None:
+      userinfo += ':' + parsed.password
+    netloc = userinfo + '@' + netloc
+  return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, parsed.query, ''))
+
+# Returns a 128-bit hash of the normalized |url| as two 64-bit integers.
+def _UrlHashes(url : str):
+  digest = hashlib.blake2b(url.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+  return (int.from_bytes(digest[0:8], 'little'), int.from_bytes(digest[8:16], 'little'))
+
+class UrlEntry(NamedTuple):
+  url : str
+  count : int
+  first_path : str
+  first_tab_id : int
+  last_path : str
+  last_tab_id : int
+
+# UrlIndex -------------------------------------------------------------------
+
+# UrlIndex counts the occurrences of each normalized URL and remembers the
+# first and last file and tab it was seen in.
+#
+# URLs are keyed on a 64-bit hash in an open addressing table of flat arrays
+# (about 40 bytes per distinct URL), instead of a dict of objects. Two URLs
+# collide with a probability of about n^2 / 2^65, i.e. rarely even for tens of
+# millions of URLs. The URL strings themselves are only kept with |keep_urls|;
+# without them memory stays bounded by the number of distinct URLs but
+# entries() reports the URL hash instead.
+class UrlIndex:
+  # Largest fraction of the table in use before it doubles.
+  kMaxLoad = 0.7
+
+  def __init__(self, keep_urls : bool = True, initial_capacity : int = 1 << 16):
+    capacity = 1 << max(4, (initial_capacity - 1).bit_length())
+    self.keep_urls_ = keep_urls
+    # Slot -> entry number + 1, 0 for an empty slot.
+    self.slots_ = array.array('I', bytes(capacity * array.array('I').itemsize))
+    self.mask_ = capacity - 1
+    # Per entry.
+    self.hashes_ = array.array('Q')
+    self.counts_ = array.array('I')
+    self.first_files_ = array.array('I')
+    self.first_tabs_ = array.array('i')
+    self.last_files_ = array.array('I')
+    self.last_tabs_ = array.array('i')
+    self.urls_ = []
+    # Paths of the files URLs were seen in, and their numbers.
+    self.paths_ = []
+    self.path_numbers_ = {}
+
+  def __len__(self) -> int:
+    return len(self.hashes_)
+
+  # Returns the slot of |url_hash|: the one holding it, or the empty slot it
+  # would be inserted at.
+  def __Slot(self, url_hash : int) -> int:
+    slots = self.slots_
+    hashes = self.hashes_
+    mask = self.mask_
+    slot = url_hash & mask
+    while True:
+      entry = slots[slot]
+      if entry == 0 or hashes[entry - 1] == url_hash:
+        return slot
+      slot = (slot + 1) & mask
+
+  def __Grow(self):
+    capacity = (self.mask_ + 1) * 2
+    self.slots_ = array.array('I', bytes(capacity * self.slots_.itemsize))
+    self.mask_ = capacity - 1
+    for entry, url_hash in enumerate(self.hashes_):
+      self.slots_[self.__Slot(url_hash)] = entry + 1
+
+  def __PathNumber(self, path : str) -> int:
+    number = self.path_numbers_.get(path)
+    if number is None:
+      number = len(self.paths_)
+      self.paths_.append(path)
+      self.path_numbers_[path] = number
+    return number
+
+  # Records an occurrence of |url| in the tab |tab_id| of the file at |path|.
+  # Returns true if the URL was not seen before.
+  def Add(self, url : str, path : str, tab_id : int) -> bool:
+    normalized = NormalizeUrl(url)
+    url_hash = _UrlHashes(normalized)[0]
+    slot = self.__Slot(url_hash)
+    entry = self.slots_[slot]
+    path_number = self.__PathNumber(path)
+    if entry != 0:
+      entry -= 1
+      self.counts_[entry] += 1
+      self.last_files_[entry] = path_number
+      self.last_tabs_[entry] = tab_id
+      return False
+
+    self.hashes_.append(url_hash)
+    self.counts_.append(1)
+    self.first_files_.append(path_number)
+    self.first_tabs_.append(tab_id)
+    self.last_files_.append(path_number)
+    self.last_tabs_.append(tab_id)
+    if self.keep_urls_:
+      self.urls_.append(normalized)
+    self.slots_[slot] = len(self.hashes_)
+    if len(self.hashes_) > self.kMaxLoad * (self.mask_ + 1):
+      self.__Grow()
+    return True
+
+  def __Entry(self, entry : int) -> UrlEntry:
+    url = self.urls_[entry] if self.keep_urls_ else '%016x' % (self.hashes_[entry],)
+    return UrlEntry(url, self.counts_[entry],
+                    self.paths_[self.first_files_[entry]], self.first_tabs_[entry],
+                    self.paths_[self.last_files_[entry]], self.last_tabs_[entry])
+
+  # Returns the entry of |url|, or None if it was not seen.
+  def Get(self, url : str) -> UrlEntry:
+    entry = self.slots_[self.__Slot(_UrlHashes(NormalizeUrl(url))[0])]
+    if entry == 0:
+      return None
+    return self.__Entry(entry - 1)
+
+  # Yields the entries in the order their URLs were first seen.
+  def entries(self) -> Iterator[UrlEntry]:
+    for entry in range(len(self.hashes_)):
+      yield self.__Entry(entry)
+
+# BloomUrlFilter -------------------------------------------------------------
+
+# BloomUrlFilter answers "was this URL seen before?" in a fixed amount of
+# memory, sized for |capacity| distinct URLs with a false positive rate of
+# |error_rate| (about 1.2 bytes per URL at 0.1%). A false positive makes a new
+# URL look seen; a seen URL is never reported as new. It keeps no counts.
+class BloomUrlFilter:
+  def __init__(self, capacity : int, error_rate : float = 0.001):
+    if capacity <= 0:
+      raise ValueError('BloomUrlFilter: capacity must be positive')
+    if not 0 < error_rate < 1:
+      raise ValueError('BloomUrlFilter: error_rate must be between 0 and 1')
+    bit_count = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+    self.bit_count_ = bit_count
+    self.hash_count_ = max(1, int(round(bit_count / capacity * math.log(2))))
+    self.bits_ = bytearray((bit_count + 7) // 8)
+    self.count_ = 0
+
+  # Number of URLs added that were reported as new.
+  def __len__(self) -> int:
+    return self.count_
+
+  def size_in_bytes(self) -> int:
+    return len(self.bits_)
+
+  # Returns the bit positions of |url|, by double hashing.
+  def __Positions(self, url : str):
+    h1, h2 = _UrlHashes(NormalizeUrl(url))
+    bit_count = self.bit_count_
+    return [(h1 + i * h2) % bit_count for i in range(self.hash_count_)]
+
+  def MayContain(self, url : str) -> bool:
+    bits = self.bits_
+    return all(bits[position >> 3] & (1 << (position & 7)) for position in self.__Positions(url))
+
+  # Adds |url|. Returns true if it was (probably) not seen before.
+  def Add(self, url : str) -> bool:
+    bits = self.bits_
+    new = False
+    for position in self.__Positions(url):
+      mask = 1 << (position & 7)
+      if not bits[position >> 3] & mask:
+        bits[position >> 3] |= mask
+        new = True
+    if new:
+      self.count_ += 1
+    return new
@@ -0,0 +1,428 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, NamedTuple, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from timeit import default_timer as timer
+
+import os
+import glob
+import mmap
+import array
+import functools
+
+from chromepickle import FastPickleIterator, InterningPickleIterator, StringPool
+from session import SessionCommand, SessionFileReader, MappedSessionFileReader, SessionTypeForPath
+from constants import SessionType, const
+from tabnavigation import TabNavigation, LazyTabNavigation, ProjectedTabNavigation
+import stats
+from archive import IsArchivePath, IsCompressedPath, StripCompressedSuffix, IterSessionStreams, kArchiveReadErrors
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# File names of the session files in a profile directory.
+kSessionFileNames = (
+  const.kCurrentTabSessionFileName,
+  const.kLastTabSessionFileName,
+  const.kCurrentSessionFileName,
+  const.kLastSessionFileName,
+)
+
+# Id of the kCommandUpdateTabNavigation command of each session type.
+kUpdateTabNavigationCommandIds = {
+  SessionType.TAB_RESTORE : const.TabNavigation_kCommandUpdateTabNavigation,
+  SessionType.SESSION_RESTORE : const.kCommandUpdateTabNavigation,
+}
+
+# NavigationRecord is a flat, picklable copy of the fields of a navigation
+# read from a session file. Records are what worker processes send back, so
+# they hold only plain values.
+class NavigationRecord(NamedTuple):
+  path : str
+  session_type : int
+  tab_id : int
+  index : int
+  title : str
+  virtual_url : str
+  transition_type : int
+  referrer_url : str
+  original_request_url : str
+  timestamp : datetime
+
+# Short names accepted for NavigationRecord fields in projections.
+kRecordFieldAliases = {
+  'url' : 'virtual_url',
+  'transition' : 'transition_type',
+  'referrer' : 'referrer_url',
+  'original_url' : 'original_request_url',
+}
+
+# TabNavigation field each NavigationRecord field is read from; the others
+# come from the command or the file.
+_kNavigationFieldOfRecordField = {
+  'index' : 'index',
+  'title' : 'title',
+  'virtual_url' : 'virtual_url',
+  'transition_type' : 'transition_type',
+  'referrer_url' : 'referrer',
+  'original_request_url' : 'original_request_url',
+}
+
+# Returns the NavigationRecord fields named by |names|, which can use the
+# kRecordFieldAliases, in the order given. Raises ValueError for an unknown
+# name.
+def ResolveRecordFields(names : Iterable[str]) -> tuple:
+  fields = []
+  for name in names:
+    field = kRecordFieldAliases.get(name, name)
+    if field not in NavigationRecord._fields:
+      raise ValueError("unknown field '%s'" % (name,))
+    if field not in fields:
+      fields.append(field)
+  return tuple(fields)
+
+# Returns the TabNavigation fields (see ProjectedTabNavigation) needed for the
+# NavigationRecord |fields|, or None if every field is needed.
+def NavigationFieldsForRecordFields(fields : Iterable[str]) -> frozenset:
+  if fields is None:
+    return None
+  return frozenset(_kNavigationFieldOfRecordField[field] for field in fields if field in _kNavigationFieldOfRecordField)
+
+# Returns the session type of |path|, defaulting to TAB_RESTORE for files
+# that do not have one of the standard names.
+def SessionTypeOrDefault(path : str) -> SessionType:
+  session_type = SessionTypeForPath(path)
+  if session_type is None:
+    session_type = SessionType.TAB_RESTORE
+  return session_type
+
+# Reads the tab id and navigation of a kCommandUpdateTabNavigation command.
+# Returns (status, tab_id, navigation); status is false if the payload could
+# not be read, in which case navigation holds the fields read before the
+# error, or is None if not even the tab id could be read. If
+# |navigation_filter| (a navigationfilter.NavigationFilter) is given,
+# navigations it rejects are returned as (True, tab_id, None) without decoding
+# more of the payload than the tab id and URL. If |navigation_fields| (see
+# NavigationFieldsForRecordFields) is given, only those fields are read. If
+# |string_pool| is given, the strings of the navigation are shared through it
+# (see InterningPickleIterator).
+#
+# With stats enabled, the navigation is read as without them, with one timer
+# around the read (decode.navigation), and failed and legacy navigations are
+# counted.
+def ReadNavigationFromCommand(command, navigation_filter = None, navigation_fields : frozenset = None, string_pool : StringPool = None) -> Tuple[bool, int, TabNavigation]:
+  if string_pool is not None:
+    iterator = InterningPickleIterator(command.PayloadAsPickle(), string_pool)
+  else:
+    iterator = FastPickleIterator(command.PayloadAsPickle())
+  run_stats = stats.Get()
+  if run_stats is None:
+    return _ReadNavigation(iterator, navigation_filter, navigation_fields)
+  start = timer()
+  status, tab_id, navigation = _ReadNavigation(iterator, navigation_filter, navigation_fields)
+  run_stats.AddTime('decode.navigation', timer() - start)
+  if status == False:
+    run_stats.Add('navigations.failed')
+  elif navigation is not None and (navigation_fields is None or 'referrer' in navigation_fields) and navigation.is_legacy():
+    # Only navigations whose referrer was read can tell a legacy payload.
+    run_stats.Add('navigations.legacy')
+  return (status, tab_id, navigation)
+
+def _ReadNavigation(iterator, navigation_filter, navigation_fields : frozenset) -> Tuple[bool, int, TabNavigation]:
+  status, tab_id = iterator.ReadInt()
+  if status == False:
+    return (False, tab_id, None)
+  if navigation_fields is not None:
+    navigation = ProjectedTabNavigation(navigation_fields)
+  else:
+    navigation = LazyTabNavigation()
+  if navigation_filter is None:
+    status = navigation.ReadFromPickle(iterator)
+  else:
+    if not navigation_filter.MatchesTab(tab_id):
+      return (True, tab_id, None)
+    status, matched = navigation.ReadFromPickleIf(iterator, navigation_filter.MatchesUrl)
+    if status == True and matched == False:
+      return (True, tab_id, None)
+  return (status, tab_id, navigation)
+
+# Returns the NavigationRecord of a kCommandUpdateTabNavigation command, or
+# None if its payload could not be read or |navigation_filter| rejects it. See
+# ReadNavigationFromCommand; the record fields that depend on navigation
+# fields not in |navigation_fields| hold their defaults. With stats enabled,
+# the lazy decoding of the record fields is timed (decode.fields).
+def NavigationRecordFromCommand(path : str, session_type : int, command, navigation_filter = None, navigation_fields : frozenset = None, string_pool : StringPool = None) -> NavigationRecord:
+  status, tab_id, navigation = ReadNavigationFromCommand(command, navigation_filter, navigation_fields, string_pool)
+  if status == False or navigation is None:
+    return None
+  run_stats = stats.Get()
+  if run_stats is None:
+    return NavigationRecordFromNavigation(path, session_type, tab_id, navigation)
+  start = timer()
+  record = NavigationRecordFromNavigation(path, session_type, tab_id, navigation)
+  run_stats.AddTime('decode.fields', timer() - start)
+  return record
+
+# Returns the NavigationRecord of |navigation| of the tab |tab_id|.
+def NavigationRecordFromNavigation(path : str, session_type : int, tab_id : int, navigation) -> NavigationRecord:
+  referrer = navigation.referrer()
+  return NavigationRecord(path, int(session_type), tab_id, navigation.index(),
+                          navigation.title(), navigation.virtual_url(),
+                          navigation.transition_type(),
+                          referrer.url_ if referrer is not None else '',
+                          navigation.original_request_url() or '',
+                          navigation.timestamp())
+
+# Yields the navigations of the session file at |path| as they are read, only
+# those matching |navigation_filter| if it is given. If |fields| is given,
+# only what is needed for those NavigationRecord fields is decoded. If
+# |stream| (a binary file-like object) is given, the file is read from it and
+# |path| only names the records. If |string_pool| is given, the records share
+# their repeated strings through it. Raises ValueError if the file is not a
+# session file.
+def IterNavigationRecords(path : str, session_type : int = None, mapped : bool = False, navigation_filter = None, fields : Iterable[str] = None, stream = None, string_pool : StringPool = None) -> Iterator[NavigationRecord]:
+  navigation_fields = NavigationFieldsForRecordFields(fields)
+  if session_type is None:
+    session_type = SessionTypeOrDefault(path)
+  if stream is not None:
+    file_reader = SessionFileReader(stream)
+  elif mapped:
+    file_reader = MappedSessionFileReader(path)
+  else:
+    file_reader = SessionFileReader(path)
+  command_id = kUpdateTabNavigationCommandIds[session_type]
+  for command in file_reader.IterCommands(session_type):
+    if command.command_id() == command_id:
+      record = NavigationRecordFromCommand(path, session_type, command, navigation_filter, navigation_fields, string_pool)
+      if record is not None:
+        yield record
+
+# Reads all navigations of every session file in the tar or zip archive, or
+# compressed session file, at |path|. Returns a (name, status, records) tuple
+# per file, named as by IterSessionStreams; status is false if the file could
+# not be read. A file that cannot be read does not discard the records of the
+# others. If the archive itself is damaged, the files read before the damage
+# are kept and the file being read (or the archive, between files) is
+# reported as failed. |string_pool| is passed to IterNavigationRecords.
+def ExtractArchive(path : str, navigation_filter = None, fields : Iterable[str] = None, string_pool : StringPool = None) -> list:
+  results = []
+  name = path
+  try:
+    for name, stream in IterSessionStreams(path):
+      session_type = SessionTypeOrDefault(StripCompressedSuffix(name))
+      try:
+        records = list(IterNavigationRecords(name, session_type, navigation_filter=navigation_filter, fields=fields, stream=stream, string_pool=string_pool))
+      except (ValueError,) + kArchiveReadErrors:
+        results.append((name, False, []))
+      else:
+        results.append((name, True, records))
+      name = path
+  except kArchiveReadErrors:
+    results.append((name, False, []))
+  return results
+
+# Reads all navigations of the session file at |path|. Returns (path,
+# status, records); status is false if the file could not be read. If
+# |cache| (a parsecache.ParseCache) is given, only what it does not hold is
+# parsed; the cache holds every navigation, so |navigation_filter| is then
+# applied to the records it returns. |fields| and |string_pool| are passed to
+# IterNavigationRecords. Archives and compressed files are read with
+# ExtractArchive.
+def ExtractFile(path : str, cache = None, navigation_filter = None, fields : Iterable[str] = None, string_pool : StringPool = None) -> Tuple[str, bool, list]:
+  try:
+    if cache is not None:
+      records = cache.GetNavigationRecords(path)
+      if navigation_filter is not None:
+        records = [record for record in records if navigation_filter.MatchesRecord(record)]
+      return (path, True, records)
+    return (path, True, list(IterNavigationRecords(path, navigation_filter=navigation_filter, fields=fields, string_pool=string_pool)))
+  except (ValueError, OSError):
+    return (path, False, [])
+
+# Expands |patterns| into the sorted list of session files they name. Each
+# pattern can be a session file, a directory (searched recursively for files
+# named as in kSessionFileNames, e.g. a Chrome user data directory, for those
+# names with a compression suffix, and for tar and zip archives), or a glob
+# pattern matching either.
+def FindSessionFiles(patterns : Iterable[str]) -> list:
+  paths = set()
+  for pattern in patterns:
+    pattern = os.path.expanduser(pattern)
+    if glob.has_magic(pattern):
+      matches = glob.glob(pattern, recursive=True)
+    else:
+      matches = [pattern]
+    for match in matches:
+      if os.path.isdir(match):
+        for directory, directory_names, file_names in os.walk(match):
+          for file_name in file_names:
+            if StripCompressedSuffix(file_name) in kSessionFileNames or IsArchivePath(file_name):
+              paths.add(os.path.abspath(os.path.join(directory, file_name)))
+      elif os.path.isfile(match):
+        paths.add(os.path.abspath(match))
+  return sorted(paths)
+
+# Calls |function| with stats enabled, in a worker process. Returns its result
+# and the stats it recorded, as a dict for Stats.Merge.
+def _CallRecordingStats(function, *args):
+  worker_stats = stats.Enable(stats.Stats())
+  try:
+    return (function(*args), worker_stats.AsDict())
+  finally:
+    stats.Disable()
+
+# Returns the ExtractArchive results of |path| if it is an archive or
+# compressed file, and otherwise a list of its ExtractFile result. This is the
+# unit of work run in the worker processes of ExtractFiles.
+#
+# With |intern_strings| the strings of the records are shared through a
+# StringPool for the file. A referrer is usually the URL of the previous
+# navigation, and many navigations repeat a URL, so the results pickled back
+# to the parent process hold each string once and are less than half the
+# size.
+def _ExtractPath(path : str, cache = None, navigation_filter = None, fields : Iterable[str] = None, intern_strings : bool = False) -> list:
+  string_pool = StringPool() if intern_strings else None
+  if IsArchivePath(path) or IsCompressedPath(path):
+    return ExtractArchive(path, navigation_filter, fields, string_pool)
+  return [ExtractFile(path, cache, navigation_filter, fields, string_pool)]
+
+# Extracts the navigations of every file in |paths| using |workers| processes
+# (one per CPU by default). Yields ExtractFile results in the order of
+# |paths|, so the output does not depend on which worker finishes first;
+# archives and compressed files yield one ExtractArchive result per session
+# file in them.
+def ExtractFiles(paths : list, workers : int = None, chunksize : int = 1, cache = None, navigation_filter = None, fields : Iterable[str] = None) -> Iterator[Tuple[str, bool, list]]:
+  extract_path = functools.partial(_ExtractPath, cache=cache, navigation_filter=navigation_filter, fields=fields)
+  if workers is None:
+    workers = os.cpu_count() or 1
+  if workers <= 1 or len(paths) <= 1:
+    for path in paths:
+      yield from extract_path(path)
+    return
+  extract_path = functools.partial(extract_path, intern_strings=True)
+  run_stats = stats.Get()
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    if run_stats is None:
+      for results in executor.map(extract_path, paths, chunksize=chunksize):
+        yield from results
+      return
+    # The workers record into their own stats, which are merged here.
+    for results, worker_stats in executor.map(functools.partial(_CallRecordingStats, extract_path), paths, chunksize=chunksize):
+      run_stats.Merge(worker_stats)
+      yield from results
+
+# Commands decoded per task by ExtractFileParallel. Tasks are sent as two
+# arrays of offsets and sizes, and return plain records.
+kDefaultSpansPerTask = 4096
+
+# Returns the records of the kCommandUpdateTabNavigation commands whose
+# contents are at |offsets| and |sizes| in |view|, the contents of the file
+# at |path|. Navigations that could not be read or that |navigation_filter|
+# rejects are skipped, and only what |fields| needs is decoded, as in
+# IterNavigationRecords, as is |string_pool|.
+def DecodeNavigationSpans(path : str, view : memoryview, session_type : int, offsets : Iterable[int], sizes : Iterable[int], navigation_filter = None, fields : Iterable[str] = None, string_pool : StringPool = None) -> list:
+  command_id = kUpdateTabNavigationCommandIds[session_type]
+  navigation_fields = NavigationFieldsForRecordFields(fields)
+  records = []
+  for offset, size in zip(offsets, sizes):
+    record = NavigationRecordFromCommand(path, session_type, SessionCommand(command_id, view[offset : offset + size]), navigation_filter, navigation_fields, string_pool)
+    if record is not None:
+      records.append(record)
+  return records
+
+# The read-only mapping of the file decoded by an ExtractFileParallel worker,
+# set up once per process by _MapSpanWorkerFile. The mapping is backed by the
+# file, so the workers share the pages of the OS page cache and the file is
+# never copied.
+#
+# The parent's offsets are only valid for the file it framed. Chrome replaces
+# and rewrites session files routinely, so each worker checks that the file
+# it opened is the one the parent mapped (see _FileIdentity); if not,
+# _span_worker_error is set and every task raises ValueError.
+_span_worker_path = None
+_span_worker_view = None
+_span_worker_error = None
+
+# Returns the (device, inode, size, mtime) of |stat|, which identify the
+# contents of a session file.
+def _FileIdentity(stat : os.stat_result) -> tuple:
+  return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def _MapSpanWorkerFile(path : str, identity : tuple):
+  global _span_worker_path, _span_worker_view, _span_worker_error
+  _span_worker_path = path
+  with open(path, 'rb') as f:
+    if _FileIdentity(os.fstat(f.fileno())) != identity:
+      _span_worker_error = "ExtractFileParallel: '%s' changed while it was decoded" % (path,)
+      return
+    _span_worker_view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+# The records of a task share their strings, as in _ExtractPath, so they are
+# pickled back to the parent process once.
+def _DecodeWorkerSpans(session_type : int, offsets : array.array, sizes : array.array, navigation_filter = None, fields : Iterable[str] = None) -> list:
+  if _span_worker_error is not None:
+    raise ValueError(_span_worker_error)
+  return DecodeNavigationSpans(_span_worker_path, _span_worker_view, session_type, offsets, sizes, navigation_filter, fields, StringPool())
+
+# Yields the navigations of the single session file at |path|, decoding them
+# in |workers| processes. The file is framed once in this process; the
+# workers then each map the file and decode |spans_per_task| commands at a
+# time. Records are yielded in file order, exactly as IterNavigationRecords
+# yields them. Raises ValueError if the file is not a session file, or if it
+# was replaced or changed before a worker mapped it.
+def ExtractFileParallel(path : str, session_type : int = None, workers : int = None, spans_per_task : int = kDefaultSpansPerTask, navigation_filter = None, fields : Iterable[str] = None) -> Iterator[NavigationRecord]:
+  if session_type is None:
+    session_type = SessionTypeOrDefault(path)
+  if workers is None:
+    workers = os.cpu_count() or 1
+  command_id = kUpdateTabNavigationCommandIds[session_type]
+  offsets = array.array('Q')
+  sizes = array.array('H')
+  file_reader = MappedSessionFileReader(path)
+  try:
+    identity = _FileIdentity(file_reader.stat())
+    for span_command_id, offset, size in file_reader.IterCommandSpans(session_type):
+      if span_command_id == command_id:
+        offsets.append(offset)
+        sizes.append(size)
+    if workers <= 1 or len(offsets) <= spans_per_task:
+      yield from DecodeNavigationSpans(path, file_reader.view(), session_type, offsets, sizes, navigation_filter, fields)
+      return
+  finally:
+    file_reader.Close()
+
+  starts = range(0, len(offsets), spans_per_task)
+  task_offsets = [offsets[start : start + spans_per_task] for start in starts]
+  task_sizes = [sizes[start : start + spans_per_task] for start in starts]
+  run_stats = stats.Get()
+  task_arguments = ([session_type] * len(starts), task_offsets, task_sizes, [navigation_filter] * len(starts), [fields] * len(starts))
+  with ProcessPoolExecutor(max_workers=min(workers, len(starts)), initializer=_MapSpanWorkerFile, initargs=(path, identity)) as executor:
+    if run_stats is None:
+      for records in executor.map(_DecodeWorkerSpans, *task_arguments):
+        yield from records
+      return
+    for records, worker_stats in executor.map(functools.partial(_CallRecordingStats, _DecodeWorkerSpans), *task_arguments):
+      run_stats.Merge(worker_stats)
+      yield from records
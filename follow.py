@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import Iterator, Tuple
+from timeit import default_timer as timer
+
+import os
+import time
+import collections
+
+from session import SessionCommand, SessionFileReader
+from constants import SizeOf
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Number of latencies kept for the most recent polls.
+_kMaxLatencies = 1024
+
+# Number of bytes before the resume offset that are remembered to detect a
+# file that was rewritten in place and has grown past the old offset.
+_kFingerprintSize = 64
+
+# SessionFileFollower ---------------------------------------------------------
+
+# SessionFileFollower follows a session file while Chrome appends commands to
+# it. Each Poll() reads only the commands appended since the previous poll,
+# resuming from the offset of the last complete command.
+#
+# Chrome recreates the file every kWritesPerReset commands. A rewrite is
+# detected when the file was replaced (a new inode), shrank below the resume
+# offset, or no longer holds the bytes that were read just before the resume
+# offset; the header is then checked against kFileSignature again and the
+# file is read from the top.
+class SessionFileFollower:
+  def __init__(self, path : str, session_type : int, poll_interval : float = 1.0):
+    self.path_ = path
+    self.session_type_ = session_type
+    self.poll_interval_ = poll_interval
+    self.reader_ : SessionFileReader = None
+    self.identity_ : Tuple[int, int] = None
+    self.fingerprint_ : bytes = b''
+    # Number of times the file was read from the top after the first time.
+    self.restart_count_ = 0
+    # Seconds from the file's modification time to the poll that read the
+    # appended commands, for the most recent polls that found new commands.
+    self.latencies_ = collections.deque(maxlen=_kMaxLatencies)
+
+  def restart_count(self) -> int:
+    return self.restart_count_
+
+  # Returns the recorded append-to-read latencies in seconds.
+  def latencies(self) -> list:
+    return list(self.latencies_)
+
+  # Returns the bytes just before the resume offset of the reader.
+  def __ReadFingerprint(self, offset : int) -> bytes:
+    start = max(offset - _kFingerprintSize, SizeOf.FILEHEADER)
+    with open(self.path_, 'rb') as f:
+      f.seek(start)
+      return f.read(offset - start)
+
+  # Returns true if the file at path_ is no longer the one being followed.
+  def __WasRewritten(self, stat : os.stat_result) -> bool:
+    if self.reader_ is None:
+      return True
+    if (stat.st_dev, stat.st_ino) != self.identity_:
+      return True
+    offset = self.reader_.offset()
+    if stat.st_size < offset:
+      return True
+    return self.__ReadFingerprint(offset) != self.fingerprint_
+
+  # Returns the commands appended since the last poll, or all commands if the
+  # file is new or was rewritten. Returns an empty list while the file is
+  # missing or its header is incomplete, as happens during a rewrite.
+  def Poll(self) -> list:
+    try:
+      stat = os.stat(self.path_)
+    except FileNotFoundError:
+      return []
+
+    if self.__WasRewritten(stat):
+      if self.reader_ is not None:
+        self.reader_.Close()
+        self.restart_count_ += 1
+      self.reader_ = None
+      try:
+        reader = SessionFileReader(self.path_)
+        commands = list(reader.IterCommands(self.session_type_))
+      except (ValueError, OSError):
+        # Header missing or invalid; try again on the next poll.
+        return []
+      self.reader_ = reader
+      self.identity_ = (stat.st_dev, stat.st_ino)
+    elif stat.st_size == self.reader_.offset():
+      return []
+    else:
+      commands = list(self.reader_.IterAppendedCommands())
+
+    # The fingerprint is taken after every read, including one that found no
+    # commands (e.g. a rewrite to a header-only file), so the next poll
+    # compares against the file that was just read.
+    self.fingerprint_ = self.__ReadFingerprint(self.reader_.offset())
+    if len(commands) > 0:
+      self.latencies_.append(max(time.time() - stat.st_mtime, 0.0))
+    return commands
+
+  # Yields commands as they are appended to the file, polling every
+  # poll_interval seconds, until |duration| seconds have passed (forever if
+  # None). The delay from an append to its command being yielded is bounded
+  # by poll_interval plus the time to read the appended commands.
+  def Follow(self, duration : float = None) -> Iterator[SessionCommand]:
+    end = None if duration is None else timer() + duration
+    while end is None or timer() < end:
+      for command in self.Poll():
+        yield command
+      time.sleep(self.poll_interval_)
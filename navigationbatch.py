@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, Tuple
+from array import array
+
+import sys
+import struct
+
+from constants import SizeOf, PickleFieldType, const
+from tabnavigation import TabNavigation_kUpdateCommandSchema
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+_kBoolStruct = struct.Struct(_kByteOrder + '?')
+_kIntStruct = struct.Struct(_kByteOrder + 'i')
+_kUInt32Struct = struct.Struct(_kByteOrder + 'I')
+_kUTF16Codec = 'utf-16-be' if sys.byteorder == "big" else 'utf-16-le'
+
+# Number of bytes per character of the length prefixed field types.
+_kCharSize = {
+  PickleFieldType.STRING : 1,
+  PickleFieldType.STRING16 : 2,
+  PickleFieldType.BINARY_STRING : 1,
+}
+
+# Returns an empty column for values of |field_type|: fixed size values are
+# stored in arrays, strings and blobs in lists.
+def _NewColumn(field_type : PickleFieldType):
+  if field_type == PickleFieldType.INT:
+    return array('i')
+  if field_type == PickleFieldType.BOOL:
+    return array('b')
+  return []
+
+# NavigationBatch ------------------------------------------------------------
+
+# NavigationBatch decodes kCommandUpdateTabNavigation payloads into columns
+# instead of one TabNavigation object per navigation. The layout is taken
+# from a record schema (TabNavigation_kUpdateCommandSchema by default), and
+# each column is available by field name, e.g. batch.column('virtual_url').
+#
+# Payloads are decoded directly from a shared buffer (for example the view()
+# of a MappedSessionFileReader) in a single pass, without creating a Pickle,
+# PickleIterator or TabNavigation per record.
+class NavigationBatch:
+  def __init__(self, schema : tuple = TabNavigation_kUpdateCommandSchema):
+    self.schema_ = schema
+    self.names_ = tuple(name for name, field_type, default in schema)
+    self.columns_ = {name : _NewColumn(field_type) for name, field_type, default in schema}
+    # Number of payloads that were missing a required field.
+    self.failed_count_ = 0
+
+  # Returns the column holding the values of field |name|.
+  def column(self, name : str):
+    return self.columns_[name]
+
+  # Returns the field names, in schema order.
+  def names(self) -> tuple:
+    return self.names_
+
+  # Number of decoded records.
+  def size(self) -> int:
+    return len(self.columns_[self.names_[0]])
+
+  # Number of payloads skipped because a required field could not be read.
+  def failed_count(self) -> int:
+    return self.failed_count_
+
+  # Yields the decoded records as tuples in schema order.
+  def rows(self) -> Iterator[tuple]:
+    return zip(*(self.columns_[name] for name in self.names_))
+
+  # Decodes the pickles located at |spans| ((offset, size) pairs) within
+  # |buffer| and appends them to the columns. Returns the number of records
+  # that were decoded. Payloads are accepted, and their optional fields
+  # defaulted, as TabNavigation.ReadFromPickle does for the same bytes.
+  def Decode(self, buffer, spans : Iterable[Tuple[int, int]]) -> int:
+    view = memoryview(buffer)
+    # Field types are compared as plain ints; IntEnum comparisons are slow.
+    fields = [(int(field_type), default, _kCharSize.get(field_type, 0)) for name, field_type, default in self.schema_]
+    INT = int(PickleFieldType.INT)
+    BOOL = int(PickleFieldType.BOOL)
+    STRING = int(PickleFieldType.STRING)
+    STRING16 = int(PickleFieldType.STRING16)
+    INT_SIZE = int(SizeOf.INT)
+    BOOL_SIZE = int(SizeOf.BOOL)
+    # The first optional field (type_mask) gates the fields after it, as in
+    # TabNavigation.ReadFromPickle: if it is missing none of them are read.
+    # Each later optional field falls back to its default on its own.
+    gate = next((position for position, (field_type, default, char_size) in enumerate(fields) if default is not None), len(fields))
+    appends = [self.columns_[name].append for name in self.names_]
+    unpack_int = _kIntStruct.unpack_from
+    decoded = 0
+    for offset, size in spans:
+      # Same header validation as Pickle: the header size is whatever precedes
+      # the payload and must be uint32 aligned.
+      if size < SizeOf.HEADER:
+        self.failed_count_ += 1
+        continue
+      header_size = size - _kUInt32Struct.unpack_from(view, offset)[0]
+      if header_size <= 0 or header_size > size or header_size % SizeOf.UINT32:
+        self.failed_count_ += 1
+        continue
+      read_ptr = offset + header_size
+      end = offset + size
+      values = []
+      missing = False
+      for position, (field_type, default, char_size) in enumerate(fields):
+        if missing:
+          # The gating field was absent, so none of the later ones exist.
+          values.append(default)
+          continue
+        value = None
+        if field_type == BOOL:
+          # Bools are read as PickleIterator.ReadBool does: one byte must be
+          # left, and the read advances by a uint32.
+          if end - read_ptr >= BOOL_SIZE:
+            value = _kBoolStruct.unpack_from(view, read_ptr)[0]
+            read_ptr += INT_SIZE
+        elif end - read_ptr >= INT_SIZE:
+          if field_type == INT:
+            value = unpack_int(view, read_ptr)[0]
+            read_ptr += INT_SIZE
+          else:
+            num_bytes = unpack_int(view, read_ptr)[0] * char_size
+            read_ptr += INT_SIZE
+            if num_bytes >= 0 and end - read_ptr >= num_bytes:
+              data = view[read_ptr : read_ptr + num_bytes]
+              if field_type == STRING:
+                value = str(data, 'utf-8')
+              elif field_type == STRING16:
+                value = str(data, _kUTF16Codec)
+              else:
+                value = data.tobytes()
+              read_ptr += (num_bytes + 3) & ~3
+        if value is None:
+          if default is None:
+            break
+          missing = position == gate
+          value = default
+        values.append(value)
+      if len(values) != len(fields):
+        self.failed_count_ += 1
+        continue
+      for append, value in zip(appends, values):
+        append(value)
+      decoded += 1
+    return decoded
+
+  # Decodes the navigations of the mapped session file read by |reader|, a
+  # MappedSessionFileReader, in one pass over its mapping.
+  def DecodeFile(self, reader, session_type : int, command_id : int = const.TabNavigation_kCommandUpdateTabNavigation) -> int:
+    spans = ((offset, size) for id, offset, size in reader.IterCommandSpans(session_type) if id == command_id)
+    return self.Decode(reader.view(), spans)
+
+  # Decodes the navigations found in an iterable of SessionCommands.
+  def DecodeCommands(self, commands : Iterable, command_id : int = const.TabNavigation_kCommandUpdateTabNavigation) -> int:
+    decoded = 0
+    for command in commands:
+      if command.command_id() == command_id:
+        decoded += self.Decode(command.contents(), ((0, command.size()),))
+    return decoded
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from typing import Iterable
+
+import re
+import fnmatch
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Matches the scheme and host of a URL with an authority, e.g.
+# "https://user@www.example.com:8080/path". The user info ends at the last
+# '@' of the authority, as in urlparse's hostname. The brackets of an IPv6
+# host are not part of the host group.
+_kSchemeAndHost = re.compile(r'([A-Za-z][A-Za-z0-9+.\-]*):(?://(?:[^/?#]*@)?(?:\[([^\]/?#]*)\]|([^/?#:]*)))?')
+
+# Returns the lower case scheme and host of |url|; either is '' if |url| has
+# none. IPv6 hosts are returned without their brackets (e.g. "::1" for
+# "http://[::1]:8080/"), as urlparse's hostname does.
+def SchemeAndHostOfUrl(url : str) -> tuple:
+  match = _kSchemeAndHost.match(url)
+  if match is None:
+    return ('', '')
+  return (match.group(1).lower(), (match.group(2) or match.group(3) or '').lower())
+
+# NavigationFilter -----------------------------------------------------------
+
+# NavigationFilter selects navigations by tab id and URL, so that readers can
+# drop the others as early as possible: the tab id is checked before the
+# navigation is read at all, and the URL (the second field of the payload)
+# before the title, content state and referrer are decoded. See
+# TabNavigation.ReadFromPickleIf.
+#
+# A navigation matches if its tab id is one of |tab_ids|, its scheme one of
+# |schemes|, its host matches one of the |host_globs| (fnmatch patterns such
+# as "*.corp.example.com", compared case-insensitively), and |url_regex| is
+# found in its URL. Criteria left as None are not checked. Raises re.error if
+# |url_regex| is not a valid regular expression.
+class NavigationFilter:
+  def __init__(self, host_globs : Iterable[str] = None, schemes : Iterable[str] = None,
+               url_regex : str = None, tab_ids : Iterable[int] = None):
+    self.host_globs_ = tuple(host_globs) if host_globs else None
+    self.schemes_ = frozenset(scheme.lower().rstrip(':') for scheme in schemes) if schemes else None
+    self.url_regex_ = url_regex
+    self.tab_ids_ = frozenset(tab_ids) if tab_ids is not None else None
+    # The host globs are compiled into a single regular expression.
+    self.host_pattern_ = None
+    if self.host_globs_ is not None:
+      self.host_pattern_ = re.compile('|'.join('(?:%s)' % (fnmatch.translate(host_glob.lower()),)
+                                               for host_glob in self.host_globs_))
+    self.url_pattern_ = re.compile(url_regex) if url_regex is not None else None
+
+  # NavigationFilters are sent to worker processes; the compiled patterns are
+  # rebuilt there from the arguments.
+  def __getstate__(self):
+    return (self.host_globs_, self.schemes_, self.url_regex_, self.tab_ids_)
+
+  def __setstate__(self, state):
+    self.__init__(*state)
+
+  # Returns true if navigations of the tab |tab_id| can match.
+  def MatchesTab(self, tab_id : int) -> bool:
+    return self.tab_ids_ is None or tab_id in self.tab_ids_
+
+  # Returns true if |url| matches the scheme, host and URL criteria.
+  def MatchesUrl(self, url : str) -> bool:
+    if self.schemes_ is not None or self.host_pattern_ is not None:
+      scheme, host = SchemeAndHostOfUrl(url)
+      if self.schemes_ is not None and scheme not in self.schemes_:
+        return False
+      if self.host_pattern_ is not None and self.host_pattern_.match(host) is None:
+        return False
+    if self.url_pattern_ is not None and self.url_pattern_.search(url) is None:
+      return False
+    return True
+
+  # Returns true if the extract.NavigationRecord |record| matches, for
+  # records that were read without the filter (e.g. from a ParseCache).
+  def MatchesRecord(self, record) -> bool:
+    return self.MatchesTab(record.tab_id) and self.MatchesUrl(record.virtual_url)
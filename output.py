@@ -0,0 +1,290 @@
+from __future__ import annotations
+from typing import Iterable, BinaryIO
+from datetime import datetime
+
+import io
+import os
+import sys
+import csv
+import json
+import array
+import struct
+
+from extract import NavigationRecord
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Size of the buffer output is collected in before it is written.
+kOutputBufferSize = 1024 * 1024
+
+# Fields written for each navigation, in order.
+kRecordFields = NavigationRecord._fields
+
+# Opens |path| (stdout if None) for writing through a kOutputBufferSize
+# buffer. The returned stream does not close stdout.
+def OpenOutput(path : str = None, binary : bool = False):
+  if path is None:
+    sys.stdout.flush()
+    stream = io.FileIO(sys.stdout.fileno(), 'w', closefd=False)
+  else:
+    stream = io.FileIO(path, 'w')
+  stream = io.BufferedWriter(stream, buffer_size=kOutputBufferSize)
+  if binary:
+    return stream
+  return io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=False)
+
+_kTimestampIndex = kRecordFields.index('timestamp')
+
+# Returns the indexes in kRecordFields of |fields|, or None for all fields.
+# Raises ValueError for an unknown field.
+def _FieldIndexes(fields : Iterable[str]) -> tuple:
+  if fields is None:
+    return None
+  return tuple(kRecordFields.index(field) for field in fields)
+
+# Returns |timestamp| as written by the text formats; None (not known) is kept
+# as None, written as null in JSON and as an empty field in CSV and TSV.
+def _TimestampValue(timestamp : datetime) -> str:
+  return timestamp.isoformat() if timestamp is not None else None
+
+# Returns the values of |record| as written by the text formats, only those at
+# |field_indexes| if it is given.
+def _RecordValues(record : NavigationRecord, field_indexes : tuple = None) -> list:
+  if field_indexes is None:
+    values = list(record)
+    values[-1] = _TimestampValue(record.timestamp)
+    return values
+  return [_TimestampValue(record.timestamp) if index == _kTimestampIndex else record[index] for index in field_indexes]
+
+# JsonLinesRecordWriter ------------------------------------------------------
+
+# Writes one JSON object per navigation and line, with the record fields in
+# |fields| (all by default).
+class JsonLinesRecordWriter:
+  def __init__(self, stream, fields : Iterable[str] = None):
+    self.stream_ = stream
+    self.encoder_ = json.JSONEncoder(ensure_ascii=False)
+    self.fields_ = tuple(fields) if fields is not None else kRecordFields
+    self.field_indexes_ = _FieldIndexes(fields)
+
+  def Write(self, record : NavigationRecord):
+    self.stream_.write(self.encoder_.encode(dict(zip(self.fields_, _RecordValues(record, self.field_indexes_)))))
+    self.stream_.write('\n')
+
+  def Flush(self):
+    self.stream_.flush()
+
+  def Close(self):
+    self.stream_.close()
+
+# DelimitedRecordWriter ------------------------------------------------------
+
+# Writes a header row of the field names and then one row per navigation,
+# separated by |delimiter| (CSV or TSV), with the record fields in |fields|
+# (all by default).
+class DelimitedRecordWriter:
+  def __init__(self, stream, delimiter : str = ',', fields : Iterable[str] = None):
+    self.stream_ = stream
+    self.field_indexes_ = _FieldIndexes(fields)
+    self.writer_ = csv.writer(stream, delimiter=delimiter, lineterminator='\n')
+    self.writer_.writerow(tuple(fields) if fields is not None else kRecordFields)
+
+  def Write(self, record : NavigationRecord):
+    self.writer_.writerow(_RecordValues(record, self.field_indexes_))
+
+  def Flush(self):
+    self.stream_.flush()
+
+  def Close(self):
+    self.stream_.close()
+
+# ColumnarRecordWriter -------------------------------------------------------
+
+# The columnar format stores each field as a fixed width array, so a reader
+# can load a column with one bulk read. String fields are stored as an array
+# of indexes into a table of the distinct strings of the column.
+#
+# File layout (integers in the byte order given in the header, every array
+# starting at a multiple of 8 bytes from the start of the file):
+#
+#   char[8]  magic "CTCOLS01"
+#   char     byte order, '<' or '>'
+#   uint8[3] padding
+#   uint32   number of columns
+#   uint64   number of records (n)
+#   columns, each:
+#     uint16   length of the name, followed by the UTF-8 name
+#     char     type: 'i' (int32), 'q' (int64) or 's' (string)
+#     padding to 8 bytes
+#     'i', 'q': n values
+#     's':      uint32[n] indexes into the string table, padding to 8 bytes,
+#               uint64 number of strings (m), uint64[m + 1] offsets into the
+#               UTF-8 data, then the data, padded to 8 bytes
+#
+# Timestamps are microseconds since the Unix epoch (int64), or
+# kColumnarNullTimestamp if they are not known.
+kColumnarMagic = b'CTCOLS01'
+kColumnarNullTimestamp = -(1 << 63)
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+_kColumnarHeader = struct.Struct(_kByteOrder + '8sc3xIQ')
+_kColumnarNameSize = struct.Struct(_kByteOrder + 'H')
+_kColumnarCount = struct.Struct(_kByteOrder + 'Q')
+
+# Column type of each field.
+kColumnarTypes = {
+  'path' : 's',
+  'session_type' : 'i',
+  'tab_id' : 'i',
+  'index' : 'i',
+  'title' : 's',
+  'virtual_url' : 's',
+  'transition_type' : 'i',
+  'referrer_url' : 's',
+  'original_request_url' : 's',
+  'timestamp' : 'q',
+}
+
+# array typecodes of the column types and of the string table.
+_kArrayTypecodes = {'i' : 'i', 'q' : 'q', 's' : 'I'}
+_kOffsetTypecode = 'Q'
+
+def _Padding(size : int) -> bytes:
+  return bytes(-size % 8)
+
+# Collects navigations into columns, written to |stream| by Close(). Only the
+# record fields in |fields| (all by default) get a column.
+class ColumnarRecordWriter:
+  def __init__(self, stream : BinaryIO, fields : Iterable[str] = None):
+    self.stream_ = stream
+    self.fields_ = tuple(fields) if fields is not None else kRecordFields
+    self.field_indexes_ = _FieldIndexes(fields)
+    self.columns_ = [array.array(_kArrayTypecodes[kColumnarTypes[name]]) for name in self.fields_]
+    # Index of each string of a string column in its table.
+    self.string_indexes_ = [{} if kColumnarTypes[name] == 's' else None for name in self.fields_]
+    self.count_ = 0
+
+  def Write(self, record : NavigationRecord):
+    if self.field_indexes_ is not None:
+      record = [record[index] for index in self.field_indexes_]
+    for column, string_indexes, value in zip(self.columns_, self.string_indexes_, record):
+      if string_indexes is not None:
+        index = string_indexes.get(value)
+        if index is None:
+          index = len(string_indexes)
+          string_indexes[value] = index
+        column.append(index)
+      elif isinstance(value, datetime):
+        column.append(int(value.timestamp() * 1000000))
+      elif value is None:
+        column.append(kColumnarNullTimestamp)
+      else:
+        column.append(int(value))
+    self.count_ += 1
+
+  def Close(self):
+    out = self.stream_
+    position = out.write(_kColumnarHeader.pack(kColumnarMagic, _kByteOrder.encode('ascii'), len(self.fields_), self.count_))
+    for name, column, string_indexes in zip(self.fields_, self.columns_, self.string_indexes_):
+      encoded_name = name.encode('utf-8')
+      column_type = kColumnarTypes[name].encode('ascii')
+      header = _kColumnarNameSize.pack(len(encoded_name)) + encoded_name + column_type
+      position += out.write(header + _Padding(position + len(header)))
+      position += out.write(column)
+      position += out.write(_Padding(position))
+      if string_indexes is None:
+        continue
+      # dicts keep insertion order, which is the index order.
+      strings = [value.encode('utf-8') for value in string_indexes]
+      offsets = array.array(_kOffsetTypecode, [0])
+      for data in strings:
+        offsets.append(offsets[-1] + len(data))
+      position += out.write(_kColumnarCount.pack(len(strings)))
+      position += out.write(offsets)
+      for data in strings:
+        position += out.write(data)
+      position += out.write(_Padding(position))
+    out.close()
+
+# Reads a file written by ColumnarRecordWriter from |data| (e.g. a mapped
+# file), on a machine of either byte order. Returns a dict of field name to
+# column: an array for integer columns, a list of strings for string columns.
+def ReadColumnar(data) -> dict:
+  view = memoryview(data)
+  if len(view) < _kColumnarHeader.size or view[0 : len(kColumnarMagic)] != kColumnarMagic:
+    raise ValueError('ReadColumnar: not a columnar file')
+  # The header is in the byte order of the file, recorded after the magic.
+  byteorder = chr(view[len(kColumnarMagic)])
+  if byteorder not in ('<', '>'):
+    raise ValueError('ReadColumnar: unknown byte order %r' % (byteorder,))
+  _, _, column_count, count = struct.unpack_from(byteorder + '8sc3xIQ', view, 0)
+  swap = byteorder != _kByteOrder
+  position = _kColumnarHeader.size
+  columns = {}
+  for _ in range(column_count):
+    name_size, = struct.unpack_from(byteorder + 'H', view, position)
+    position += _kColumnarNameSize.size
+    name = str(view[position : position + name_size], 'utf-8')
+    position += name_size
+    column_type = chr(view[position])
+    position += 1
+    position += -position % 8
+
+    column = array.array(_kArrayTypecodes[column_type])
+    end = position + count * column.itemsize
+    column.frombytes(view[position : end])
+    if swap:
+      column.byteswap()
+    position = end + (-end % 8)
+    if column_type == 's':
+      string_count, = struct.unpack_from(byteorder + 'Q', view, position)
+      position += _kColumnarCount.size
+      offsets = array.array(_kOffsetTypecode)
+      end = position + (string_count + 1) * offsets.itemsize
+      offsets.frombytes(view[position : end])
+      if swap:
+        offsets.byteswap()
+      position = end
+      table = [str(view[position + offsets[i] : position + offsets[i + 1]], 'utf-8') for i in range(string_count)]
+      position += offsets[-1]
+      position += -position % 8
+      column = [table[index] for index in column]
+    columns[name] = column
+  return columns
+
+# Writer class and whether it writes binary data, per --format.
+kRecordWriters = {
+  'jsonl' : (JsonLinesRecordWriter, False),
+  'csv' : (lambda stream, fields=None: DelimitedRecordWriter(stream, ',', fields), False),
+  'tsv' : (lambda stream, fields=None: DelimitedRecordWriter(stream, '\t', fields), False),
+  'columnar' : (ColumnarRecordWriter, True),
+}
+
+# Returns a writer of |output_format| writing to |path| (stdout if None), with
+# the record fields in |fields| (all by default).
+def OpenRecordWriter(output_format : str, path : str = None, fields : Iterable[str] = None):
+  writer_class, binary = kRecordWriters[output_format]
+  return writer_class(OpenOutput(path, binary), fields)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+from typing import Tuple
+
+import os
+import json
+import hashlib
+
+from session import SessionFileReader
+from extract import NavigationRecord, NavigationRecordFromCommand, SessionTypeOrDefault, kUpdateTabNavigationCommandIds
+from constants import SizeOf
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Version of the cache entry format; entries of other versions are ignored.
+_kCacheVersion = 2
+
+# Default location and size cap of the cache.
+kDefaultCacheDirectory = os.path.join('~', '.cache', 'chrometabs')
+kDefaultCacheMaxBytes = 256 * 1024 * 1024
+
+# Maximum number of bytes at the start of a session file (including the
+# FileHeader) hashed to identify its contents. Only bytes before the cached
+# offset are hashed, so appending to a small file does not change its prefix.
+_kPrefixSize = 4096
+
+# Number of bytes before the cached offset hashed to check that a grown file
+# was only appended to.
+_kTailSize = 64
+
+# ParseCache -----------------------------------------------------------------
+
+# ParseCache stores the NavigationRecords decoded from session files on disk,
+# one JSON entry per session file, so unchanged files are not parsed again.
+#
+# An entry is keyed on the session file's path and records its size, mtime, a
+# hash of its first bytes, and the offset just past the last command read,
+# with a hash of the bytes before that offset. When a file is looked up:
+#
+# . If size, mtime and hashes match, the cached records are returned.
+# . If the file grew and the hashed bytes are unchanged, Chrome only appended
+#   to it, so only the commands after the cached offset are parsed.
+# . Otherwise the file is parsed from the start.
+#
+# The total size of the entries is capped; the least recently used entries
+# are evicted first. Entry modification times record their last use.
+class ParseCache:
+  def __init__(self, directory : str = kDefaultCacheDirectory, max_bytes : int = kDefaultCacheMaxBytes):
+    self.directory_ = os.path.abspath(os.path.expanduser(directory))
+    self.max_bytes_ = max_bytes
+    self.hit_count_ = 0
+    self.append_count_ = 0
+    self.miss_count_ = 0
+
+  def directory(self) -> str:
+    return self.directory_
+
+  # Number of lookups answered from the cache without parsing.
+  def hit_count(self) -> int:
+    return self.hit_count_
+
+  # Number of lookups that only parsed commands appended since caching.
+  def append_count(self) -> int:
+    return self.append_count_
+
+  # Number of lookups that parsed the whole file.
+  def miss_count(self) -> int:
+    return self.miss_count_
+
+  # Returns the path of the cache entry of the session file at |path|.
+  def __EntryPath(self, path : str) -> str:
+    digest = hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(self.directory_, digest + '.json')
+
+  # Returns hashes of the first |prefix_size| bytes of the file and of the
+  # bytes just before |offset|.
+  def __Fingerprint(self, path : str, offset : int, prefix_size : int) -> Tuple[str, str]:
+    with open(path, 'rb') as f:
+      prefix = f.read(prefix_size)
+      start = max(offset - _kTailSize, SizeOf.FILEHEADER)
+      f.seek(start)
+      tail = f.read(offset - start)
+    return (hashlib.sha256(prefix).hexdigest(), hashlib.sha256(tail).hexdigest())
+
+  # Returns the cached entry of |path|, or None.
+  def __LoadEntry(self, path : str) -> dict:
+    try:
+      with open(self.__EntryPath(path), 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if entry.get('version') != _kCacheVersion or entry.get('path') != path:
+      return None
+    return entry
+
+  def __StoreEntry(self, path : str, entry : dict):
+    os.makedirs(self.directory_, exist_ok=True)
+    entry_path = self.__EntryPath(path)
+    temporary_path = '%s.%d.tmp' % (entry_path, os.getpid())
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+      json.dump(entry, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporary_path, entry_path)
+    self.__Evict()
+
+  # Marks the entry of |path| as used now.
+  def __Touch(self, path : str):
+    try:
+      os.utime(self.__EntryPath(path))
+    except OSError:
+      pass
+
+  # Removes the least recently used entries until the cache fits max_bytes_.
+  def __Evict(self):
+    entries = []
+    total = 0
+    with os.scandir(self.directory_) as it:
+      for dir_entry in it:
+        if not dir_entry.name.endswith('.json'):
+          continue
+        try:
+          stat = dir_entry.stat()
+        except OSError:
+          continue
+        entries.append((stat.st_mtime_ns, stat.st_size, dir_entry.path))
+        total += stat.st_size
+    entries.sort()
+    for mtime, size, entry_path in entries:
+      if total <= self.max_bytes_:
+        break
+      try:
+        os.remove(entry_path)
+      except OSError:
+        pass
+      total -= size
+
+  # Returns the records of the navigations in the session file at |path|,
+  # parsing only what is not already cached. Raises ValueError if the file
+  # is not a session file.
+  def GetNavigationRecords(self, path : str, session_type : int = None) -> list:
+    path = os.path.abspath(path)
+    if session_type is None:
+      session_type = SessionTypeOrDefault(path)
+    stat = os.stat(path)
+
+    entry = self.__LoadEntry(path)
+    offset = None
+    rows = []
+    if entry is not None and entry['session_type'] == int(session_type) and stat.st_size >= entry['size']:
+      prefix_hash, tail_hash = self.__Fingerprint(path, entry['offset'], entry['prefix_size'])
+      if prefix_hash == entry['prefix_hash'] and tail_hash == entry['tail_hash']:
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+          self.hit_count_ += 1
+          self.__Touch(path)
+          return self.__Records(path, session_type, entry['records'])
+        # Only appended to since it was cached.
+        offset = entry['offset']
+        rows = entry['records']
+
+    if offset is None:
+      self.miss_count_ += 1
+    else:
+      self.append_count_ += 1
+
+    reader = SessionFileReader(path)
+    command_id = kUpdateTabNavigationCommandIds[session_type]
+    for command in reader.IterCommands(session_type, offset):
+      if command.command_id() == command_id:
+        record = NavigationRecordFromCommand(path, session_type, command)
+        if record is not None:
+          rows.append(list(record[2:-1]))
+    reader.Close()
+
+    prefix_size = min(_kPrefixSize, reader.offset())
+    prefix_hash, tail_hash = self.__Fingerprint(path, reader.offset(), prefix_size)
+    self.__StoreEntry(path, {
+      'version' : _kCacheVersion,
+      'path' : path,
+      'session_type' : int(session_type),
+      'size' : stat.st_size,
+      'mtime_ns' : stat.st_mtime_ns,
+      'offset' : reader.offset(),
+      'prefix_size' : prefix_size,
+      'prefix_hash' : prefix_hash,
+      'tail_hash' : tail_hash,
+      'records' : rows,
+    })
+    return self.__Records(path, session_type, rows)
+
+  # Converts cached rows (the NavigationRecord fields between session_type
+  # and timestamp) back to NavigationRecords.
+  def __Records(self, path : str, session_type : int, rows : list) -> list:
+    # The timestamp is not persisted in session files, see TabNavigation.
+    return [NavigationRecord(path, int(session_type), *row, None) for row in rows]
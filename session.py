@@ -1,16 +1,18 @@
 from __future__ import annotations
-from typing import TypeVar, Generic, NewType, Callable, Iterable, Any, Tuple
+from typing import TypeVar, Generic, NewType, Callable, Iterable, Iterator, Any, Tuple
 from logging import Logger
 from enum import Enum
 from timeit import default_timer as timer
 
 import sys
 import os
+import mmap
 import struct
 import weakref
 
-from pickle import Pickle
-from constants import SizeOf, const, uint16, int16, uint32, int32, uint64, int64
+from chromepickle import Pickle
+import stats
+from constants import SizeOf, SessionType, const, uint16, int16, uint32, int32, uint64, int64
 
 # Copyright (c) 2012 The Chromium Authors. All rights reserved.
 # Copyright (c) 2020 Rene Sugar. All rights reserved.
@@ -30,6 +32,8 @@ from constants import SizeOf, const, uint16, int16, uint32, int32, uint64, int64
 #   commands that have a fixed size.
 # . From a pickle, this is useful for commands whose length varies.
 class SessionCommand:
+  __slots__ = ('id_', 'contents_')
+
   def __init__(self, a=None, b=None):
     # Creates a session command with the specified id. This allocates a buffer
     # of size |size| that must be filled via contents().
@@ -46,6 +50,12 @@ class SessionCommand:
       data_len = b.size()
       self.contents_ = bytearray(data_len)
       self.contents_[0 : data_len] = v[0:data_len]
+    # Creates a session command with the specified id that references the
+    # bytes of |b| without copying them. The caller must keep the underlying
+    # buffer alive (and unmodified) for as long as the command is in use.
+    elif type(a) == int and isinstance(b, (bytes, bytearray, memoryview)):
+      self.id_ = a
+      self.contents_ = b
     else:
       raise ValueError('SessionCommand: unknown __init__ parameter')
   # The contents of the command.
@@ -75,12 +85,37 @@ class SessionCommand:
 #   int32 version;
 # };
 
+# Returns true if |header| starts with a FileHeader written by a supported
+# version of the session service.
+def IsValidFileHeader(header) -> bool:
+  if len(header) < SizeOf.FILEHEADER:
+    return False
+  byteorder = '>' if sys.byteorder == "big" else '<'
+  header_signature = struct.unpack_from(byteorder + 'I', header, 0)
+  header_version = struct.unpack_from(byteorder + 'I', header, SizeOf.INT32)
+  return header_signature[0] == const.kFileSignature and header_version[0] == const.kFileCurrentVersion
+
+# Returns the type of the session file at |path| from its file name, or None
+# if it is not one of the names used by TabRestoreService and SessionService.
+def SessionTypeForPath(path : str) -> SessionType:
+  name = os.path.basename(path)
+  if name in (const.kCurrentTabSessionFileName, const.kLastTabSessionFileName):
+    return SessionType.TAB_RESTORE
+  if name in (const.kCurrentSessionFileName, const.kLastSessionFileName):
+    return SessionType.SESSION_RESTORE
+  return None
+
 # SessionFileReader ----------------------------------------------------------
 
 # SessionFileReader is responsible for reading the set of SessionCommands that
 # describe a Session back from a file. SessionFileRead does minimal error
 # checking on the file (pretty much only that the header is valid).
 
+#
+# |path| is either the path of the file, or a binary file-like object to read
+# it from (such as a decompressing stream or an archive member), which does
+# not need to be seekable unless IterAppendedCommands is used. Streams are not
+# closed by Close().
 class SessionFileReader:
   def __init__(self, path):
     self.byteorder_ = '>' if sys.byteorder == "big" else '<'
@@ -88,13 +123,27 @@ class SessionFileReader:
     self.buffer_ = bytearray(const.kFileReadBufferSize)
     self.buffer_position_ = 0
     self.available_count_ = 0
+    # File offset just past the header or the last command that was read
+    # completely. Used to resume reading a file that is being appended to.
+    self.offset_ = 0
+    # Stats to record into, see stats.Enable.
+    self.stats_ = stats.Get()
     self.file_ = None
+    self.owns_file_ = False
+    if hasattr(path, 'readinto'):
+      self.file_ = path
+      return
     if os.path.isfile(path) == False:
       raise ValueError("file '%s' not found" % (path,))
     self.file_ = open(path, 'rb')
+    self.owns_file_ = True
 
   def __del__(self):
-    if self.file_ is not None and self.file_.closed == False:
+    self.Close()
+
+  # Closes the file, unless it is a stream passed to the constructor.
+  def Close(self):
+    if self.owns_file_ and self.file_ is not None and self.file_.closed == False:
       self.file_.close()
 
   # Shifts the unused portion of buffer_ to the beginning and fills the
@@ -110,7 +159,14 @@ class SessionFileReader:
       raise ValueError('FillBuffer: out of space')
     to_read : int = len(self.buffer_) - self.available_count_
     v = memoryview(self.buffer_)
-    read_count : int = self.file_.readinto(v[self.available_count_:self.available_count_+to_read])
+    if self.stats_ is None:
+      read_count : int = self.file_.readinto(v[self.available_count_:self.available_count_+to_read])
+    else:
+      start = timer()
+      read_count : int = self.file_.readinto(v[self.available_count_:self.available_count_+to_read])
+      self.stats_.AddTime('read.io', timer() - start)
+      self.stats_.Add('read.refills')
+      self.stats_.Add('read.bytes', read_count or 0)
     if read_count is None:
       self.errored_ = True
       return False
@@ -125,13 +181,15 @@ class SessionFileReader:
   # the end of file was successfully reached.
   def __ReadCommand(self) -> SessionCommand:
     # Make sure there is enough in the buffer for the size of the next command.
-    if self.available_count_ < SizeOf.SIZE_TYPE:
+    # Streams can return less than was asked for, so the buffer is filled
+    # until it holds enough or the end of the stream is reached.
+    while self.available_count_ < SizeOf.SIZE_TYPE:
       if False == self.__FillBuffer():
-        return None
-      if self.available_count_ < SizeOf.SIZE_TYPE:
-        # Still couldn't read a valid size for the command, assume write was
-        # incomplete and return None.
-        return None
+        break
+    if self.available_count_ < SizeOf.SIZE_TYPE:
+      # Still couldn't read a valid size for the command, assume write was
+      # incomplete and return None.
+      return None
 
     # Get the size of the command.
     command_size : int = struct.unpack_from(self.byteorder_ + 'H', self.buffer_, self.buffer_position_)
@@ -149,8 +207,11 @@ class SessionFileReader:
         new_capacity = (command_size[0] / const.kFileReadBufferSize + 1) * const.kFileReadBufferSize
         extend_length = int(new_capacity - capacity)
         self.buffer_.extend(bytearray(extend_length))
-      if False == self.__FillBuffer():
-        return None
+        if self.stats_ is not None:
+          self.stats_.Add('read.buffer_growths')
+      while command_size[0] > self.available_count_:
+        if False == self.__FillBuffer():
+          break
       if command_size[0] > self.available_count_:
         # Again, assume the file was ok, and just the last chunk was lost.
         return None
@@ -158,43 +219,281 @@ class SessionFileReader:
     command_id : int = struct.unpack_from(self.byteorder_ + 'B', self.buffer_, self.buffer_position_)
     # NOTE: command_size includes the size of the id, which is not part of
     # the contents of the SessionCommand.
-    if command_size[0] > SizeOf.ID_TYPE:
+    # The payload is copied out of buffer_ as raw bytes since buffer_ is reused
+    # and not every command payload is a Pickle.
+    payload_size = (command_size[0] - SizeOf.ID_TYPE)
+    command = SessionCommand(command_id[0], payload_size)
+    if self.stats_ is not None:
+      self.stats_.Add('commands.%d' % (command_id[0],))
+    if payload_size > 0:
       v = memoryview(self.buffer_)
       offset = self.buffer_position_ + SizeOf.ID_TYPE
-      payload_size = (command_size[0] - SizeOf.ID_TYPE)
-      command = SessionCommand(command_id[0], Pickle(v[offset : offset + payload_size]))
-    else:
-      command = SessionCommand(command_id[0], bytearray())
+      command.contents()[0 : payload_size] = v[offset : offset + payload_size]
     self.buffer_position_ += command_size[0]
     self.available_count_ -= command_size[0]
+    self.offset_ += SizeOf.SIZE_TYPE + command_size[0]
     return command
 
 
-  # Reads the contents of the file specified in the constructor, returning
-  # true on success. It is up to the caller to free all SessionCommands
-  # added to commands.
-  def Read(self, session_type : int) -> Tuple[bool, list]:
+  # Reads and validates the FileHeader at the start of the file. Returns false
+  # if the file is not readable or the header does not identify a session
+  # file of the supported version.
+  def __ReadHeader(self) -> bool:
     if self.file_ is None or self.file_.closed == True:
-      return (False, [])
+      return False
     if self.file_.readable() == False:
-      return (False, [])
+      return False
     header = bytearray(SizeOf.FILEHEADER)
+    v = memoryview(header)
     read_count : int = 0
-    read_count = self.file_.readinto(header)
+    while read_count < SizeOf.FILEHEADER:
+      count = self.file_.readinto(v[read_count:])
+      if not count:
+        break
+      read_count += count
     if read_count != SizeOf.FILEHEADER:
-      return (False, [])
-
-    header_signature = struct.unpack_from(self.byteorder_ + 'I', header, 0)
-    header_version = struct.unpack_from(self.byteorder_ + 'I', header, SizeOf.INT32)
+      return False
 
     # Check header signature and header version
-    if header_signature[0] != const.kFileSignature or header_version[0] != const.kFileCurrentVersion:
-      return (False, [])
+    if not IsValidFileHeader(header):
+      return False
+    self.offset_ = SizeOf.FILEHEADER
+    return True
+
+  # Yields the commands in the file specified in the constructor one at a
+  # time, so only the command currently being processed is held in memory.
+  # Raises ValueError if the file header is invalid. Check errored() once the
+  # generator is exhausted to distinguish a read error from the end of file.
+  #
+  # If |offset| is given, reading starts there instead of after the header.
+  # It must be a value previously returned by offset() for the same file.
+  def IterCommands(self, session_type : int, offset : int = None) -> Iterator[SessionCommand]:
+    if not self.__ReadHeader():
+      raise ValueError('IterCommands: invalid session file header')
+
+    if offset is not None:
+      if offset < SizeOf.FILEHEADER:
+        raise ValueError('IterCommands: offset is inside the file header')
+      self.offset_ = offset
+      yield from self.IterAppendedCommands()
+      return
+
+    command = self.__ReadCommand()
+    while (command is not None) and (not self.errored_):
+      yield command
+      command = self.__ReadCommand()
+
+  # Yields the commands appended to the file since the last complete command
+  # was read by IterCommands (or a previous call), for following a file that
+  # is still being written. A partial command left in the buffer at the end
+  # of the previous read is discarded and read again from the file.
+  def IterAppendedCommands(self) -> Iterator[SessionCommand]:
+    if self.offset_ < SizeOf.FILEHEADER:
+      raise ValueError('IterAppendedCommands: the file header has not been read')
+    self.file_.seek(self.offset_)
+    self.buffer_position_ = 0
+    self.available_count_ = 0
+    self.errored_ = False
 
-    read_commands = []
     command = self.__ReadCommand()
     while (command is not None) and (not self.errored_):
-      read_commands.append(command)
+      yield command
       command = self.__ReadCommand()
-    
+
+  # Returns the file offset just past the last command read completely.
+  def offset(self) -> int:
+    return self.offset_
+
+  # Returns true if an error occurred while reading commands.
+  def errored(self) -> bool:
+    return self.errored_
+
+  # Reads the contents of the file specified in the constructor, returning
+  # true on success. It is up to the caller to free all SessionCommands
+  # added to commands.
+  def Read(self, session_type : int) -> Tuple[bool, list]:
+    try:
+      read_commands = list(self.IterCommands(session_type))
+    except ValueError:
+      return (False, [])
     return (not self.errored_, read_commands)
+
+# MappedSessionFileReader ----------------------------------------------------
+
+# MappedSessionFileReader reads the same command stream as SessionFileReader,
+# but maps the whole file into memory instead of copying it through a fixed
+# size buffer. Each SessionCommand references a memoryview slice of the
+# mapping, so no payload bytes are copied or shifted while framing commands.
+#
+# The mapping stays alive for as long as any command (or Pickle created from
+# one) still references it.
+class MappedSessionFileReader:
+  def __init__(self, path):
+    self.errored_ = False
+    self.file_ = None
+    self.map_ = None
+    self.view_ = None
+    if os.path.isfile(path) == False:
+      raise ValueError("file '%s' not found" % (path,))
+    self.file_ = open(path, 'rb')
+    # Taken from the open file, so it describes the file that is mapped even
+    # if |path| is replaced meanwhile.
+    self.stat_ = os.fstat(self.file_.fileno())
+    # mmap cannot map an empty file; IterCommands reports it as invalid.
+    if self.stat_.st_size > 0:
+      self.map_ = mmap.mmap(self.file_.fileno(), 0, access=mmap.ACCESS_READ)
+      self.view_ = memoryview(self.map_)
+    # Stats to record into, see stats.Enable.
+    self.stats_ = stats.Get()
+    if self.stats_ is not None and self.view_ is not None:
+      self.stats_.Add('read.mapped_bytes', len(self.view_))
+
+  def __del__(self):
+    self.Close()
+
+  # Releases the mapping and the file. Slices handed out in SessionCommands
+  # keep the mapping open until they are released themselves.
+  def Close(self):
+    if self.view_ is not None:
+      self.view_.release()
+      self.view_ = None
+    if self.map_ is not None:
+      try:
+        self.map_.close()
+      except BufferError:
+        # Commands still reference the mapping; it is unmapped once they are
+        # garbage collected.
+        pass
+      self.map_ = None
+    if self.file_ is not None and self.file_.closed == False:
+      self.file_.close()
+
+  # Returns the mapped contents of the file, or None for an empty file.
+  def view(self) -> memoryview:
+    return self.view_
+
+  # Returns the os.stat_result of the mapped file.
+  def stat(self) -> os.stat_result:
+    return self.stat_
+
+  # Yields a (command_id, offset, size) tuple for each command in the file,
+  # where offset and size locate the command's contents within view(). Raises
+  # ValueError if the file header is invalid. Like SessionFileReader, a
+  # truncated trailing command is treated as the end of the file.
+  def IterCommandSpans(self, session_type : int) -> Iterator[Tuple[int, int, int]]:
+    view = self.view_
+    if view is None or not IsValidFileHeader(view[0 : SizeOf.FILEHEADER]):
+      raise ValueError('IterCommandSpans: invalid session file header')
+
+    byteorder = '>' if sys.byteorder == "big" else '<'
+    stats_ = self.stats_
+    position : int = SizeOf.FILEHEADER
+    end : int = len(view)
+    while end - position >= SizeOf.SIZE_TYPE:
+      command_size : int = struct.unpack_from(byteorder + 'H', view, position)[0]
+      position += SizeOf.SIZE_TYPE
+      if command_size == 0 or command_size > end - position:
+        # Empty or incomplete command, assume the last write was lost.
+        return
+      # NOTE: command_size includes the size of the id, which is not part of
+      # the contents of the SessionCommand.
+      if stats_ is not None:
+        stats_.Add('commands.%d' % (view[position],))
+      yield (view[position], position + SizeOf.ID_TYPE, command_size - SizeOf.ID_TYPE)
+      position += command_size
+
+  # Yields the commands in the file one at a time. Raises ValueError if the
+  # file header is invalid.
+  def IterCommands(self, session_type : int) -> Iterator[SessionCommand]:
+    view = self.view_
+    for command_id, offset, size in self.IterCommandSpans(session_type):
+      yield SessionCommand(command_id, view[offset : offset + size])
+
+  # Returns true if an error occurred while reading commands.
+  def errored(self) -> bool:
+    return self.errored_
+
+  # Reads all commands in the file, returning true on success.
+  def Read(self, session_type : int) -> Tuple[bool, list]:
+    try:
+      read_commands = list(self.IterCommands(session_type))
+    except ValueError:
+      return (False, [])
+    return (not self.errored_, read_commands)
+
+# SessionFileWriter ----------------------------------------------------------
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+_kFileHeaderStruct = struct.Struct(_kByteOrder + 'II')
+# Size (including the id) and id that precede the contents of each command.
+_kCommandHeaderStruct = struct.Struct(_kByteOrder + 'HB')
+# Largest command size that fits the size field.
+_kMaxCommandSize = 0xFFFF
+
+# SessionFileWriter writes SessionCommands in the format read by
+# SessionFileReader: a FileHeader followed by each command's size, id and
+# contents, as SessionBackend::AppendCommandsToFile does.
+#
+# Framed commands are collected in a list and handed to writelines() once they
+# add up to buffer_size bytes, so many small commands cost a few large writes.
+# The contents of pending commands are referenced, not copied, until Flush.
+class SessionFileWriter:
+  # Opens |path| for writing. If |truncate| is true (or the file is empty) the
+  # file is reset to just the FileHeader, otherwise commands are appended.
+  def __init__(self, path, truncate : bool = True, buffer_size : int = const.kFileWriteBufferSize):
+    self.errored_ = False
+    self.buffer_size_ = buffer_size
+    self.pending_ = []
+    self.pending_size_ = 0
+    self.file_ = None
+    self.file_ = open(path, 'wb' if truncate else 'ab')
+    if self.file_.tell() == 0:
+      self.pending_.append(_kFileHeaderStruct.pack(const.kFileSignature, const.kFileCurrentVersion))
+      self.pending_size_ += SizeOf.FILEHEADER
+
+  def __del__(self):
+    self.Close()
+
+  # Writes the pending commands and closes the file.
+  def Close(self):
+    if self.file_ is not None and self.file_.closed == False:
+      self.Flush()
+      self.file_.close()
+
+  # Appends |command| to the file. Returns false if the command is too large
+  # to be framed or a write failed.
+  def AppendCommand(self, command : SessionCommand) -> bool:
+    content_size = command.size()
+    total_size = content_size + SizeOf.ID_TYPE
+    if total_size > _kMaxCommandSize:
+      return False
+    self.pending_.append(_kCommandHeaderStruct.pack(total_size, command.command_id()))
+    if content_size > 0:
+      self.pending_.append(command.contents())
+    self.pending_size_ += SizeOf.SIZE_TYPE + total_size
+    if self.pending_size_ >= self.buffer_size_:
+      return self.Flush()
+    return True
+
+  # Appends each of |commands|, stopping at the first that fails.
+  def AppendCommands(self, commands : Iterable[SessionCommand]) -> bool:
+    for command in commands:
+      if False == self.AppendCommand(command):
+        return False
+    return True
+
+  # Writes the pending commands to the file.
+  def Flush(self) -> bool:
+    if len(self.pending_) > 0:
+      try:
+        self.file_.writelines(self.pending_)
+        self.file_.flush()
+      except OSError:
+        self.errored_ = True
+      self.pending_ = []
+      self.pending_size_ = 0
+    return not self.errored_
+
+  # Returns true if a write failed.
+  def errored(self) -> bool:
+    return self.errored_
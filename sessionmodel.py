@@ -0,0 +1,671 @@
+from __future__ import annotations
+from typing import TypeVar, Generic, NewType, Callable, Iterable, Iterator, Any, Tuple
+from datetime import datetime, timedelta, timezone
+from timeit import default_timer as timer
+
+import sys
+import struct
+
+from chromepickle import FastPickleIterator, InterningPickleIterator, StringPool
+from session import SessionCommand
+from constants import SessionType, SizeOf, const
+from tabnavigation import LazyTabNavigation
+import stats
+
+# Copyright (c) 2012 The Chromium Authors. All rights reserved.
+# Copyright (c) 2020 Rene Sugar. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE.chromium file.
+
+#------------------------------------------------------------------------------
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+
+# chromium/chrome/browser/sessions/tab_restore_service.cc
+#
+# Fixed size payloads are written as the raw C++ structs, so they include the
+# compiler's alignment padding.
+
+# typedef SessionID::id_type RestoredEntryPayload;
+_kRestoredEntryPayload = struct.Struct(_kByteOrder + 'i')
+
+# struct WindowPayload {
+#   SessionID::id_type window_id;
+#   int32 selected_tab_index;
+#   int32 num_tabs;
+# };
+#
+# struct WindowPayload2 : WindowPayload {
+#   int64 timestamp;
+# };
+_kWindowPayload = struct.Struct(_kByteOrder + 'iii')
+_kWindowPayload2 = struct.Struct(_kByteOrder + 'iii4xq')
+
+# struct SelectedNavigationInTabPayload {
+#   SessionID::id_type id;
+#   int32 index;
+# };
+#
+# struct SelectedNavigationInTabPayload2 : SelectedNavigationInTabPayload {
+#   int64 timestamp;
+# };
+_kSelectedNavigationInTabPayload = struct.Struct(_kByteOrder + 'ii')
+_kSelectedNavigationInTabPayload2 = struct.Struct(_kByteOrder + 'iiq')
+
+# chromium/chrome/browser/sessions/session_service.cc
+
+# SessionID::id_type payload[] = { window_id, tab_id };
+_kWindowAndTabPayload = struct.Struct(_kByteOrder + 'ii')
+
+# struct IDAndIndexPayload {
+#   SessionID::id_type id;
+#   int32 index;
+# };
+_kIDAndIndexPayload = struct.Struct(_kByteOrder + 'ii')
+
+# struct ClosedPayload {
+#   SessionID::id_type id;
+#   int64 close_time;
+# };
+_kClosedPayload = struct.Struct(_kByteOrder + 'i4xq')
+
+# struct WindowBoundsPayload2 {
+#   SessionID::id_type window_id;
+#   int32 x;
+#   int32 y;
+#   int32 w;
+#   int32 h;
+#   bool is_maximized;
+# };
+_kWindowBoundsPayload2 = struct.Struct(_kByteOrder + 'iiiii?3x')
+
+# struct WindowBoundsPayload3 {
+#   SessionID::id_type window_id;
+#   int32 x;
+#   int32 y;
+#   int32 w;
+#   int32 h;
+#   int32 show_state;
+# };
+_kWindowBoundsPayload3 = struct.Struct(_kByteOrder + 'iiiiii')
+
+# struct PinnedStatePayload {
+#   SessionID::id_type tab_id;
+#   bool pinned_state;
+# };
+_kPinnedStatePayload = struct.Struct(_kByteOrder + 'i?3x')
+
+# ui::WindowShowState value of a maximized window.
+_kShowStateMaximized = 3
+
+# base::Time values are microseconds since the Windows epoch.
+_kWindowsEpoch = datetime(1601, 1, 1, tzinfo=timezone.utc)
+
+# Converts a serialized base::Time to a datetime, or None for a null time.
+def TimeFromInternalValue(value : int) -> datetime:
+  if value == 0:
+    return None
+  try:
+    return _kWindowsEpoch + timedelta(microseconds=value)
+  except OverflowError:
+    return None
+
+# SessionTab -----------------------------------------------------------------
+
+# SessionTab describes a tab: its navigation stack, the selected navigation
+# and the per-tab state written alongside it.
+class SessionTab:
+  __slots__ = ('tab_id_', 'window_id_', 'tab_visual_index_', 'navigations_',
+               'current_navigation_index_', 'pinned_', 'extension_app_id_',
+               'user_agent_override_', 'session_storage_persistent_id_',
+               'timestamp_')
+
+  def __init__(self, tab_id : int):
+    # Unique id of the tab.
+    self.tab_id_ : int = tab_id
+    # Id of the window the tab is in, or -1 for a standalone tab.
+    self.window_id_ : int = -1
+    # Visual index of the tab in its window, or -1 if it was not recorded.
+    self.tab_visual_index_ : int = -1
+    # Navigations keyed by their index in the NavigationController.
+    self.navigations_ : dict = {}
+    # Index of the selected navigation.
+    self.current_navigation_index_ : int = -1
+    self.pinned_ : bool = False
+    self.extension_app_id_ : str = None
+    self.user_agent_override_ : str = None
+    self.session_storage_persistent_id_ : str = None
+    # When the tab was closed, if known.
+    self.timestamp_ : datetime = None
+
+  def tab_id(self) -> int:
+    return self.tab_id_
+
+  def window_id(self) -> int:
+    return self.window_id_
+
+  def tab_visual_index(self) -> int:
+    return self.tab_visual_index_
+
+  # Returns the navigations ordered by their index.
+  def navigations(self) -> list:
+    return [self.navigations_[index] for index in sorted(self.navigations_)]
+
+  # Returns the navigation at |index|, or None.
+  def GetNavigation(self, index : int):
+    return self.navigations_.get(index)
+
+  def SetNavigation(self, navigation):
+    self.navigations_[navigation.index()] = navigation
+
+  # Removes the navigations at |index| and after it.
+  def PruneNavigationsFromBack(self, index : int):
+    for navigation_index in [i for i in self.navigations_ if i >= index]:
+      del self.navigations_[navigation_index]
+
+  # Removes the first |count| navigations and shifts the remaining indices.
+  def PruneNavigationsFromFront(self, count : int):
+    navigations = {}
+    for index, navigation in self.navigations_.items():
+      if index >= count:
+        navigation.set_index(index - count)
+        navigations[index - count] = navigation
+    self.navigations_ = navigations
+    self.current_navigation_index_ = max(self.current_navigation_index_ - count, 0)
+
+  def current_navigation_index(self) -> int:
+    return self.current_navigation_index_
+
+  # Returns the selected navigation, falling back to the last one when the
+  # selected index was not recorded.
+  def current_navigation(self):
+    navigation = self.navigations_.get(self.current_navigation_index_)
+    if navigation is None and len(self.navigations_) > 0:
+      navigation = self.navigations_[max(self.navigations_)]
+    return navigation
+
+  def pinned(self) -> bool:
+    return self.pinned_
+
+  def extension_app_id(self) -> str:
+    return self.extension_app_id_
+
+  def user_agent_override(self) -> str:
+    return self.user_agent_override_
+
+  def session_storage_persistent_id(self) -> str:
+    return self.session_storage_persistent_id_
+
+  def timestamp(self) -> datetime:
+    return self.timestamp_
+
+# SessionWindow --------------------------------------------------------------
+
+# SessionWindow describes a window and the tabs in it.
+class SessionWindow:
+  __slots__ = ('window_id_', 'tabs_', 'selected_tab_index_', 'type_', 'bounds_',
+               'show_state_', 'app_name_', 'timestamp_')
+
+  def __init__(self, window_id : int):
+    self.window_id_ : int = window_id
+    # Tabs in the order they appear in the window.
+    self.tabs_ : list = []
+    self.selected_tab_index_ : int = -1
+    # Browser::Type of the window, if recorded.
+    self.type_ : int = 0
+    # (x, y, width, height) of the window, if recorded.
+    self.bounds_ : Tuple[int, int, int, int] = None
+    # ui::WindowShowState of the window, if recorded.
+    self.show_state_ : int = 0
+    self.app_name_ : str = None
+    # When the window was closed, if known.
+    self.timestamp_ : datetime = None
+
+  def window_id(self) -> int:
+    return self.window_id_
+
+  # Returns the tabs in the order they appear in the window. Session restore
+  # records each tab's visual index; tab restore lists tabs in order.
+  def tabs(self) -> list:
+    return sorted(self.tabs_, key=SessionTab.tab_visual_index)
+
+  def selected_tab_index(self) -> int:
+    return self.selected_tab_index_
+
+  # Returns the selected tab, or None.
+  def selected_tab(self) -> SessionTab:
+    tabs = self.tabs()
+    if 0 <= self.selected_tab_index_ < len(tabs):
+      return tabs[self.selected_tab_index_]
+    return None
+
+  def type(self) -> int:
+    return self.type_
+
+  def bounds(self) -> Tuple[int, int, int, int]:
+    return self.bounds_
+
+  def show_state(self) -> int:
+    return self.show_state_
+
+  def app_name(self) -> str:
+    return self.app_name_
+
+  def timestamp(self) -> datetime:
+    return self.timestamp_
+
+# SessionModel ---------------------------------------------------------------
+
+# SessionModel indexes the windows and tabs of a session by id.
+class SessionModel:
+  def __init__(self):
+    # Python dicts keep insertion order, so tabs() and windows() are in the
+    # order they were first seen in the file.
+    self.windows_ : dict = {}
+    self.tabs_ : dict = {}
+
+  # Returns the window with id |window_id|, or None.
+  def GetWindow(self, window_id : int) -> SessionWindow:
+    return self.windows_.get(window_id)
+
+  # Returns the tab with id |tab_id|, or None.
+  def GetTab(self, tab_id : int) -> SessionTab:
+    return self.tabs_.get(tab_id)
+
+  # Returns the window with id |window_id|, creating it if needed.
+  def GetOrCreateWindow(self, window_id : int) -> SessionWindow:
+    window = self.windows_.get(window_id)
+    if window is None:
+      window = SessionWindow(window_id)
+      self.windows_[window_id] = window
+    return window
+
+  # Returns the tab with id |tab_id|, creating it if needed.
+  def GetOrCreateTab(self, tab_id : int) -> SessionTab:
+    tab = self.tabs_.get(tab_id)
+    if tab is None:
+      tab = SessionTab(tab_id)
+      self.tabs_[tab_id] = tab
+    return tab
+
+  # Moves |tab| into the window with id |window_id|, creating the window if
+  # needed.
+  def SetTabWindow(self, tab : SessionTab, window_id : int):
+    old_window = self.windows_.get(tab.window_id_)
+    if old_window is not None and tab in old_window.tabs_:
+      old_window.tabs_.remove(tab)
+    tab.window_id_ = window_id
+    self.GetOrCreateWindow(window_id).tabs_.append(tab)
+
+  # Removes the tab with id |tab_id| from the model and from its window.
+  def RemoveTab(self, tab_id : int):
+    tab = self.tabs_.pop(tab_id, None)
+    if tab is None:
+      return
+    window = self.windows_.get(tab.window_id_)
+    if window is not None and tab in window.tabs_:
+      window.tabs_.remove(tab)
+
+  # Removes the window with id |window_id| and its tabs from the model.
+  def RemoveWindow(self, window_id : int):
+    window = self.windows_.pop(window_id, None)
+    if window is None:
+      return
+    for tab in window.tabs_:
+      self.tabs_.pop(tab.tab_id_, None)
+
+  def windows(self) -> list:
+    return list(self.windows_.values())
+
+  def tabs(self) -> list:
+    return list(self.tabs_.values())
+
+# SessionModelBuilder --------------------------------------------------------
+
+# SessionModelBuilder replays a stream of SessionCommands into a
+# SessionModel. Commands are applied one at a time as they are read, so the
+# model can be built while SessionFileReader.IterCommands streams the file.
+#
+# Both command sets are supported, see kCommandHandlers:
+#
+# . TAB_RESTORE ("Current Tabs", "Last Tabs") follows
+#   TabRestoreService::CreateEntriesFromCommands: a kCommandWindow is followed
+#   by the commands of its tabs, each tab starts with a
+#   kCommandSelectedNavigationInTab, and the per-tab commands after it apply
+#   to that tab.
+# . SESSION_RESTORE ("Current Session", "Last Session") follows
+#   SessionService::CreateTabsAndWindows: every command names the tab or
+#   window it applies to.
+class SessionModelBuilder:
+  def __init__(self, session_type : int = SessionType.TAB_RESTORE, navigation_class=LazyTabNavigation, string_pool : StringPool = None):
+    if session_type not in (SessionType.TAB_RESTORE, SessionType.SESSION_RESTORE):
+      raise ValueError('SessionModelBuilder: unsupported session type %s' % (str(session_type),))
+    self.session_type_ = session_type
+    self.navigation_class_ = navigation_class
+    # If set, navigations are read through it so that their repeated strings
+    # are shared; LazyTabNavigation interns them when they are decoded.
+    self.string_pool_ = string_pool
+    self.model_ = SessionModel()
+    # The window whose tabs are being read, and how many of them are left.
+    self.current_window_ : SessionWindow = None
+    self.pending_window_tabs_ : int = 0
+    # The tab the per-tab commands apply to.
+    self.current_tab_ : SessionTab = None
+    # Number of commands that could not be applied.
+    self.failed_count_ : int = 0
+    # The handlers of this session type, keyed on command id alone.
+    self.handlers_ = {command_id : handler for (session_type, command_id), handler in SessionModelBuilder.kCommandHandlers.items() if session_type == self.session_type_}
+
+  # Returns true if |command_id| is a known command of |session_type|.
+  @staticmethod
+  def IsKnownCommand(session_type : int, command_id : int) -> bool:
+    return (session_type, command_id) in SessionModelBuilder.kCommandHandlers
+
+  def session_type(self) -> int:
+    return self.session_type_
+
+  def model(self) -> SessionModel:
+    return self.model_
+
+  def failed_count(self) -> int:
+    return self.failed_count_
+
+  # Applies |command| to the model. Returns false if the command is unknown
+  # or its payload could not be decoded.
+  def AddCommand(self, command : SessionCommand) -> bool:
+    handler = self.handlers_.get(command.command_id())
+    if handler is None or handler(self, command) == False:
+      self.failed_count_ += 1
+      return False
+    return True
+
+  # Applies every command of |commands| and returns the model.
+  def AddCommands(self, commands : Iterable[SessionCommand]) -> SessionModel:
+    for command in commands:
+      self.AddCommand(command)
+    return self.model_
+
+  # Returns the tab a command naming |tab_id| applies to. Session restore
+  # commands always name their tab; in tab restore files the id may be stale,
+  # in which case the command applies to the current tab.
+  def __TabForId(self, tab_id : int) -> SessionTab:
+    if self.session_type_ == SessionType.SESSION_RESTORE:
+      return self.model_.GetOrCreateTab(tab_id)
+    tab = self.model_.GetTab(tab_id)
+    if tab is None:
+      tab = self.current_tab_
+    return tab
+
+  # Returns the window a command naming |window_id| applies to, see
+  # __TabForId.
+  def __WindowForId(self, window_id : int) -> SessionWindow:
+    if self.session_type_ == SessionType.SESSION_RESTORE:
+      return self.model_.GetOrCreateWindow(window_id)
+    window = self.model_.GetWindow(window_id)
+    if window is None:
+      window = self.current_window_
+    return window
+
+  # Reads the leading id and string of a pickled (id, string) payload.
+  def __ReadIdAndString(self, command : SessionCommand) -> Tuple[bool, int, str]:
+    iterator = FastPickleIterator(command.PayloadAsPickle())
+    status, id = iterator.ReadInt()
+    if status == False:
+      return (False, 0, '')
+    status, value = iterator.ReadString()
+    return (status, id, value)
+
+  # Unpacks a fixed size payload, or returns None if the size is wrong.
+  def __Unpack(self, payload : struct.Struct, command : SessionCommand) -> tuple:
+    if command.size() != payload.size:
+      return None
+    return payload.unpack_from(command.contents())
+
+  # Commands shared by both session types ----------------------------------
+
+  def __UpdateTabNavigation(self, command : SessionCommand) -> bool:
+    # With stats enabled the read of the navigation is timed, and failed and
+    # legacy navigations are counted.
+    run_stats = stats.Get()
+    if self.string_pool_ is not None:
+      iterator = InterningPickleIterator(command.PayloadAsPickle(), self.string_pool_)
+    else:
+      iterator = FastPickleIterator(command.PayloadAsPickle())
+    status, tab_id = iterator.ReadInt()
+    if status == False:
+      return False
+    tab = self.__TabForId(tab_id)
+    if tab is None:
+      return False
+    navigation = self.navigation_class_()
+    if run_stats is None:
+      status = navigation.ReadFromPickle(iterator)
+    else:
+      start = timer()
+      status = navigation.ReadFromPickle(iterator)
+      run_stats.AddTime('decode.navigation', timer() - start)
+      if status == False:
+        run_stats.Add('navigations.failed')
+      elif navigation.is_legacy():
+        run_stats.Add('navigations.legacy')
+    if status == False:
+      return False
+    tab.SetNavigation(navigation)
+    return True
+
+  def __SetExtensionAppID(self, command : SessionCommand) -> bool:
+    status, tab_id, app_id = self.__ReadIdAndString(command)
+    tab = self.__TabForId(tab_id)
+    if status == False or tab is None:
+      return False
+    tab.extension_app_id_ = app_id
+    return True
+
+  def __SetWindowAppName(self, command : SessionCommand) -> bool:
+    status, window_id, app_name = self.__ReadIdAndString(command)
+    window = self.__WindowForId(window_id)
+    if status == False or window is None:
+      return False
+    window.app_name_ = app_name
+    return True
+
+  def __SetTabUserAgentOverride(self, command : SessionCommand) -> bool:
+    status, tab_id, user_agent_override = self.__ReadIdAndString(command)
+    tab = self.__TabForId(tab_id)
+    if status == False or tab is None:
+      return False
+    tab.user_agent_override_ = user_agent_override
+    return True
+
+  # Commands that carry no state the model keeps.
+  def __Ignore(self, command : SessionCommand) -> bool:
+    return True
+
+  # TAB_RESTORE commands ---------------------------------------------------
+
+  def __RestoredEntry(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kRestoredEntryPayload, command)
+    if payload is None:
+      return False
+    # The entry was restored, so it is no longer closed.
+    self.model_.RemoveWindow(payload[0])
+    self.model_.RemoveTab(payload[0])
+    self.current_window_ = None
+    self.pending_window_tabs_ = 0
+    self.current_tab_ = None
+    return True
+
+  def __Window(self, command : SessionCommand) -> bool:
+    timestamp = 0
+    if command.size() == _kWindowPayload2.size:
+      window_id, selected_tab_index, num_tabs, timestamp = _kWindowPayload2.unpack_from(command.contents())
+    elif command.size() == _kWindowPayload.size:
+      window_id, selected_tab_index, num_tabs = _kWindowPayload.unpack_from(command.contents())
+    else:
+      return False
+    window = self.model_.GetOrCreateWindow(window_id)
+    window.selected_tab_index_ = selected_tab_index
+    window.timestamp_ = TimeFromInternalValue(timestamp)
+    self.current_window_ = window if num_tabs > 0 else None
+    self.pending_window_tabs_ = num_tabs
+    self.current_tab_ = None
+    return True
+
+  def __SelectedNavigationInTab(self, command : SessionCommand) -> bool:
+    timestamp = 0
+    if command.size() == _kSelectedNavigationInTabPayload2.size:
+      tab_id, index, timestamp = _kSelectedNavigationInTabPayload2.unpack_from(command.contents())
+    elif command.size() == _kSelectedNavigationInTabPayload.size:
+      tab_id, index = _kSelectedNavigationInTabPayload.unpack_from(command.contents())
+    else:
+      return False
+    tab = self.model_.GetOrCreateTab(tab_id)
+    tab.current_navigation_index_ = index
+    tab.timestamp_ = TimeFromInternalValue(timestamp)
+    if self.current_window_ is not None:
+      # The tab belongs to the window read last until all its tabs were read.
+      self.model_.SetTabWindow(tab, self.current_window_.window_id_)
+      self.pending_window_tabs_ -= 1
+      if self.pending_window_tabs_ <= 0:
+        self.current_window_ = None
+    self.current_tab_ = tab
+    return True
+
+  def __PinnedState(self, command : SessionCommand) -> bool:
+    # NOTE: payload doesn't matter. kCommandPinnedState is only written if
+    # the tab is pinned.
+    if self.current_tab_ is None:
+      return False
+    self.current_tab_.pinned_ = True
+    return True
+
+  # SESSION_RESTORE commands -----------------------------------------------
+
+  def __SetTabWindow(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kWindowAndTabPayload, command)
+    if payload is None:
+      return False
+    window_id, tab_id = payload
+    self.model_.SetTabWindow(self.model_.GetOrCreateTab(tab_id), window_id)
+    return True
+
+  def __SetWindowBounds2(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kWindowBoundsPayload2, command)
+    if payload is None:
+      return False
+    window = self.model_.GetOrCreateWindow(payload[0])
+    window.bounds_ = tuple(payload[1:5])
+    window.show_state_ = _kShowStateMaximized if payload[5] else 0
+    return True
+
+  def __SetWindowBounds3(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kWindowBoundsPayload3, command)
+    if payload is None:
+      return False
+    window = self.model_.GetOrCreateWindow(payload[0])
+    window.bounds_ = tuple(payload[1:5])
+    window.show_state_ = payload[5]
+    return True
+
+  def __SetTabIndexInWindow(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kIDAndIndexPayload, command)
+    if payload is None:
+      return False
+    self.model_.GetOrCreateTab(payload[0]).tab_visual_index_ = payload[1]
+    return True
+
+  def __TabClosed(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kClosedPayload, command)
+    if payload is None:
+      return False
+    self.model_.RemoveTab(payload[0])
+    return True
+
+  def __WindowClosed(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kClosedPayload, command)
+    if payload is None:
+      return False
+    self.model_.RemoveWindow(payload[0])
+    return True
+
+  def __TabNavigationPathPrunedFromBack(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kIDAndIndexPayload, command)
+    if payload is None:
+      return False
+    self.model_.GetOrCreateTab(payload[0]).PruneNavigationsFromBack(payload[1])
+    return True
+
+  def __TabNavigationPathPrunedFromFront(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kIDAndIndexPayload, command)
+    if payload is None or payload[1] < 0:
+      return False
+    self.model_.GetOrCreateTab(payload[0]).PruneNavigationsFromFront(payload[1])
+    return True
+
+  def __SetSelectedNavigationIndex(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kIDAndIndexPayload, command)
+    if payload is None:
+      return False
+    self.model_.GetOrCreateTab(payload[0]).current_navigation_index_ = payload[1]
+    return True
+
+  def __SetSelectedTabInIndex(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kIDAndIndexPayload, command)
+    if payload is None:
+      return False
+    self.model_.GetOrCreateWindow(payload[0]).selected_tab_index_ = payload[1]
+    return True
+
+  def __SetWindowType(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kIDAndIndexPayload, command)
+    if payload is None:
+      return False
+    self.model_.GetOrCreateWindow(payload[0]).type_ = payload[1]
+    return True
+
+  def __SetPinnedState(self, command : SessionCommand) -> bool:
+    payload = self.__Unpack(_kPinnedStatePayload, command)
+    if payload is None:
+      return False
+    self.model_.GetOrCreateTab(payload[0]).pinned_ = payload[1]
+    return True
+
+  def __SessionStorageAssociated(self, command : SessionCommand) -> bool:
+    status, tab_id, persistent_id = self.__ReadIdAndString(command)
+    if status == False:
+      return False
+    self.__TabForId(tab_id).session_storage_persistent_id_ = persistent_id
+    return True
+
+  # Handlers keyed on (session_type, command_id).
+  kCommandHandlers = {
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandUpdateTabNavigation) : __UpdateTabNavigation,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandRestoredEntry) : __RestoredEntry,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandWindow) : __Window,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSelectedNavigationInTab) : __SelectedNavigationInTab,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandPinnedState) : __PinnedState,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSetExtensionAppID) : __SetExtensionAppID,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSetWindowAppName) : __SetWindowAppName,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandSetTabUserAgentOverride) : __SetTabUserAgentOverride,
+    (SessionType.TAB_RESTORE, const.TabNavigation_kCommandUnknown) : __Ignore,
+
+    (SessionType.SESSION_RESTORE, const.kCommandSetTabWindow) : __SetTabWindow,
+    (SessionType.SESSION_RESTORE, const.kCommandSetTabIndexInWindow) : __SetTabIndexInWindow,
+    (SessionType.SESSION_RESTORE, const.kCommandTabClosedObsolete) : __TabClosed,
+    (SessionType.SESSION_RESTORE, const.kCommandWindowClosedObsolete) : __WindowClosed,
+    (SessionType.SESSION_RESTORE, const.kCommandTabNavigationPathPrunedFromBack) : __TabNavigationPathPrunedFromBack,
+    (SessionType.SESSION_RESTORE, const.kCommandUpdateTabNavigation) : __UpdateTabNavigation,
+    (SessionType.SESSION_RESTORE, const.kCommandSetSelectedNavigationIndex) : __SetSelectedNavigationIndex,
+    (SessionType.SESSION_RESTORE, const.kCommandSetSelectedTabInIndex) : __SetSelectedTabInIndex,
+    (SessionType.SESSION_RESTORE, const.kCommandSetWindowType) : __SetWindowType,
+    (SessionType.SESSION_RESTORE, const.kCommandSetWindowBounds2) : __SetWindowBounds2,
+    (SessionType.SESSION_RESTORE, const.kCommandTabNavigationPathPrunedFromFront) : __TabNavigationPathPrunedFromFront,
+    (SessionType.SESSION_RESTORE, const.kCommandSetPinnedState) : __SetPinnedState,
+    (SessionType.SESSION_RESTORE, const.kCommandSetExtensionAppID) : __SetExtensionAppID,
+    (SessionType.SESSION_RESTORE, const.kCommandSetWindowBounds3) : __SetWindowBounds3,
+    (SessionType.SESSION_RESTORE, const.kCommandSetWindowAppName) : __SetWindowAppName,
+    (SessionType.SESSION_RESTORE, const.kCommandTabClosed) : __TabClosed,
+    (SessionType.SESSION_RESTORE, const.kCommandWindowClosed) : __WindowClosed,
+    (SessionType.SESSION_RESTORE, const.kCommandSetTabUserAgentOverride) : __SetTabUserAgentOverride,
+    (SessionType.SESSION_RESTORE, const.kCommandSessionStorageAssociated) : __SessionStorageAssociated,
+  }
@@ -0,0 +1,259 @@
+from __future__ import annotations
+from typing import Tuple
+from urllib.parse import urlparse
+from datetime import datetime
+
+import os
+import sqlite3
+
+from session import SessionFileReader, MappedSessionFileReader
+from sessionmodel import SessionModelBuilder
+from extract import SessionTypeOrDefault
+from archive import StripCompressedSuffix, kArchiveReadErrors
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Rows collected per table before they are inserted with executemany.
+kDefaultBatchSize = 10000
+# Rows inserted per transaction.
+kDefaultTransactionSize = 500000
+
+_kSchema = (
+  """CREATE TABLE IF NOT EXISTS files (
+       file_id INTEGER PRIMARY KEY,
+       path TEXT NOT NULL UNIQUE,
+       profile TEXT NOT NULL,
+       session_type INTEGER NOT NULL)""",
+  """CREATE TABLE IF NOT EXISTS windows (
+       file_id INTEGER NOT NULL REFERENCES files(file_id),
+       window_id INTEGER NOT NULL,
+       selected_tab_index INTEGER,
+       type INTEGER,
+       show_state INTEGER,
+       x INTEGER,
+       y INTEGER,
+       width INTEGER,
+       height INTEGER,
+       app_name TEXT,
+       timestamp TEXT)""",
+  """CREATE TABLE IF NOT EXISTS tabs (
+       file_id INTEGER NOT NULL REFERENCES files(file_id),
+       tab_id INTEGER NOT NULL,
+       window_id INTEGER,
+       visual_index INTEGER,
+       current_navigation_index INTEGER,
+       pinned INTEGER,
+       extension_app_id TEXT,
+       user_agent_override TEXT,
+       timestamp TEXT)""",
+  """CREATE TABLE IF NOT EXISTS navigations (
+       file_id INTEGER NOT NULL REFERENCES files(file_id),
+       tab_id INTEGER NOT NULL,
+       navigation_index INTEGER NOT NULL,
+       virtual_url TEXT,
+       host TEXT,
+       title TEXT,
+       content_state BLOB,
+       transition_type INTEGER,
+       has_post_data INTEGER,
+       referrer_url TEXT,
+       referrer_policy INTEGER,
+       original_request_url TEXT,
+       is_overriding_user_agent INTEGER)""",
+)
+
+# Created once the rows are inserted, which is faster than updating them row
+# by row during a bulk load.
+_kIndexes = (
+  "CREATE INDEX IF NOT EXISTS files_profile ON files(profile)",
+  "CREATE INDEX IF NOT EXISTS windows_file_id ON windows(file_id, window_id)",
+  "CREATE INDEX IF NOT EXISTS tabs_file_id ON tabs(file_id, tab_id)",
+  "CREATE INDEX IF NOT EXISTS tabs_tab_id ON tabs(tab_id)",
+  "CREATE INDEX IF NOT EXISTS navigations_file_id ON navigations(file_id)",
+  "CREATE INDEX IF NOT EXISTS navigations_tab_id ON navigations(tab_id)",
+  "CREATE INDEX IF NOT EXISTS navigations_host ON navigations(host)",
+)
+
+_kInsertWindow = "INSERT INTO windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_kInsertTab = "INSERT INTO tabs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_kInsertNavigation = "INSERT INTO navigations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Returns the host name of |url|, or '' if it has none.
+def HostOfUrl(url : str) -> str:
+  try:
+    return urlparse(url).hostname or ''
+  except ValueError:
+    return ''
+
+def _Timestamp(value : datetime) -> str:
+  return value.isoformat() if value is not None else None
+
+# SQLiteExporter -------------------------------------------------------------
+
+# SQLiteExporter writes the windows, tabs and navigations of session files
+# into a SQLite database, one row per window, tab and navigation, tagged with
+# the file (and its profile directory) they were read from. Many files can be
+# added to one database; adding a file again replaces its rows.
+#
+# Rows are collected in batches of |batch_size| per table, inserted with
+# executemany, and committed once |transaction_size| rows were inserted,
+# between files. Each file is added within a savepoint, so a file whose
+# navigations cannot be decoded leaves no rows behind. The database is in WAL
+# mode, and the indexes (profile, tab id and URL host) are created by Close()
+# after the bulk load.
+class SQLiteExporter:
+  def __init__(self, path : str, batch_size : int = kDefaultBatchSize, transaction_size : int = kDefaultTransactionSize):
+    self.batch_size_ = batch_size
+    self.transaction_size_ = transaction_size
+    self.connection_ = sqlite3.connect(path, isolation_level=None)
+    self.connection_.execute("PRAGMA journal_mode=WAL")
+    self.connection_.execute("PRAGMA synchronous=NORMAL")
+    for statement in _kSchema:
+      self.connection_.execute(statement)
+    self.windows_ = []
+    self.tabs_ = []
+    self.navigations_ = []
+    # Rows inserted in the open transaction, and in total.
+    self.transaction_rows_ = 0
+    self.row_count_ = 0
+    self.connection_.execute("BEGIN")
+
+  # Number of window, tab and navigation rows added.
+  def row_count(self) -> int:
+    return self.row_count_
+
+  # Adds the windows, tabs and navigations of the session file at |path|.
+  # Returns false if the file is not a session file. A truncated trailing
+  # command is ignored, as when printing.
+  def AddFile(self, path : str, session_type : int = None, mapped : bool = False) -> bool:
+    path = os.path.abspath(path)
+    if session_type is None:
+      session_type = SessionTypeOrDefault(path)
+    try:
+      file_reader = MappedSessionFileReader(path) if mapped else SessionFileReader(path)
+      model_builder = SessionModelBuilder(session_type)
+      model_builder.AddCommands(file_reader.IterCommands(session_type))
+    except ValueError:
+      return False
+    return self.__AddModel(path, session_type, model_builder.model())
+
+  # Adds the windows, tabs and navigations of the session file read from
+  # |stream| (e.g. a member of an archive, see archive.IterSessionStreams),
+  # stored under |name|. Returns false if it is not a session file or the
+  # stream could not be read.
+  def AddStream(self, name : str, stream, session_type : int = None) -> bool:
+    if session_type is None:
+      session_type = SessionTypeOrDefault(StripCompressedSuffix(name))
+    try:
+      model_builder = SessionModelBuilder(session_type)
+      model_builder.AddCommands(SessionFileReader(stream).IterCommands(session_type))
+    except (ValueError,) + kArchiveReadErrors:
+      return False
+    return self.__AddModel(name, session_type, model_builder.model())
+
+  # Adds the rows of |model|, read from the file |path|, replacing those of an
+  # earlier export of it. Navigations are decoded as their rows are built; if
+  # one cannot be decoded, the rows of the file are rolled back (an earlier
+  # export of it is kept) and false is returned.
+  def __AddModel(self, path : str, session_type : int, model) -> bool:
+    row_count = self.row_count_
+    transaction_rows = self.transaction_rows_
+    self.connection_.execute("SAVEPOINT add_file")
+    try:
+      self.__AddModelRows(path, session_type, model)
+    except ValueError:
+      self.windows_.clear()
+      self.tabs_.clear()
+      self.navigations_.clear()
+      self.connection_.execute("ROLLBACK TO add_file")
+      self.connection_.execute("RELEASE add_file")
+      self.row_count_ = row_count
+      self.transaction_rows_ = transaction_rows
+      return False
+    self.connection_.execute("RELEASE add_file")
+    if self.transaction_rows_ >= self.transaction_size_:
+      self.connection_.execute("COMMIT")
+      self.connection_.execute("BEGIN")
+      self.transaction_rows_ = 0
+    return True
+
+  def __AddModelRows(self, path : str, session_type : int, model):
+    file_id = self.__ReplaceFile(path, session_type)
+    for window in model.windows():
+      x, y, width, height = window.bounds() or (None, None, None, None)
+      self.windows_.append((file_id, window.window_id(), window.selected_tab_index(), window.type(),
+                            window.show_state(), x, y, width, height, window.app_name(),
+                            _Timestamp(window.timestamp())))
+    for tab in model.tabs():
+      self.tabs_.append((file_id, tab.tab_id(), tab.window_id(), tab.tab_visual_index(),
+                         tab.current_navigation_index(), tab.pinned(), tab.extension_app_id(),
+                         tab.user_agent_override(), _Timestamp(tab.timestamp())))
+      for navigation in tab.navigations():
+        url = navigation.virtual_url()
+        referrer = navigation.referrer()
+        self.navigations_.append((file_id, tab.tab_id(), navigation.index(), url, HostOfUrl(url),
+                                  navigation.title(), navigation.content_state(), int(navigation.transition_type()),
+                                  bool(navigation.has_post_data()),
+                                  referrer.url_ if referrer is not None else None,
+                                  int(referrer.policy_) if referrer is not None else None,
+                                  navigation.original_request_url(), navigation.is_overriding_user_agent()))
+      if len(self.navigations_) >= self.batch_size_:
+        self.__Flush()
+    self.__Flush()
+
+  # Inserts the collected rows.
+  def __Flush(self):
+    for statement, rows in ((_kInsertWindow, self.windows_), (_kInsertTab, self.tabs_), (_kInsertNavigation, self.navigations_)):
+      if len(rows) == 0:
+        continue
+      self.connection_.executemany(statement, rows)
+      self.transaction_rows_ += len(rows)
+      self.row_count_ += len(rows)
+      rows.clear()
+
+  # Returns the file_id of |path|, after removing the rows of an earlier
+  # export of it.
+  def __ReplaceFile(self, path : str, session_type : int) -> int:
+    row = self.connection_.execute("SELECT file_id FROM files WHERE path = ?", (path,)).fetchone()
+    if row is not None:
+      for table in ('windows', 'tabs', 'navigations'):
+        self.connection_.execute("DELETE FROM %s WHERE file_id = ?" % (table,), row)
+      self.connection_.execute("UPDATE files SET session_type = ? WHERE file_id = ?", (int(session_type), row[0]))
+      return row[0]
+    cursor = self.connection_.execute("INSERT INTO files (path, profile, session_type) VALUES (?, ?, ?)",
+                                      (path, os.path.dirname(path), int(session_type)))
+    return cursor.lastrowid
+
+  # Inserts the remaining rows, creates the indexes and closes the database.
+  def Close(self):
+    if self.connection_ is None:
+      return
+    self.__Flush()
+    for statement in _kIndexes:
+      self.connection_.execute(statement)
+    self.connection_.execute("COMMIT")
+    self.connection_.close()
+    self.connection_ = None
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from collections import Counter
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Stats ----------------------------------------------------------------------
+
+# The decode.<field> timers, in the order Summary breaks them down.
+kFieldTimers = ('decode.url', 'decode.title', 'decode.content_state',
+                'decode.referrer', 'decode.original_request_url')
+
+# Stats holds named counters and timers describing a run, e.g. to tell an
+# I/O-bound run (read.io time, read.refills) from a decode-bound one
+# (decode.* times).
+#
+# Counters recorded while stats are enabled (see Enable):
+#
+#   read.bytes              bytes read from session files
+#   read.refills            SessionFileReader buffer refills
+#   read.buffer_growths     SessionFileReader buffer growths for large commands
+#   read.mapped_bytes       bytes of files mapped by MappedSessionFileReader
+#   commands.<id>           commands read, per command id
+#   navigations.failed      navigation payloads that could not be decoded
+#   navigations.legacy      navigations written before type_mask existed
+#   commands.unknown        commands with an id that is not known
+#
+# Timers (total seconds and number of calls):
+#
+#   read.io                 reading from session files
+#   decode.navigation       reading navigations from their payloads, one
+#                           call per navigation, with the same (lazy)
+#                           navigation class as without stats
+#   decode.fields           decoding the fields of navigation records from
+#                           the lazily read navigations
+#   decode.<field>          decoding one field type of lazily read
+#                           navigations (url, title, content_state,
+#                           referrer, original_request_url), e.g. to tell
+#                           UTF-16 title decoding from URL decoding
+
+class Stats:
+  def __init__(self):
+    self.counters_ = Counter()
+    self.timers_ = {}
+
+  # Adds |value| to the counter |name|.
+  def Add(self, name : str, value : int = 1):
+    self.counters_[name] += value
+
+  # Adds a call taking |seconds| to the timer |name|.
+  def AddTime(self, name : str, seconds : float):
+    total = self.timers_.get(name)
+    if total is None:
+      self.timers_[name] = [seconds, 1]
+    else:
+      total[0] += seconds
+      total[1] += 1
+
+  def counter(self, name : str) -> int:
+    return self.counters_[name]
+
+  # Returns the counters as a dict of name to value.
+  def counters(self) -> dict:
+    return dict(self.counters_)
+
+  # Returns the timers as a dict of name to (seconds, calls).
+  def timers(self) -> dict:
+    return {name : (total[0], total[1]) for name, total in self.timers_.items()}
+
+  # Adds the counters and timers of |other|, a dict returned by AsDict (e.g.
+  # by a worker process), to these.
+  def Merge(self, other : dict):
+    self.counters_.update(other['counters'])
+    for name, value in other['timers'].items():
+      total = self.timers_.setdefault(name, [0.0, 0])
+      total[0] += value['seconds']
+      total[1] += value['calls']
+
+  def Reset(self):
+    self.counters_.clear()
+    self.timers_.clear()
+
+  # Returns the counters and timers as a dict suitable for JSON, e.g. for a
+  # metrics exporter.
+  def AsDict(self) -> dict:
+    return {
+      'counters' : self.counters(),
+      'timers' : {name : {'seconds' : seconds, 'calls' : calls} for name, (seconds, calls) in self.timers().items()},
+    }
+
+  # Returns a human readable summary of the counters and timers.
+  def Summary(self) -> str:
+    lines = []
+    for name in sorted(self.counters_):
+      lines.append("%-24s %14d" % (name, self.counters_[name]))
+    for name in sorted(self.timers_):
+      seconds, calls = self.timers_[name]
+      lines.append("%-24s %12.6f s %10d calls" % (name, seconds, calls))
+    # The share of each field type in the time spent decoding fields.
+    field_timers = [(name, self.timers_[name][0]) for name in kFieldTimers if name in self.timers_]
+    field_seconds = sum(seconds for name, seconds in field_timers)
+    if field_seconds > 0:
+      lines.append("decode time per field type:")
+      for name, seconds in field_timers:
+        lines.append("  %-22s %12.6f s %9.1f %%" % (name[len('decode.'):], seconds, 100.0 * seconds / field_seconds))
+    return "\n".join(lines)
+
+# The Stats instrumented code records into, or None while stats are disabled.
+# Instrumented code checks for None once per unit of work (a buffer refill, a
+# command), so disabled stats cost next to nothing.
+_stats : Stats = None
+
+# Enables recording into |stats| (a new Stats if not given) and returns it.
+# Readers created from now on record into it.
+def Enable(stats : Stats = None) -> Stats:
+  global _stats
+  _stats = stats if stats is not None else Stats()
+  return _stats
+
+def Disable():
+  global _stats
+  _stats = None
+
+# Returns the Stats being recorded into, or None.
+def Get() -> Stats:
+  return _stats
@@ -0,0 +1,244 @@
+from __future__ import annotations
+from typing import Iterator, Tuple
+
+import sys
+import struct
+import random
+import argparse
+
+from chromepickle import Pickle
+from session import SessionCommand, SessionFileWriter
+from constants import SessionType, PageTransition, WebKitWebReferrerPolicy, const
+from tabnavigation import TabNavigation, Referrer, CreateUpdateTabNavigationCommand, kMaxStateSize
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+_kByteOrder = '>' if sys.byteorder == "big" else '<'
+# Payload layouts of the fixed size commands written, as read by sessionmodel.
+_kIdAndValuePayload = struct.Struct(_kByteOrder + 'ii')
+_kWindowPayload2 = struct.Struct(_kByteOrder + 'iii4xq')
+_kSelectedNavigationInTabPayload2 = struct.Struct(_kByteOrder + 'iiq')
+_kWindowBoundsPayload3 = struct.Struct(_kByteOrder + 'iiiiii')
+_kCommandHeader = struct.Struct(_kByteOrder + 'HB')
+
+# Timestamp of the first navigation, as microseconds since 1601-01-01 UTC
+# (2020-01-01). Each later one is a second after the previous one.
+_kBaseTimestamp = 13222310400000000
+
+# Characters titles are drawn from. Includes characters outside of ASCII and
+# outside of the Basic Multilingual Plane so UTF-16 decoding is exercised.
+_kTitleCharacters = 'abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 éüßø ─ 日本語 😀'
+_kUrlCharacters = 'abcdefghijklmnopqrstuvwxyz0123456789-_'
+
+# SyntheticSessionGenerator --------------------------------------------------
+
+# SyntheticSessionGenerator produces valid tabs and session files holding a
+# configurable number of windows, tabs and navigations, for load and scaling
+# tests. Given the same seed and options the output is identical byte for
+# byte, so benchmark numbers are comparable across runs.
+#
+# Lengths are given as (minimum, maximum) ranges and drawn uniformly.
+# |large_content_state_rate| of the navigations get a content_state of
+# |large_content_state_size| bytes instead, and |legacy_rate| of them are
+# written in the format that predates type_mask (see
+# TabNavigation.ReadFromPickle). If |truncated_bytes| is positive, the file
+# ends with that many bytes of one more command, as left by an interrupted
+# write.
+#
+# The strings of a navigation (the URL three times, as URL, referrer and
+# original request URL, the UTF-16 title and the content_state) must stay
+# below kMaxStateSize bytes, or TabNavigation.WriteToPickle would write some
+# of them empty. Raises ValueError if the lengths and sizes allow more.
+class SyntheticSessionGenerator:
+  def __init__(self, seed : int = 0, windows : int = 1, tabs_per_window : int = 10,
+               navigations_per_tab : int = 10, url_length : Tuple[int, int] = (30, 200),
+               title_length : Tuple[int, int] = (0, 80), content_state_size : Tuple[int, int] = (0, 2048),
+               large_content_state_rate : float = 0.0, large_content_state_size : int = 32768,
+               legacy_rate : float = 0.0, truncated_bytes : int = 0):
+    self.seed_ = seed
+    self.windows_ = windows
+    self.tabs_per_window_ = tabs_per_window
+    self.navigations_per_tab_ = navigations_per_tab
+    self.url_length_ = url_length
+    self.title_length_ = title_length
+    self.content_state_size_ = content_state_size
+    self.large_content_state_rate_ = large_content_state_rate
+    self.large_content_state_size_ = large_content_state_size
+    self.legacy_rate_ = legacy_rate
+    self.truncated_bytes_ = truncated_bytes
+    string_bytes = self.__MaxStringBytes()
+    if string_bytes >= kMaxStateSize:
+      raise ValueError('SyntheticSessionGenerator: navigations of up to %d string bytes do not fit the %d bytes of a navigation'
+                       % (string_bytes, kMaxStateSize))
+
+  # Returns the commands of a file of |session_type|.
+  def Commands(self, session_type : SessionType) -> Iterator[SessionCommand]:
+    rng = random.Random(self.seed_)
+    timestamp = _kBaseTimestamp
+    tab_id = self.windows_
+    for window_id in range(1, self.windows_ + 1):
+      selected_tab_index = rng.randrange(self.tabs_per_window_) if self.tabs_per_window_ > 0 else 0
+      if session_type == SessionType.TAB_RESTORE:
+        yield SessionCommand(const.TabNavigation_kCommandWindow,
+                             _kWindowPayload2.pack(window_id, selected_tab_index, self.tabs_per_window_, timestamp))
+      else:
+        yield SessionCommand(const.kCommandSetWindowType, _kIdAndValuePayload.pack(window_id, 0))
+        yield SessionCommand(const.kCommandSetWindowBounds3,
+                             _kWindowBoundsPayload3.pack(window_id, 0, 0, 1280, 800, 1))
+
+      for tab_index in range(self.tabs_per_window_):
+        tab_id += 1
+        selected_navigation_index = self.navigations_per_tab_ - 1
+        if session_type == SessionType.TAB_RESTORE:
+          yield SessionCommand(const.TabNavigation_kCommandSelectedNavigationInTab,
+                               _kSelectedNavigationInTabPayload2.pack(tab_id, selected_navigation_index, timestamp))
+          command_id = const.TabNavigation_kCommandUpdateTabNavigation
+        else:
+          yield SessionCommand(const.kCommandSetTabWindow, _kIdAndValuePayload.pack(window_id, tab_id))
+          yield SessionCommand(const.kCommandSetTabIndexInWindow, _kIdAndValuePayload.pack(tab_id, tab_index))
+          command_id = const.kCommandUpdateTabNavigation
+
+        for index in range(self.navigations_per_tab_):
+          yield self.__NavigationCommand(rng, command_id, tab_id, index)
+          timestamp += 1000000
+
+        if session_type == SessionType.SESSION_RESTORE:
+          yield SessionCommand(const.kCommandSetSelectedNavigationIndex,
+                               _kIdAndValuePayload.pack(tab_id, selected_navigation_index))
+
+      if session_type == SessionType.SESSION_RESTORE:
+        yield SessionCommand(const.kCommandSetSelectedTabInIndex, _kIdAndValuePayload.pack(window_id, selected_tab_index))
+
+  # Writes a file of |session_type| to |path|. Returns the number of commands
+  # written, not counting the truncated one.
+  def Write(self, path : str, session_type : SessionType) -> int:
+    writer = SessionFileWriter(path)
+    count = 0
+    for command in self.Commands(session_type):
+      if False == writer.AppendCommand(command):
+        raise ValueError("command %d does not fit a session file" % (command.command_id(),))
+      count += 1
+    writer.Close()
+    if writer.errored():
+      raise OSError("could not write '%s'" % (path,))
+
+    if self.truncated_bytes_ > 0:
+      rng = random.Random(self.seed_ + 1)
+      command_id = const.TabNavigation_kCommandUpdateTabNavigation if session_type == SessionType.TAB_RESTORE else const.kCommandUpdateTabNavigation
+      command = self.__NavigationCommand(rng, command_id, 0, 0)
+      data = _kCommandHeader.pack(command.size() + 1, command.command_id()) + bytes(command.contents())
+      with open(path, 'ab') as f:
+        f.write(data[0 : min(self.truncated_bytes_, len(data) - 1)])
+    return count
+
+  # Returns the largest number of string bytes a navigation can have, as
+  # counted by TabNavigation.WriteToPickle.
+  def __MaxStringBytes(self) -> int:
+    largest_tab_id = self.windows_ * (self.tabs_per_window_ + 1)
+    url_prefix = 'https://host999.example.com/%d/%d/' % (largest_tab_id, max(self.navigations_per_tab_ - 1, 0))
+    url_bytes = max(len(url_prefix), self.url_length_[1])
+    # Characters outside the BMP take 4 bytes in UTF-16.
+    title_bytes = 4 * self.title_length_[1]
+    content_state_bytes = self.content_state_size_[1]
+    if self.large_content_state_rate_ > 0:
+      content_state_bytes = max(content_state_bytes, self.large_content_state_size_)
+    return 3 * url_bytes + title_bytes + content_state_bytes
+
+  def __Length(self, rng : random.Random, bounds : Tuple[int, int]) -> int:
+    return rng.randint(bounds[0], bounds[1])
+
+  def __Url(self, rng : random.Random, tab_id : int, index : int) -> str:
+    url = 'https://host%d.example.com/%d/%d/' % (rng.randrange(1000), tab_id, index)
+    length = self.__Length(rng, self.url_length_) - len(url)
+    if length > 0:
+      url += ''.join(rng.choices(_kUrlCharacters, k=length))
+    return url
+
+  def __NavigationCommand(self, rng : random.Random, command_id : int, tab_id : int, index : int) -> SessionCommand:
+    url = self.__Url(rng, tab_id, index)
+    title = ''.join(rng.choices(_kTitleCharacters, k=self.__Length(rng, self.title_length_)))
+    if rng.random() < self.large_content_state_rate_:
+      content_state = rng.randbytes(self.large_content_state_size_)
+    else:
+      content_state = rng.randbytes(self.__Length(rng, self.content_state_size_))
+    transition_type = PageTransition.PAGE_TRANSITION_LINK if index > 0 else PageTransition.PAGE_TRANSITION_TYPED
+
+    if rng.random() < self.legacy_rate_:
+      # Written before type_mask and the fields after it existed.
+      pickle = Pickle()
+      pickle.WriteInt(tab_id)
+      pickle.WriteInt(index)
+      pickle.WriteString(url)
+      pickle.WriteString16(title)
+      pickle.WriteData(content_state, len(content_state))
+      pickle.WriteInt(int(transition_type))
+      return SessionCommand(command_id, pickle)
+
+    navigation = TabNavigation()
+    navigation.set_index(index)
+    navigation.set_virtual_url(url)
+    navigation.set_title(title)
+    navigation.set_content_state(content_state)
+    navigation.set_transition_type(transition_type)
+    if index > 0:
+      navigation.set_referrer(Referrer(url, WebKitWebReferrerPolicy.WebReferrerPolicyDefault))
+    navigation.set_original_request_url(url)
+    return CreateUpdateTabNavigationCommand(command_id, tab_id, navigation)
+
+kSessionTypes = {
+  "tabs" : SessionType.TAB_RESTORE,
+  "session" : SessionType.SESSION_RESTORE,
+}
+
+def main():
+  parser = argparse.ArgumentParser(description="Writes a synthetic Chrome tabs or session file")
+  parser.add_argument("--path", required=True, help="Path of the file to write")
+  parser.add_argument("--type", choices=sorted(kSessionTypes), default="tabs", help="Type of the file (default: %(default)s)")
+  parser.add_argument("--seed", type=int, default=0, help="Seed of the generated content (default: %(default)s)")
+  parser.add_argument("--windows", type=int, default=1, help="Number of windows (default: %(default)s)")
+  parser.add_argument("--tabs", type=int, default=10, help="Number of tabs per window (default: %(default)s)")
+  parser.add_argument("--navigations", type=int, default=10, help="Number of navigations per tab (default: %(default)s)")
+  parser.add_argument("--url-length", type=int, nargs=2, default=[30, 200], metavar=("MIN", "MAX"), help="Range of URL lengths (default: 30 200)")
+  parser.add_argument("--title-length", type=int, nargs=2, default=[0, 80], metavar=("MIN", "MAX"), help="Range of title lengths (default: 0 80)")
+  parser.add_argument("--content-state-size", type=int, nargs=2, default=[0, 2048], metavar=("MIN", "MAX"), help="Range of content_state sizes (default: 0 2048)")
+  parser.add_argument("--large-content-state-rate", type=float, default=0.0, help="Fraction of navigations with a large content_state (default: %(default)s)")
+  parser.add_argument("--large-content-state-size", type=int, default=32768, help="Size of a large content_state (default: %(default)s)")
+  parser.add_argument("--legacy-rate", type=float, default=0.0, help="Fraction of navigations written without type_mask (default: %(default)s)")
+  parser.add_argument("--truncated-bytes", type=int, default=0, help="Bytes of a truncated command to end the file with (default: %(default)s)")
+  args = parser.parse_args()
+
+  try:
+    generator = SyntheticSessionGenerator(args.seed, args.windows, args.tabs, args.navigations,
+                                          tuple(args.url_length), tuple(args.title_length), tuple(args.content_state_size),
+                                          args.large_content_state_rate, args.large_content_state_size,
+                                          args.legacy_rate, args.truncated_bytes)
+  except ValueError as e:
+    parser.error(str(e))
+  count = generator.Write(args.path, kSessionTypes[args.type])
+  print("Wrote %d commands to %s." % (count, args.path))
+
+if __name__ == "__main__":
+  main()
@@ -9,8 +9,10 @@ import os
 import struct
 import weakref
 
-from pickle import Pickle, PickleIterator
-from constants import SizeOf, WebKitWebReferrerPolicy, PageTransition, const, uint16, int16, uint32, int32, uint64, int64
+from chromepickle import Pickle, PickleIterator, StringPool
+from session import SessionCommand
+from constants import SizeOf, PickleFieldType, WebKitWebReferrerPolicy, PageTransition, const, uint16, int16, uint32, int32, uint64, int64
+import stats
 
 import urllib
 from urllib.parse import urlparse
@@ -27,6 +29,8 @@ from datetime import datetime, timedelta, timezone
 # applied to this URL. When passing around referrers that will eventually end
 # up being used for URL requests, always use this struct.
 class Referrer:
+  __slots__ = ('url_', 'policy_')
+
   def __init__(self, url : str, policy : WebKitWebReferrerPolicy):
     self.url_ : str = url
     self.policy_ : WebKitWebReferrerPolicy = policy
@@ -40,6 +44,56 @@ class Referrer:
 class TypeMask(IntEnum):
   HAS_POST_DATA = 1
 
+# Pickle layout of a TabNavigation as (field name, field type, default). The
+# order matches TabNavigation.ReadFromPickle. Fields with a default of None
+# are required; the others were added to the written stream later, so they
+# fall back to their default when missing. type_mask also gates the fields
+# after it: if it is missing none of them are read.
+TabNavigation_kPickleSchema = (
+  ('index', PickleFieldType.INT, None),
+  ('virtual_url', PickleFieldType.STRING, None),
+  ('title', PickleFieldType.STRING16, None),
+  ('content_state', PickleFieldType.BINARY_STRING, None),
+  ('transition_type', PickleFieldType.INT, None),
+  ('type_mask', PickleFieldType.INT, 0),
+  ('referrer', PickleFieldType.STRING, ''),
+  ('policy', PickleFieldType.INT, int(WebKitWebReferrerPolicy.WebReferrerPolicyDefault)),
+  ('original_request_url', PickleFieldType.STRING, ''),
+  ('is_overriding_user_agent', PickleFieldType.BOOL, False),
+)
+
+# Pickle layout of a kCommandUpdateTabNavigation command: the id of the tab
+# followed by the TabNavigation.
+TabNavigation_kUpdateCommandSchema = (
+  ('tab_id', PickleFieldType.INT, None),
+) + TabNavigation_kPickleSchema
+
+_kUTF16Codec = 'utf-16-be' if sys.byteorder == "big" else 'utf-16-le'
+
+# Largest number of string bytes TabNavigation.WriteToPickle writes:
+# numeric_limits<SessionCommand::size_type>::max() - 1024.
+kMaxStateSize = 0xFFFF - 1024
+
+# Helpers for TabNavigation.WriteToPickle. Each writes |value| if it fits in
+# what is left of kMaxStateSize, and an empty string otherwise. Returns
+# (status, bytes_written).
+def _WriteStringToPickle(pickle : Pickle, bytes_written : int, value : str) -> Tuple[bool, int]:
+  data = value.encode('utf-8')
+  if bytes_written + len(data) < kMaxStateSize:
+    return (pickle.WriteData(data, len(data)), bytes_written + len(data))
+  return (pickle.WriteInt(0), bytes_written)
+
+def _WriteString16ToPickle(pickle : Pickle, bytes_written : int, value : str) -> Tuple[bool, int]:
+  num_bytes = len(value.encode(_kUTF16Codec))
+  if bytes_written + num_bytes < kMaxStateSize:
+    return (pickle.WriteString16(value), bytes_written + num_bytes)
+  return (pickle.WriteInt(0), bytes_written)
+
+def _WriteBinaryStringToPickle(pickle : Pickle, bytes_written : int, value : bytes) -> Tuple[bool, int]:
+  if bytes_written + len(value) < kMaxStateSize:
+    return (pickle.WriteData(value, len(value)), bytes_written + len(value))
+  return (pickle.WriteInt(0), bytes_written)
+
 # TabNavigation  -------------------------------------------------------------
 
 # TabNavigation is a "freeze-dried" version of NavigationEntry.  It
@@ -50,6 +104,13 @@ class TypeMask(IntEnum):
 #
 # Default copy constructor and assignment operator welcome.
 class TabNavigation:
+  # Navigations are held in memory in large numbers (a full restore history
+  # across profiles), so they do without a per-instance __dict__.
+  __slots__ = ('index_', 'unique_id_', 'referrer_', 'virtual_url_', 'title_',
+               'content_state_', 'transition_type_', 'has_post_data_',
+               'post_id_', 'original_request_url_',
+               'is_overriding_user_agent_', 'timestamp_')
+
   def __init__(self):
     # Index in the NavigationController.
     self.index_ : int = -1
@@ -65,8 +126,9 @@ class TabNavigation:
     self.original_request_url_ : str = None
     self.is_overriding_user_agent_ : bool = False
 
-    # Timestamp when the navigation occurred.
-    self.timestamp_ : datetime = datetime.now()
+    # Timestamp when the navigation occurred. It is not persisted in the
+    # pickle, so it is None for navigations read from a session file.
+    self.timestamp_ : datetime = None
 
   # Pickle order:
   #
@@ -90,6 +152,25 @@ class TabNavigation:
     status, self.virtual_url_ = iterator.ReadString()
     if status == False:
       return False
+    return self.ReadFieldsAfterUrlFromPickle(iterator)
+
+  # Like ReadFromPickle, but the URL is passed to |url_filter| as soon as it is
+  # read, and if that returns false the rest of the payload (title, content
+  # state, referrer, ...) is skipped. Returns (status, matched); a navigation
+  # that did not match has only its index and URL set.
+  def ReadFromPickleIf(self, iterator : PickleIterator, url_filter : Callable[[str], bool]) -> Tuple[bool, bool]:
+    status, self.index_ = iterator.ReadInt()
+    if status == False:
+      return (False, False)
+    status, self.virtual_url_ = iterator.ReadString()
+    if status == False:
+      return (False, False)
+    if not url_filter(self.virtual_url_):
+      return (True, False)
+    return (self.ReadFieldsAfterUrlFromPickle(iterator), True)
+
+  # Reads the fields that follow virtual_url_ in the pickle.
+  def ReadFieldsAfterUrlFromPickle(self, iterator : PickleIterator) -> bool:
     status, self.title_ = iterator.ReadString16()
     if status == False:
       return False
@@ -139,6 +220,41 @@ class TabNavigation:
     # TODO(akalin): Restore timestamp when it is persisted.
     return True
 
+  # Writes the navigation to |pickle| in the order ReadFromPickle reads it.
+  # As in Chromium, strings that would take the navigation past
+  # kMaxStateSize bytes are written empty, so the command fits the uint16
+  # size field of the session file.
+  def WriteToPickle(self, pickle : Pickle) -> bool:
+    bytes_written = 0
+    if False == pickle.WriteInt(self.index()):
+      return False
+    status, bytes_written = _WriteStringToPickle(pickle, bytes_written, self.virtual_url() or '')
+    if status == False:
+      return False
+    status, bytes_written = _WriteString16ToPickle(pickle, bytes_written, self.title() or '')
+    if status == False:
+      return False
+    status, bytes_written = _WriteBinaryStringToPickle(pickle, bytes_written, self.content_state() or bytes())
+    if status == False:
+      return False
+    if False == pickle.WriteInt(int(self.transition_type())):
+      return False
+
+    type_mask = TypeMask.HAS_POST_DATA if self.has_post_data() else 0
+    if False == pickle.WriteInt(int(type_mask)):
+      return False
+    referrer = self.referrer()
+    status, bytes_written = _WriteStringToPickle(pickle, bytes_written, referrer.url_ if referrer is not None else '')
+    if status == False:
+      return False
+    policy = referrer.policy_ if referrer is not None else WebKitWebReferrerPolicy.WebReferrerPolicyDefault
+    if False == pickle.WriteInt(int(policy)):
+      return False
+    status, bytes_written = _WriteStringToPickle(pickle, bytes_written, self.original_request_url() or '')
+    if status == False:
+      return False
+    return pickle.WriteBool(self.is_overriding_user_agent())
+
   # The index in the NavigationController. This TabNavigation is
   # valid only when the index is non-negative.
   #
@@ -163,6 +279,306 @@ class TabNavigation:
   def content_state(self) -> str:
     return self.content_state_
 
-  # Timestamp this navigation occurred.
+  def transition_type(self) -> PageTransition:
+    return self.transition_type_
+
+  def has_post_data(self) -> bool:
+    return self.has_post_data_
+
+  def referrer(self) -> Referrer:
+    return self.referrer_
+
+  # Returns true if the navigation was read from a payload written before
+  # type_mask existed, which has no referrer. The referrer is not decoded.
+  def is_legacy(self) -> bool:
+    return self.referrer_ is None
+
+  def original_request_url(self) -> str:
+    return self.original_request_url_
+
+  def is_overriding_user_agent(self) -> bool:
+    return self.is_overriding_user_agent_
+
+  # Setters used to build navigations to write, see WriteToPickle.
+  def set_virtual_url(self, virtual_url : str):
+    self.virtual_url_ = virtual_url
+
+  def set_title(self, title : str):
+    self.title_ = title
+
+  def set_content_state(self, content_state : bytes):
+    self.content_state_ = content_state
+
+  def set_transition_type(self, transition_type : PageTransition):
+    self.transition_type_ = transition_type
+
+  def set_has_post_data(self, has_post_data : bool):
+    self.has_post_data_ = has_post_data
+
+  def set_referrer(self, referrer : Referrer):
+    self.referrer_ = referrer
+
+  def set_original_request_url(self, original_request_url : str):
+    self.original_request_url_ = original_request_url
+
+  def set_is_overriding_user_agent(self, is_overriding_user_agent : bool):
+    self.is_overriding_user_agent_ = is_overriding_user_agent
+
+  # Timestamp this navigation occurred, or None if it is not known.
   def timestamp(self) -> datetime:
     return self.timestamp_
+
+# LazyTabNavigation  ---------------------------------------------------------
+
+# Marks a string field whose value has not been decoded yet.
+_kNotDecoded = object()
+
+# LazyTabNavigation reads the same pickle as TabNavigation, but only records
+# where the string fields are in the payload. Each field is decoded (and the
+# result cached) the first time its accessor is called, so a consumer that
+# only needs the URL never decodes the UTF-16 title or copies the potentially
+# large content_state.
+#
+# The payload memoryview is referenced for as long as the navigation is, even
+# after every field has been decoded, so the data the pickle was read from
+# must remain valid (and is kept alive) while this object is in use. If the
+# iterator shares strings through a StringPool (see InterningPickleIterator),
+# the strings are interned in it when decoded.
+class LazyTabNavigation(TabNavigation):
+  __slots__ = ('data_', 'string_pool_', 'virtual_url_span_', 'title_span_',
+               'content_state_span_', 'referrer_span_', 'referrer_policy_',
+               'original_request_url_span_')
+
+  def __init__(self):
+    super().__init__()
+    self.data_ : memoryview = None
+    self.string_pool_ : StringPool = None
+    self.virtual_url_span_ : Tuple[int, int] = None
+    self.title_span_ : Tuple[int, int] = None
+    self.content_state_span_ : Tuple[int, int] = None
+    self.referrer_span_ : Tuple[int, int] = None
+    self.referrer_policy_ : WebKitWebReferrerPolicy = None
+    self.original_request_url_span_ : Tuple[int, int] = None
+
+  def ReadFromPickle(self, iterator : PickleIterator) -> bool:
+    self.data_ = iterator.data()
+    self.string_pool_ = iterator.string_pool()
+    status, self.index_ = iterator.ReadInt()
+    if status == False:
+      return False
+    status, self.virtual_url_span_ = iterator.ReadStringSpan(SizeOf.UINT8)
+    if status == False:
+      return False
+    self.virtual_url_ = _kNotDecoded
+    return self.ReadFieldsAfterUrlFromPickle(iterator)
+
+  # Only the URL is decoded before it is passed to |url_filter|.
+  def ReadFromPickleIf(self, iterator : PickleIterator, url_filter : Callable[[str], bool]) -> Tuple[bool, bool]:
+    self.data_ = iterator.data()
+    self.string_pool_ = iterator.string_pool()
+    status, self.index_ = iterator.ReadInt()
+    if status == False:
+      return (False, False)
+    status, self.virtual_url_span_ = iterator.ReadStringSpan(SizeOf.UINT8)
+    if status == False:
+      return (False, False)
+    self.virtual_url_ = _kNotDecoded
+    if not url_filter(self.virtual_url()):
+      return (True, False)
+    return (self.ReadFieldsAfterUrlFromPickle(iterator), True)
+
+  def ReadFieldsAfterUrlFromPickle(self, iterator : PickleIterator) -> bool:
+    status, self.title_span_ = iterator.ReadStringSpan(SizeOf.UINT16)
+    if status == False:
+      return False
+    self.title_ = _kNotDecoded
+    status, self.content_state_span_ = iterator.ReadStringSpan(SizeOf.UINT8)
+    if status == False:
+      return False
+    self.content_state_ = _kNotDecoded
+    status, self.transition_type_ = iterator.ReadInt()
+    if status == False:
+      return False
+
+    # See TabNavigation.ReadFromPickle for the optional fields.
+    has_type_mask, type_mask = iterator.ReadInt()
+
+    if has_type_mask == True:
+      self.has_post_data_ = type_mask & TypeMask.HAS_POST_DATA
+      status, self.referrer_span_ = iterator.ReadStringSpan(SizeOf.UINT8)
+      if status == False:
+        self.referrer_span_ = None
+      status, policy = iterator.ReadInt()
+      if status == True:
+        self.referrer_policy_ = policy
+      else:
+        self.referrer_policy_ = WebKitWebReferrerPolicy.WebReferrerPolicyDefault
+      self.referrer_ = _kNotDecoded
+
+      status, self.original_request_url_span_ = iterator.ReadStringSpan(SizeOf.UINT8)
+      if status == False:
+        self.original_request_url_span_ = None
+      self.original_request_url_ = _kNotDecoded
+
+      status, self.is_overriding_user_agent_ = iterator.ReadBool()
+      if status == False:
+        self.is_overriding_user_agent_ = False
+
+    return True
+
+  # Returns the bytes of |span| in the payload, or None if there is no span.
+  def __SpanData(self, span : Tuple[int, int]) -> memoryview:
+    if span is None:
+      return None
+    offset, size = span
+    return self.data_[offset : offset + size]
+
+  # Returns the string of the UTF-8 (|utf16| false) or UTF-16 bytes of
+  # |span|, shared through string_pool_ if it is set.
+  def __DecodeSpan(self, span : Tuple[int, int], utf16 : bool = False) -> str:
+    data = self.__SpanData(span)
+    if self.string_pool_ is not None:
+      return self.string_pool_.Intern(data, utf16)
+    return str(data, _kUTF16Codec if utf16 else 'utf-8')
+
+  # Returns the result of |decode|, timed into the |stat_name| timer if stats
+  # are enabled.
+  def __Timed(self, stat_name : str, decode : Callable[[], Any]) -> Any:
+    run_stats = stats.Get()
+    if run_stats is None:
+      return decode()
+    start = timer()
+    value = decode()
+    run_stats.AddTime(stat_name, timer() - start)
+    return value
+
+  # With stats enabled, the decoding of each field is timed (decode.<field>).
+  def virtual_url(self) -> str:
+    if self.virtual_url_ is _kNotDecoded:
+      self.virtual_url_ = self.__Timed('decode.url', lambda: self.__DecodeSpan(self.virtual_url_span_))
+    return self.virtual_url_
+
+  def title(self) -> str:
+    if self.title_ is _kNotDecoded:
+      self.title_ = self.__Timed('decode.title', lambda: self.__DecodeSpan(self.title_span_, True))
+    return self.title_
+
+  def content_state(self) -> bytes:
+    if self.content_state_ is _kNotDecoded:
+      self.content_state_ = self.__Timed('decode.content_state', lambda: self.__SpanData(self.content_state_span_).tobytes())
+    return self.content_state_
+
+  def referrer(self) -> Referrer:
+    if self.referrer_ is _kNotDecoded:
+      self.referrer_ = self.__Timed('decode.referrer', lambda: Referrer('' if self.referrer_span_ is None else self.__DecodeSpan(self.referrer_span_), self.referrer_policy_))
+    return self.referrer_
+
+  def original_request_url(self) -> str:
+    if self.original_request_url_ is _kNotDecoded:
+      self.original_request_url_ = self.__Timed('decode.original_request_url', lambda: '' if self.original_request_url_span_ is None else self.__DecodeSpan(self.original_request_url_span_))
+    return self.original_request_url_
+
+# ProjectedTabNavigation ------------------------------------------------------
+
+# Fields of a navigation, in the order they are pickled.
+kNavigationFields = ('index', 'virtual_url', 'title', 'content_state',
+                     'transition_type', 'has_post_data', 'referrer',
+                     'original_request_url', 'is_overriding_user_agent')
+
+_kNavigationFieldPositions = {field : position for position, field in enumerate(kNavigationFields)}
+
+# ProjectedTabNavigation only reads the navigation fields named in |fields|
+# (see kNavigationFields). The strings of the other fields are skipped using
+# their length prefix, without being copied or decoded. The fields
+# TabNavigation requires (up to transition_type) are always skipped over, so a
+# truncated payload is rejected as it is by TabNavigation; projection changes
+# which fields are read, not which navigations are. Nothing after the last
+# requested optional field is read at all. Fields that were not read keep
+# their default value (None for strings and the referrer).
+class ProjectedTabNavigation(TabNavigation):
+  __slots__ = ('fields_', 'last_field_')
+
+  def __init__(self, fields : Iterable[str]):
+    super().__init__()
+    self.fields_ = frozenset(fields)
+    unknown = self.fields_.difference(kNavigationFields)
+    if len(unknown) > 0:
+      raise ValueError('ProjectedTabNavigation: unknown fields %s' % (', '.join(sorted(unknown)),))
+    self.last_field_ = max((_kNavigationFieldPositions[field] for field in self.fields_), default=0)
+
+  def fields(self) -> frozenset:
+    return self.fields_
+
+  def ReadFromPickle(self, iterator : PickleIterator) -> bool:
+    status, self.index_ = iterator.ReadInt()
+    if status == False:
+      return False
+    if 'virtual_url' in self.fields_:
+      status, self.virtual_url_ = iterator.ReadString()
+    else:
+      status = iterator.SkipString()
+    if status == False:
+      return False
+    return self.ReadFieldsAfterUrlFromPickle(iterator)
+
+  def ReadFieldsAfterUrlFromPickle(self, iterator : PickleIterator) -> bool:
+    fields = self.fields_
+    last_field = self.last_field_
+    if 'title' in fields:
+      status, self.title_ = iterator.ReadString16()
+    else:
+      status = iterator.SkipString16()
+    if status == False:
+      return False
+    if 'content_state' in fields:
+      status, self.content_state_ = iterator.ReadBinaryString()
+    else:
+      status = iterator.SkipBinaryString()
+    if status == False:
+      return False
+    status, self.transition_type_ = iterator.ReadInt()
+    if status == False:
+      return False
+    if last_field < 5:
+      return True
+
+    # See TabNavigation.ReadFromPickle for the optional fields.
+    has_type_mask, type_mask = iterator.ReadInt()
+    if has_type_mask == True:
+      self.has_post_data_ = type_mask & TypeMask.HAS_POST_DATA
+      if last_field < 6:
+        return True
+      if 'referrer' in fields:
+        status, referrer_spec = iterator.ReadString()
+        if status == False:
+          referrer_spec = ''
+        status, policy = iterator.ReadInt()
+        if status == False:
+          policy = WebKitWebReferrerPolicy.WebReferrerPolicyDefault
+        self.referrer_ = Referrer(referrer_spec, policy)
+      else:
+        iterator.SkipString()
+        iterator.ReadInt()
+      if last_field < 7:
+        return True
+      if 'original_request_url' in fields:
+        status, self.original_request_url_ = iterator.ReadString()
+        if status == False:
+          self.original_request_url_ = ''
+      else:
+        iterator.SkipString()
+      if last_field < 8:
+        return True
+      status, self.is_overriding_user_agent_ = iterator.ReadBool()
+      if status == False:
+        self.is_overriding_user_agent_ = False
+    return True
+
+# Returns a command of |command_id| (kCommandUpdateTabNavigation of the
+# session or tab restore service) holding |tab_id| and |navigation|, as
+# BaseSessionService::CreateUpdateTabNavigationCommand does.
+def CreateUpdateTabNavigationCommand(command_id : int, tab_id : int, navigation : TabNavigation) -> SessionCommand:
+  pickle = Pickle()
+  pickle.WriteInt(tab_id)
+  navigation.WriteToPickle(pickle)
+  return SessionCommand(command_id, pickle)
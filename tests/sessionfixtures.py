@@ -0,0 +1,101 @@
+import os
+import sys
+import struct
+import subprocess
+
+# The modules under test are at the top of the repository. Tests import this
+# module before them.
+kRepositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if kRepositoryDirectory not in sys.path:
+  sys.path.insert(0, kRepositoryDirectory)
+
+from chromepickle import Pickle
+from session import SessionFileWriter
+from constants import SessionType, PageTransition, WebKitWebReferrerPolicy
+from tabnavigation import TabNavigation, Referrer
+from synthetic import SyntheticSessionGenerator
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Helpers shared by the tests: running chrometabs.py, and building the
+# navigations, pickles and session files they read.
+
+# Title of the navigations made by MakeNavigation, with characters outside
+# the BMP.
+kTitle = 'Café \U0001F600 漢字'
+
+# Returns a TabNavigation with every persisted field set.
+def MakeNavigation(index : int = 3) -> TabNavigation:
+  navigation = TabNavigation()
+  navigation.set_index(index)
+  navigation.set_virtual_url('https://example.com/page?q=%d' % (index,))
+  navigation.set_title(kTitle)
+  navigation.set_content_state(bytes(range(256)) * 3)
+  navigation.set_transition_type(PageTransition.PAGE_TRANSITION_LINK)
+  navigation.set_has_post_data(True)
+  navigation.set_referrer(Referrer('https://example.com/', WebKitWebReferrerPolicy.WebReferrerPolicyOrigin))
+  navigation.set_original_request_url('https://example.com/start')
+  navigation.set_is_overriding_user_agent(True)
+  return navigation
+
+# Returns the pickle of |navigation| (MakeNavigation() by default), preceded
+# by |tab_id| if it is given, as in a kCommandUpdateTabNavigation payload.
+def NavigationPickleBytes(navigation : TabNavigation = None, tab_id : int = None) -> bytes:
+  pickle = Pickle()
+  if tab_id is not None:
+    pickle.WriteInt(tab_id)
+  (navigation or MakeNavigation()).WriteToPickle(pickle)
+  return bytes(pickle.data()[:pickle.size()])
+
+# Returns |data|, a pickle, with its payload cut to |payload_size| bytes.
+def TruncatedPickleBytes(data : bytes, payload_size : int) -> bytes:
+  return struct.pack('=I', payload_size) + data[4 : 4 + payload_size]
+
+# Writes |commands| to a new session file |name| in |directory|, followed by
+# |trailing| bytes. Returns its path.
+def WriteSessionFile(directory : str, commands : list, trailing : bytes = b'', name : str = 'Current Tabs') -> str:
+  path = os.path.join(directory, name)
+  writer = SessionFileWriter(path)
+  if not writer.AppendCommands(commands):
+    raise AssertionError('AppendCommands failed')
+  writer.Close()
+  if len(trailing) > 0:
+    with open(path, 'ab') as f:
+      f.write(trailing)
+  return path
+
+# Writes a synthetic session file of |session_type| named |name| in
+# |directory|, generated with |options| (see SyntheticSessionGenerator).
+# Returns its path.
+def WriteSyntheticSessionFile(directory : str, name : str, session_type : SessionType, **options) -> str:
+  path = os.path.join(directory, name)
+  SyntheticSessionGenerator(**options).Write(path, session_type)
+  return path
+
+# Runs chrometabs.py with |arguments|. Returns the completed process.
+def RunChromeTabs(*arguments):
+  return subprocess.run([sys.executable, os.path.join(kRepositoryDirectory, 'chrometabs.py')] + list(arguments),
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
@@ -0,0 +1,90 @@
+import os
+import sys
+import struct
+import tempfile
+import unittest
+
+import sessionfixtures  # puts the repository on sys.path
+from extract import NavigationRecord
+from output import ColumnarRecordWriter, ReadColumnar
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Byte order of the other kind of machine than this one.
+kOtherByteOrder = '<' if sys.byteorder == 'big' else '>'
+
+def _Padding(size : int) -> bytes:
+  return bytes(-size % 8)
+
+# Returns a columnar file in |byteorder| with an int32 tab_id column holding
+# |tab_ids| and a string title column holding |titles|.
+def ColumnarBytes(byteorder : str, tab_ids : list, titles : list) -> bytes:
+  data = struct.pack(byteorder + '8sc3xIQ', b'CTCOLS01', byteorder.encode('ascii'), 2, len(tab_ids))
+  data += struct.pack(byteorder + 'H', len('tab_id')) + b'tab_id' + b'i'
+  data += _Padding(len(data))
+  data += struct.pack(byteorder + '%di' % (len(tab_ids),), *tab_ids)
+  data += _Padding(len(data))
+  data += struct.pack(byteorder + 'H', len('title')) + b'title' + b's'
+  data += _Padding(len(data))
+  table = list(dict.fromkeys(titles))
+  data += struct.pack(byteorder + '%dI' % (len(titles),), *[table.index(title) for title in titles])
+  data += _Padding(len(data))
+  strings = [title.encode('utf-8') for title in table]
+  offsets = [0]
+  for string in strings:
+    offsets.append(offsets[-1] + len(string))
+  data += struct.pack(byteorder + 'Q', len(strings)) + struct.pack(byteorder + '%dQ' % (len(offsets),), *offsets)
+  data += b''.join(strings)
+  return data + _Padding(len(data))
+
+class ReadColumnarTest(unittest.TestCase):
+  def testRoundTrip(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'navigations.columns')
+      writer = ColumnarRecordWriter(open(path, 'wb'), ('tab_id', 'title', 'timestamp'))
+      for tab_id, title in ((1, 'a'), (70000, 'b'), (-3, 'a')):
+        writer.Write(NavigationRecord('path', 0, tab_id, 0, title, 'https://example.com/', 0, '', '', None))
+      writer.Close()
+      with open(path, 'rb') as f:
+        columns = ReadColumnar(f.read())
+    self.assertEqual(list(columns['tab_id']), [1, 70000, -3])
+    self.assertEqual(columns['title'], ['a', 'b', 'a'])
+    self.assertEqual(len(columns['timestamp']), 3)
+
+  def testReadsEitherByteOrder(self):
+    for byteorder in ('<', '>'):
+      columns = ReadColumnar(ColumnarBytes(byteorder, [1, 70000, -3], ['a', 'b', 'a']))
+      self.assertEqual(list(columns['tab_id']), [1, 70000, -3], byteorder)
+      self.assertEqual(columns['title'], ['a', 'b', 'a'], byteorder)
+
+  def testRejectsUnknownByteOrder(self):
+    data = bytearray(ColumnarBytes(kOtherByteOrder, [1], ['a']))
+    data[8] = ord('?')
+    with self.assertRaises(ValueError):
+      ReadColumnar(data)
+
+if __name__ == '__main__':
+  unittest.main()
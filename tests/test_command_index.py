@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+
+from sessionfixtures import WriteSyntheticSessionFile
+from chromepickle import FastPickleIterator
+from session import SessionFileReader
+from constants import SessionType, const
+from extract import kUpdateTabNavigationCommandIds
+from commandindex import CommandIndex, OpenCommandIndex
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Writes a synthetic session file of |session_type| named |name| in
+# |directory|. Returns its path.
+def WriteSessionFile(directory : str, name : str, session_type : SessionType, seed : int = 4) -> str:
+  return WriteSyntheticSessionFile(directory, name, session_type, seed=seed, windows=2, tabs_per_window=4,
+                                   navigations_per_tab=5, truncated_bytes=5)
+
+# Checks CommandIndex lookups against a full read, and the validation of its
+# sidecar file.
+class CommandIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+    self.path_ = WriteSessionFile(self.directory_.name, 'Current Tabs', SessionType.TAB_RESTORE)
+    self.sidecar_path_ = self.path_ + '.idx'
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  # Returns the contents of the commands of |command_id| and |tab_id| read
+  # with SessionFileReader, in file order.
+  def __FullReadContents(self, path : str, session_type : SessionType, command_id : int, tab_id : int) -> list:
+    reader = SessionFileReader(path)
+    contents = []
+    for command in reader.IterCommands(session_type):
+      if command.command_id() != command_id:
+        continue
+      status, command_tab_id = FastPickleIterator(command.PayloadAsPickle()).ReadInt()
+      if status and command_tab_id == tab_id:
+        contents.append(bytes(command.contents()))
+    reader.Close()
+    return contents
+
+  def testPositionsForTabMatchFullRead(self):
+    for name, session_type in (('Current Tabs', SessionType.TAB_RESTORE), ('Current Session', SessionType.SESSION_RESTORE)):
+      path = WriteSessionFile(self.directory_.name, name, session_type)
+      index = OpenCommandIndex(path)
+      command_id = kUpdateTabNavigationCommandIds[session_type]
+      self.assertEqual(len(index.tab_ids()), 8)
+      for tab_id in index.tab_ids():
+        positions = index.PositionsForTab(tab_id, command_id)
+        contents = [bytes(command.contents()) for command in index.ReadCommands(positions)]
+        self.assertEqual(len(contents), 5)
+        self.assertEqual(contents, self.__FullReadContents(path, session_type, command_id, tab_id))
+
+  def testSidecarRoundTrip(self):
+    built = OpenCommandIndex(self.path_, sidecar_path=self.sidecar_path_)
+    self.assertTrue(os.path.exists(self.sidecar_path_))
+    loaded = CommandIndex(self.path_)
+    self.assertTrue(loaded.ReadSidecar(self.sidecar_path_))
+    self.assertTrue(loaded.IsCurrent())
+    self.assertEqual(len(loaded), len(built))
+    for tab_id in built.tab_ids():
+      self.assertEqual(loaded.PositionsForTab(tab_id), built.PositionsForTab(tab_id))
+    self.assertEqual(loaded.PositionsForCommand(const.TabNavigation_kCommandUpdateTabNavigation),
+                     built.PositionsForCommand(const.TabNavigation_kCommandUpdateTabNavigation))
+
+  def testSidecarRejectedAfterSizeChange(self):
+    OpenCommandIndex(self.path_, sidecar_path=self.sidecar_path_)
+    stat = os.stat(self.path_)
+    with open(self.path_, 'ab') as f:
+      f.write(b'\0')
+    os.utime(self.path_, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    index = CommandIndex(self.path_)
+    self.assertFalse(index.ReadSidecar(self.sidecar_path_))
+    self.assertEqual(len(index), 0)
+
+  def testSidecarRejectedAfterMtimeChange(self):
+    built = OpenCommandIndex(self.path_, sidecar_path=self.sidecar_path_)
+    stat = os.stat(self.path_)
+    os.utime(self.path_, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    self.assertFalse(built.IsCurrent())
+    self.assertFalse(CommandIndex(self.path_).ReadSidecar(self.sidecar_path_))
+
+  def testTruncatedSidecarRejected(self):
+    OpenCommandIndex(self.path_, sidecar_path=self.sidecar_path_)
+    with open(self.sidecar_path_, 'rb') as f:
+      data = f.read()
+    for size in (0, 10, len(data) // 2, len(data) - 1):
+      with open(self.sidecar_path_, 'wb') as f:
+        f.write(data[:size])
+      index = CommandIndex(self.path_)
+      self.assertFalse(index.ReadSidecar(self.sidecar_path_), size)
+      self.assertEqual(len(index), 0)
+
+  def testSidecarOfOtherSessionTypeRejected(self):
+    OpenCommandIndex(self.path_, sidecar_path=self.sidecar_path_)
+    self.assertFalse(CommandIndex(self.path_, SessionType.SESSION_RESTORE).ReadSidecar(self.sidecar_path_))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+from sessionfixtures import RunChromeTabs
+from dedup import NormalizeUrl, UrlIndex, UrlEntry, BloomUrlFilter
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+class NormalizeUrlTest(unittest.TestCase):
+  def testEquivalentUrlsNormalizeAlike(self):
+    for urls in (('HTTPS://Example.COM:443/a?q=1#top', 'https://example.com/a?q=1'),
+                 ('http://example.com', 'http://example.com:80/', 'http://EXAMPLE.com/#x'),
+                 ('http://[::1]:8080/admin', 'HTTP://[::1]:8080/admin#frag'),
+                 ('https://user:pw@Example.com/', 'https://user:pw@example.com:443/')):
+      self.assertEqual(len(set(NormalizeUrl(url) for url in urls)), 1, urls)
+
+  def testDifferentUrlsStayDifferent(self):
+    urls = ('https://example.com/a', 'http://example.com/a', 'https://example.com:8443/a',
+            'https://example.com/A', 'https://example.com/a?q=1', 'https://user@example.com/a')
+    self.assertEqual(len(set(NormalizeUrl(url) for url in urls)), len(urls))
+
+  def testUnparsableUrlIsUnchanged(self):
+    self.assertEqual(NormalizeUrl('http://example.com:port/'), 'http://example.com:port/')
+
+class UrlIndexTest(unittest.TestCase):
+  def testDuplicatesAcrossFiles(self):
+    for keep_urls in (True, False):
+      index = UrlIndex(keep_urls=keep_urls)
+      self.assertTrue(index.Add('https://example.com/a', 'a/Current Tabs', 1))
+      self.assertTrue(index.Add('https://example.com/b', 'a/Current Tabs', 2))
+      self.assertFalse(index.Add('HTTPS://EXAMPLE.COM/a#x', 'b/Current Session', 7))
+      self.assertFalse(index.Add('https://example.com:443/a', 'c/Current Tabs', 9))
+      self.assertEqual(len(index), 2)
+      entry = index.Get('https://example.com/a')
+      self.assertEqual(entry[1:], (3, 'a/Current Tabs', 1, 'c/Current Tabs', 9))
+      self.assertEqual([entry.count for entry in index.entries()], [3, 1])
+      self.assertIsNone(index.Get('https://example.com/c'))
+
+  def testHashOnlyEntries(self):
+    with_urls = UrlIndex()
+    hashes_only = UrlIndex(keep_urls=False)
+    for index in (with_urls, hashes_only):
+      for url in ('https://example.com/a', 'https://example.com/b', 'https://example.com/a'):
+        index.Add(url, 'Current Tabs', 1)
+    self.assertEqual([entry.url for entry in with_urls.entries()], ['https://example.com/a', 'https://example.com/b'])
+    for with_url, hash_only in zip(with_urls.entries(), hashes_only.entries()):
+      self.assertRegex(hash_only.url, '^[0-9a-f]{16}$')
+      self.assertEqual(hash_only[1:], with_url[1:])
+    self.assertEqual(hashes_only.urls_, [])
+
+  def testGrowsPastLoadFactor(self):
+    index = UrlIndex(initial_capacity=16)
+    urls = ['https://host%d.example.com/%d' % (i % 37, i) for i in range(5000)]
+    for tab_id, url in enumerate(urls):
+      self.assertTrue(index.Add(url, 'Current Tabs', tab_id))
+    self.assertEqual(len(index), len(urls))
+    self.assertLessEqual(len(index), UrlIndex.kMaxLoad * (index.mask_ + 1))
+    for tab_id, url in enumerate(urls):
+      self.assertFalse(index.Add(url, 'Current Session', tab_id))
+    self.assertEqual([entry.url for entry in index.entries()], urls)
+    self.assertTrue(all(entry.count == 2 and entry.last_path == 'Current Session' for entry in index.entries()))
+
+class BloomUrlFilterTest(unittest.TestCase):
+  def testSeenUrlsAreNeverNew(self):
+    bloom = BloomUrlFilter(1000)
+    urls = ['https://example.com/%d' % (i,) for i in range(1000)]
+    new_count = sum(1 for url in urls if bloom.Add(url))
+    # At 0.1% false positives, few if any new URLs look seen.
+    self.assertGreaterEqual(new_count, 990)
+    self.assertEqual(len(bloom), new_count)
+    for url in urls:
+      self.assertTrue(bloom.MayContain(url))
+      self.assertFalse(bloom.Add(url))
+    self.assertTrue(bloom.MayContain('HTTPS://EXAMPLE.COM:443/5#top'))
+
+  def testFalsePositiveRate(self):
+    bloom = BloomUrlFilter(2000, error_rate=0.01)
+    for i in range(2000):
+      bloom.Add('https://example.com/seen/%d' % (i,))
+    false_positives = sum(1 for i in range(10000) if bloom.MayContain('https://example.com/other/%d' % (i,)))
+    self.assertLess(false_positives, 300)
+
+  def testInvalidCapacity(self):
+    for capacity in (0, -1):
+      with self.assertRaises(ValueError):
+        BloomUrlFilter(capacity)
+    with self.assertRaises(ValueError):
+      BloomUrlFilter(10, error_rate=0)
+    process = RunChromeTabs('--path', '.', '--dedup-bloom', '0')
+    self.assertEqual(process.returncode, 2)
+    self.assertIn('--dedup-bloom', process.stderr)
+    self.assertNotIn('Traceback', process.stderr)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,103 @@
+import json
+import tempfile
+import unittest
+
+from sessionfixtures import RunChromeTabs, MakeNavigation, NavigationPickleBytes, TruncatedPickleBytes, WriteSyntheticSessionFile
+from chromepickle import Pickle, FastPickleIterator
+from constants import SessionType
+from tabnavigation import TabNavigation, LazyTabNavigation, ProjectedTabNavigation, kNavigationFields
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# FastPickleIterator that counts the binary strings it copies.
+class CountingPickleIterator(FastPickleIterator):
+  def __init__(self, pickle):
+    super().__init__(pickle)
+    self.binary_string_count_ = 0
+
+  def ReadBinaryString(self):
+    self.binary_string_count_ += 1
+    return super().ReadBinaryString()
+
+# Checks that ProjectedTabNavigation only changes which fields are read, not
+# which navigations are accepted.
+class ProjectedTabNavigationTest(unittest.TestCase):
+  kFieldSets = (('index',), ('virtual_url',), ('title',), ('transition_type',), ('referrer',),
+                ('virtual_url', 'title', 'transition_type'), kNavigationFields)
+
+  def testAcceptsAndRejectsTheSameTruncatedPayloads(self):
+    data = NavigationPickleBytes()
+    payload_size = len(data) - 4
+    for size in range(payload_size + 1):
+      full = TabNavigation().ReadFromPickle(FastPickleIterator(Pickle(TruncatedPickleBytes(data, size))))
+      lazy = LazyTabNavigation().ReadFromPickle(FastPickleIterator(Pickle(TruncatedPickleBytes(data, size))))
+      self.assertEqual(lazy, full, size)
+      for fields in self.kFieldSets:
+        projected = ProjectedTabNavigation(fields).ReadFromPickle(FastPickleIterator(Pickle(TruncatedPickleBytes(data, size))))
+        self.assertEqual(projected, full, (size, fields))
+
+  def testContentStateIsNotCopiedUnlessRequested(self):
+    data = NavigationPickleBytes()
+    for fields, copies in ((('virtual_url', 'title', 'transition_type'), 0), (('referrer',), 0), (('content_state',), 1)):
+      iterator = CountingPickleIterator(Pickle(data))
+      navigation = ProjectedTabNavigation(fields)
+      self.assertTrue(navigation.ReadFromPickle(iterator))
+      self.assertEqual(iterator.binary_string_count_, copies, fields)
+      self.assertEqual(navigation.content_state(), MakeNavigation().content_state() if copies else None)
+
+  def testProjectedFieldsMatchFullRead(self):
+    data = NavigationPickleBytes()
+    full = TabNavigation()
+    self.assertTrue(full.ReadFromPickle(FastPickleIterator(Pickle(data))))
+    navigation = ProjectedTabNavigation(('virtual_url', 'title', 'transition_type'))
+    self.assertTrue(navigation.ReadFromPickle(FastPickleIterator(Pickle(data))))
+    self.assertEqual((navigation.index(), navigation.virtual_url(), navigation.title(), navigation.transition_type()),
+                     (full.index(), full.virtual_url(), full.title(), full.transition_type()))
+
+# Checks --fields against the full output of the same file.
+class FieldsOptionTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+    self.path_ = WriteSyntheticSessionFile(self.directory_.name, 'Current Tabs', SessionType.TAB_RESTORE, seed=2, windows=2,
+                                           tabs_per_window=5, navigations_per_tab=6, legacy_rate=0.2, truncated_bytes=7)
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def __Records(self, *arguments) -> list:
+    process = RunChromeTabs('--path', self.path_, '--format', 'jsonl', *arguments)
+    self.assertEqual(process.returncode, 0, process.stderr)
+    return [json.loads(line) for line in process.stdout.splitlines()]
+
+  def testUrlTitleTransition(self):
+    full = self.__Records()
+    projected = self.__Records('--fields', 'url,title,transition')
+    self.assertEqual(len(full), 60)
+    self.assertEqual(projected, [{'virtual_url' : record['virtual_url'], 'title' : record['title'], 'transition_type' : record['transition_type']}
+                                 for record in full])
+
+if __name__ == '__main__':
+  unittest.main()
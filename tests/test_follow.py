@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+
+from sessionfixtures import WriteSessionFile
+from session import SessionCommand, SessionFileWriter
+from constants import SessionType
+from follow import SessionFileFollower
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Returns commands whose contents tell them apart, |first| to |last| - 1.
+def Commands(first : int, last : int, size : int = 20) -> list:
+  return [SessionCommand(1, bytes([value % 256]) * size) for value in range(first, last)]
+
+def Contents(commands : list) -> list:
+  return [(command.command_id(), bytes(command.contents())) for command in commands]
+
+# Appends |commands| to the session file at |path|, followed by |trailing|
+# bytes.
+def AppendCommands(path : str, commands : list, trailing : bytes = b''):
+  writer = SessionFileWriter(path, truncate=False)
+  if not writer.AppendCommands(commands):
+    raise AssertionError('AppendCommands failed')
+  writer.Close()
+  with open(path, 'ab') as f:
+    f.write(trailing)
+
+# Checks which commands SessionFileFollower.Poll returns as the file is
+# appended to and rewritten.
+class SessionFileFollowerTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+    self.path_ = os.path.join(self.directory_.name, 'Current Tabs')
+    self.follower_ = SessionFileFollower(self.path_, SessionType.TAB_RESTORE)
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def __Poll(self) -> list:
+    return Contents(self.follower_.Poll())
+
+  def testPollReturnsAppendedCommands(self):
+    self.assertEqual(self.__Poll(), [])
+    WriteSessionFile(self.directory_.name, Commands(0, 3))
+    self.assertEqual(self.__Poll(), Contents(Commands(0, 3)))
+    self.assertEqual(self.__Poll(), [])
+    AppendCommands(self.path_, Commands(3, 5))
+    self.assertEqual(self.__Poll(), Contents(Commands(3, 5)))
+    self.assertEqual(self.follower_.restart_count(), 0)
+
+  def testPartialCommandIsReadOnceComplete(self):
+    WriteSessionFile(self.directory_.name, Commands(0, 2))
+    self.__Poll()
+    # Write the size and part of the contents of a command, then the rest.
+    partial = os.path.join(self.directory_.name, 'partial')
+    WriteSessionFile(self.directory_.name, Commands(2, 3), name='partial')
+    with open(partial, 'rb') as f:
+      framed = f.read()[8:]
+    with open(self.path_, 'ab') as f:
+      f.write(framed[:7])
+    self.assertEqual(self.__Poll(), [])
+    with open(self.path_, 'ab') as f:
+      f.write(framed[7:])
+    self.assertEqual(self.__Poll(), Contents(Commands(2, 3)))
+    self.assertEqual(self.follower_.restart_count(), 0)
+
+  def testRewriteInPlaceThatShrinks(self):
+    WriteSessionFile(self.directory_.name, Commands(0, 5))
+    self.__Poll()
+    ino = os.stat(self.path_).st_ino
+    WriteSessionFile(self.directory_.name, Commands(10, 12))
+    self.assertEqual(os.stat(self.path_).st_ino, ino)
+    self.assertEqual(self.__Poll(), Contents(Commands(10, 12)))
+    self.assertEqual(self.follower_.restart_count(), 1)
+
+  def testRewriteInPlaceThatGrows(self):
+    WriteSessionFile(self.directory_.name, Commands(0, 3))
+    self.__Poll()
+    # Same inode, larger than the resume offset, but other bytes before it.
+    WriteSessionFile(self.directory_.name, Commands(10, 16))
+    self.assertEqual(self.__Poll(), Contents(Commands(10, 16)))
+    self.assertEqual(self.follower_.restart_count(), 1)
+
+  def testReplacedFile(self):
+    WriteSessionFile(self.directory_.name, Commands(0, 3))
+    self.__Poll()
+    # Same contents up to the resume offset, but a new inode.
+    replacement = WriteSessionFile(self.directory_.name, Commands(0, 4), name='replacement')
+    os.replace(replacement, self.path_)
+    self.assertEqual(self.__Poll(), Contents(Commands(0, 4)))
+    self.assertEqual(self.follower_.restart_count(), 1)
+
+  def testHeaderOnlyRewrite(self):
+    WriteSessionFile(self.directory_.name, Commands(0, 3))
+    self.__Poll()
+    WriteSessionFile(self.directory_.name, [])
+    self.assertEqual(self.__Poll(), [])
+    self.assertEqual(self.follower_.restart_count(), 1)
+    # Commands appended after the rewrite are read as appended commands, not
+    # as another rewrite.
+    AppendCommands(self.path_, Commands(20, 22))
+    self.assertEqual(self.__Poll(), Contents(Commands(20, 22)))
+    self.assertEqual(self.follower_.restart_count(), 1)
+
+  def testMissingFileAndIncompleteHeader(self):
+    self.assertEqual(self.__Poll(), [])
+    with open(self.path_, 'wb') as f:
+      f.write(b'SN')
+    self.assertEqual(self.__Poll(), [])
+    WriteSessionFile(self.directory_.name, Commands(0, 2))
+    self.assertEqual(self.__Poll(), Contents(Commands(0, 2)))
+    self.assertEqual(self.follower_.restart_count(), 0)
+
+if __name__ == '__main__':
+  unittest.main()
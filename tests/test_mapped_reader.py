@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from sessionfixtures import WriteSyntheticSessionFile
+from session import SessionFileReader, MappedSessionFileReader
+from constants import SessionType
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Returns the (command id, contents) of each command |reader_class| reads
+# from the file at |path|.
+def ReadCommands(reader_class, path : str, session_type : SessionType) -> list:
+  reader = reader_class(path)
+  commands = [(command.command_id(), bytes(command.contents())) for command in reader.IterCommands(session_type)]
+  reader.Close()
+  return commands
+
+# Checks that MappedSessionFileReader yields the same command stream as
+# SessionFileReader, byte for byte.
+class MappedSessionFileReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def __AssertSameCommands(self, path : str, session_type : SessionType, expected_count : int = None):
+    buffered = ReadCommands(SessionFileReader, path, session_type)
+    self.assertEqual(ReadCommands(MappedSessionFileReader, path, session_type), buffered)
+    if expected_count is not None:
+      self.assertEqual(len(buffered), expected_count)
+
+  def testSameCommandsWithTruncatedTail(self):
+    for name, session_type in (('Current Tabs', SessionType.TAB_RESTORE), ('Current Session', SessionType.SESSION_RESTORE)):
+      for truncated_bytes in (0, 1, 2, 3, 50):
+        path = WriteSyntheticSessionFile(self.directory_.name, name, session_type, seed=truncated_bytes, windows=2,
+                                         tabs_per_window=3, navigations_per_tab=4, truncated_bytes=truncated_bytes)
+        complete = WriteSyntheticSessionFile(self.directory_.name, 'complete', session_type, seed=truncated_bytes, windows=2,
+                                             tabs_per_window=3, navigations_per_tab=4)
+        # The truncated command is dropped by both readers.
+        self.__AssertSameCommands(path, session_type, len(ReadCommands(SessionFileReader, complete, session_type)))
+
+  def testSameCommandsWithLegacyAndLargePayloads(self):
+    # Large content states make SessionFileReader grow its buffer.
+    path = WriteSyntheticSessionFile(self.directory_.name, 'Current Tabs', SessionType.TAB_RESTORE, seed=5, windows=1,
+                                     tabs_per_window=4, navigations_per_tab=5, legacy_rate=0.5,
+                                     large_content_state_rate=0.3, large_content_state_size=40000, truncated_bytes=9)
+    self.__AssertSameCommands(path, SessionType.TAB_RESTORE, 1 + 4 * 6)
+
+  def testInvalidHeaderRejectedByBoth(self):
+    for data in (b'', b'SNSS', b'XXXX\x01\x00\x00\x00'):
+      path = os.path.join(self.directory_.name, 'Current Tabs')
+      with open(path, 'wb') as f:
+        f.write(data)
+      for reader_class in (SessionFileReader, MappedSessionFileReader):
+        with self.assertRaises(ValueError, msg=(reader_class.__name__, data)):
+          ReadCommands(reader_class, path, SessionType.TAB_RESTORE)
+
+if __name__ == '__main__':
+  unittest.main()
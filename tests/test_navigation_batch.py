@@ -0,0 +1,93 @@
+import unittest
+
+from sessionfixtures import NavigationPickleBytes, TruncatedPickleBytes
+from chromepickle import Pickle, FastPickleIterator
+from constants import PageTransition, WebKitWebReferrerPolicy
+from tabnavigation import TabNavigation
+from navigationbatch import NavigationBatch
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Returns the row NavigationBatch decodes for the pickle |data|, read with
+# TabNavigation, or None if TabNavigation rejects it.
+def ObjectRow(data : bytes) -> tuple:
+  iterator = FastPickleIterator(Pickle(data))
+  status, tab_id = iterator.ReadInt()
+  if status == False:
+    return None
+  navigation = TabNavigation()
+  if navigation.ReadFromPickle(iterator) == False:
+    return None
+  referrer = navigation.referrer()
+  return (tab_id, navigation.index(), navigation.virtual_url(), navigation.title(), navigation.content_state(),
+          navigation.transition_type(), int(navigation.has_post_data()),
+          referrer.url_ if referrer is not None else '',
+          referrer.policy_ if referrer is not None else int(WebKitWebReferrerPolicy.WebReferrerPolicyDefault),
+          navigation.original_request_url() or '', navigation.is_overriding_user_agent())
+
+# Checks that NavigationBatch decodes the same navigations as TabNavigation.
+class NavigationBatchTest(unittest.TestCase):
+  def testMatchesTabNavigation(self):
+    data = NavigationPickleBytes(tab_id=7)
+    for payload_size in range(len(data) - 4 + 1):
+      truncated = TruncatedPickleBytes(data, payload_size)
+      batch = NavigationBatch()
+      decoded = batch.Decode(truncated, ((0, len(truncated)),))
+      expected = ObjectRow(truncated)
+      if expected is None:
+        self.assertEqual((decoded, batch.failed_count()), (0, 1), payload_size)
+        continue
+      self.assertEqual(decoded, 1, payload_size)
+      row = next(batch.rows())
+      # type_mask is kept whole by the batch; TabNavigation keeps its post
+      # data bit.
+      row = row[:6] + (row[6] & 1,) + row[7:]
+      self.assertEqual(row, expected, payload_size)
+
+  # A referrer whose length runs past the end of the payload is read as ''
+  # by both, and the fields after it are still read.
+  def testFieldsAfterUnreadableReferrer(self):
+    pickle = Pickle()
+    pickle.WriteInt(7)
+    pickle.WriteInt(2)
+    pickle.WriteString('https://example.com/a')
+    pickle.WriteString16('Title')
+    pickle.WriteData(b'', 0)
+    pickle.WriteInt(int(PageTransition.PAGE_TRANSITION_LINK))
+    pickle.WriteInt(0)
+    pickle.WriteInt(1000)
+    pickle.WriteInt(int(WebKitWebReferrerPolicy.WebReferrerPolicyOrigin))
+    pickle.WriteString('https://example.com/b')
+    pickle.WriteBool(True)
+    data = bytes(pickle.data()[:pickle.size()])
+    batch = NavigationBatch()
+    self.assertEqual(batch.Decode(data, ((0, len(data)),)), 1)
+    row = next(batch.rows())
+    self.assertEqual(row[7:], ('', int(WebKitWebReferrerPolicy.WebReferrerPolicyOrigin), 'https://example.com/b', True))
+    self.assertEqual(row, ObjectRow(data))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,128 @@
+import json
+import tempfile
+import unittest
+from urllib.parse import urlparse
+
+from sessionfixtures import RunChromeTabs, WriteSessionFile
+from chromepickle import FastPickleIterator
+from session import SessionFileReader
+from constants import SessionType, const
+from tabnavigation import TabNavigation, CreateUpdateTabNavigationCommand
+from extract import IterNavigationRecords
+from navigationfilter import NavigationFilter, SchemeAndHostOfUrl
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# URLs of the navigations written by WriteTabUrlsSessionFile, one tab per URL list.
+kTabUrls = (
+  ('https://www.example.com/', 'https://mail.corp.example.com/inbox', 'http://[::1]:8080/admin'),
+  ('http://Example.COM/Path', 'about:blank', 'file:///tmp/report.html', 'chrome://settings/'),
+  ('https://[fe80::1]/', 'https://user@intranet:8443/login?next=/home', 'ftp://ftp.example.org/pub/'),
+)
+
+# Writes a tabs file holding a navigation for each of kTabUrls. Returns its
+# path.
+def WriteTabUrlsSessionFile(directory : str) -> str:
+  commands = []
+  for tab_id, urls in enumerate(kTabUrls, 10):
+    for index, url in enumerate(urls):
+      navigation = TabNavigation()
+      navigation.set_index(index)
+      navigation.set_virtual_url(url)
+      navigation.set_title('Title of %s' % (url,))
+      navigation.set_original_request_url(url)
+      commands.append(CreateUpdateTabNavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, tab_id, navigation))
+  return WriteSessionFile(directory, commands)
+
+# Filters checked, with the number of navigations each selects.
+kFilters = (
+  (NavigationFilter(host_globs=['*.example.com']), 2),
+  (NavigationFilter(host_globs=['example.com', 'INTRANET']), 2),
+  (NavigationFilter(host_globs=['::1']), 1),
+  (NavigationFilter(host_globs=['fe80::*']), 1),
+  (NavigationFilter(schemes=['HTTP', 'file:']), 3),
+  (NavigationFilter(url_regex=r'/(admin|login)\b'), 2),
+  (NavigationFilter(tab_ids=[11]), 4),
+  (NavigationFilter(host_globs=['*example*'], schemes=['https'], tab_ids=[10, 12]), 2),
+)
+
+# Checks that filtering while reading selects the same navigations as a full
+# read filtered afterwards.
+class NavigationFilterTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+    self.path_ = WriteTabUrlsSessionFile(self.directory_.name)
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def testSchemeAndHostOfUrl(self):
+    self.assertEqual(SchemeAndHostOfUrl('http://[::1]:8080/admin'), ('http', '::1'))
+    self.assertEqual(SchemeAndHostOfUrl('https://user@WWW.Example.com:8080/'), ('https', 'www.example.com'))
+    # The host is the same as the one urlparse (and the exported host column)
+    # sees.
+    for url in ('http://a@b@evil.com/', 'http://a@b@evil.com:81/x@y', 'http://u:p@w@[::1]/'):
+      self.assertEqual(SchemeAndHostOfUrl(url)[1], urlparse(url).hostname, url)
+    self.assertTrue(NavigationFilter(host_globs=['evil.com']).MatchesUrl('http://a@b@evil.com/'))
+    self.assertFalse(NavigationFilter(host_globs=['b*']).MatchesUrl('http://a@b@evil.com/'))
+    self.assertEqual(SchemeAndHostOfUrl('about:blank'), ('about', ''))
+    self.assertEqual(SchemeAndHostOfUrl('/relative'), ('', ''))
+
+  def testFilteredReadMatchesFilteredFullRead(self):
+    full = list(IterNavigationRecords(self.path_))
+    self.assertEqual(len(full), 10)
+    for navigation_filter, count in kFilters:
+      expected = [record for record in full if navigation_filter.MatchesRecord(record)]
+      self.assertEqual(len(expected), count, navigation_filter.__getstate__())
+      self.assertEqual(list(IterNavigationRecords(self.path_, navigation_filter=navigation_filter)), expected)
+      projected = list(IterNavigationRecords(self.path_, navigation_filter=navigation_filter, fields=('tab_id', 'virtual_url')))
+      self.assertEqual([(record.tab_id, record.virtual_url) for record in projected],
+                       [(record.tab_id, record.virtual_url) for record in expected])
+
+  def testEagerReadFromPickleIf(self):
+    navigation_filter = NavigationFilter(host_globs=['::1'])
+    reader = SessionFileReader(self.path_)
+    matched = []
+    for command in reader.IterCommands(SessionType.TAB_RESTORE):
+      iterator = FastPickleIterator(command.PayloadAsPickle())
+      iterator.ReadInt()
+      navigation = TabNavigation()
+      status, match = navigation.ReadFromPickleIf(iterator, navigation_filter.MatchesUrl)
+      self.assertTrue(status)
+      if match:
+        matched.append((navigation.virtual_url(), navigation.title()))
+      else:
+        self.assertIsNone(navigation.title())
+    reader.Close()
+    self.assertEqual(matched, [('http://[::1]:8080/admin', 'Title of http://[::1]:8080/admin')])
+
+  def testHostFlagMatchesIPv6Host(self):
+    process = RunChromeTabs('--path', self.directory_.name, '--host', '::1', '--format', 'jsonl')
+    self.assertEqual(process.returncode, 0, process.stderr)
+    self.assertEqual([json.loads(line)['virtual_url'] for line in process.stdout.splitlines()], ['http://[::1]:8080/admin'])
+
+if __name__ == '__main__':
+  unittest.main()
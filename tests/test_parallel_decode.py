@@ -0,0 +1,85 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from sessionfixtures import WriteSyntheticSessionFile
+from session import MappedSessionFileReader
+from constants import SessionType
+from navigationfilter import NavigationFilter
+import extract
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# MappedSessionFileReader that appends to the file it framed once it is
+# closed, i.e. after ExtractFileParallel framed the file and before its
+# workers map it.
+class RewritingMappedSessionFileReader(MappedSessionFileReader):
+  def __init__(self, path):
+    super().__init__(path)
+    self.path_ = path
+    self.rewritten_ = False
+
+  def Close(self):
+    super().Close()
+    if not self.rewritten_:
+      self.rewritten_ = True
+      with open(self.path_, 'ab') as f:
+        f.write(b'\0\0')
+
+# Checks that ExtractFileParallel yields the records of the sequential reader,
+# in the same order, when the file is split into several tasks.
+class ExtractFileParallelTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def testMatchesSequentialRead(self):
+    for name, session_type in (('Current Tabs', SessionType.TAB_RESTORE), ('Current Session', SessionType.SESSION_RESTORE)):
+      path = WriteSyntheticSessionFile(self.directory_.name, name, session_type, seed=6, windows=2, tabs_per_window=4,
+                                       navigations_per_tab=5, legacy_rate=0.2, truncated_bytes=11)
+      path, status, expected = extract.ExtractFile(path)
+      self.assertTrue(status)
+      self.assertEqual(len(expected), 40)
+      # 40 navigations in tasks of 7 make 6 tasks, the last one partial.
+      self.assertEqual(list(extract.ExtractFileParallel(path, workers=2, spans_per_task=7)), expected)
+
+      navigation_filter = NavigationFilter(host_globs=['host[0-4]*'])
+      fields = ('tab_id', 'virtual_url')
+      path, status, expected = extract.ExtractFile(path, navigation_filter=navigation_filter, fields=fields)
+      self.assertEqual(list(extract.ExtractFileParallel(path, workers=2, spans_per_task=3, navigation_filter=navigation_filter, fields=fields)),
+                       expected)
+
+  def testFileChangedAfterFramingIsRejected(self):
+    path = WriteSyntheticSessionFile(self.directory_.name, 'Current Tabs', SessionType.TAB_RESTORE, seed=6, windows=1,
+                                     tabs_per_window=4, navigations_per_tab=5)
+    with mock.patch.object(extract, 'MappedSessionFileReader', RewritingMappedSessionFileReader):
+      with self.assertRaisesRegex(ValueError, 'changed while it was decoded'):
+        list(extract.ExtractFileParallel(path, workers=2, spans_per_task=4))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,149 @@
+import os
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+from sessionfixtures import MakeNavigation, WriteSessionFile
+from session import SessionFileWriter
+from constants import SessionType, const
+from tabnavigation import CreateUpdateTabNavigationCommand
+from extract import IterNavigationRecords
+import parsecache
+from parsecache import ParseCache
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Returns update tab navigation commands of navigations |first| to |last| - 1,
+# each about 900 bytes.
+def NavigationCommands(first : int, last : int) -> list:
+  return [CreateUpdateTabNavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 5 + index % 3, MakeNavigation(index))
+          for index in range(first, last)]
+
+# Appends |commands| to the session file at |path|.
+def AppendCommands(path : str, commands : list):
+  writer = SessionFileWriter(path, truncate=False)
+  if not writer.AppendCommands(commands):
+    raise AssertionError('AppendCommands failed')
+  writer.Close()
+
+# Replaces the byte at |position| of the file at |path| (inside a string, so
+# the commands still frame) and moves its mtime forward.
+def ChangeByte(path : str, position : int):
+  with open(path, 'r+b') as f:
+    f.seek(position)
+    value = f.read(1)[0]
+    f.seek(position)
+    f.write(bytes([value ^ 0x01]))
+  stat = os.stat(path)
+  os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+# Checks the lookups of ParseCache: hits, append-only reparsing, invalidation
+# by the prefix and tail hashes, and eviction.
+class ParseCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+    self.cache_directory_ = os.path.join(self.directory_.name, 'cache')
+    self.path_ = WriteSessionFile(self.directory_.name, NavigationCommands(0, 10))
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def __Uncached(self, path : str) -> list:
+    return list(IterNavigationRecords(path))
+
+  def testUnchangedFileIsHit(self):
+    cache = ParseCache(self.cache_directory_)
+    first = cache.GetNavigationRecords(self.path_)
+    self.assertEqual((cache.miss_count(), cache.hit_count()), (1, 0))
+    with mock.patch.object(parsecache, 'NavigationRecordFromCommand') as decode:
+      self.assertEqual(cache.GetNavigationRecords(self.path_), first)
+      decode.assert_not_called()
+    self.assertEqual((cache.miss_count(), cache.hit_count()), (1, 1))
+    self.assertEqual(first, self.__Uncached(self.path_))
+
+  def testAppendedFileParsesOnlyAppendedCommands(self):
+    cache = ParseCache(self.cache_directory_)
+    cache.GetNavigationRecords(self.path_)
+    AppendCommands(self.path_, NavigationCommands(10, 13))
+    with mock.patch.object(parsecache, 'NavigationRecordFromCommand', wraps=parsecache.NavigationRecordFromCommand) as decode:
+      records = cache.GetNavigationRecords(self.path_)
+      self.assertEqual(decode.call_count, 3)
+    self.assertEqual(cache.append_count(), 1)
+    self.assertEqual(records, self.__Uncached(self.path_))
+    # The entry now covers the appended commands too.
+    self.assertEqual(ParseCache(self.cache_directory_).GetNavigationRecords(self.path_), records)
+
+  def testFileCutAtCommandBoundaryThenRestored(self):
+    with open(self.path_, 'rb') as f:
+      data = f.read()
+    cut = WriteSessionFile(self.directory_.name, NavigationCommands(0, 6), name='cut')
+    with open(cut, 'rb') as f:
+      prefix = f.read()
+    self.assertEqual(data[:len(prefix)], prefix)
+    with open(self.path_, 'wb') as f:
+      f.write(prefix)
+    cache = ParseCache(self.cache_directory_)
+    self.assertEqual(len(cache.GetNavigationRecords(self.path_)), 6)
+    with open(self.path_, 'wb') as f:
+      f.write(data)
+    self.assertEqual(cache.GetNavigationRecords(self.path_), self.__Uncached(self.path_))
+    self.assertEqual((cache.miss_count(), cache.append_count()), (1, 1))
+
+  def testChangedPrefixOrTailInvalidates(self):
+    self.assertGreater(os.path.getsize(self.path_), parsecache._kPrefixSize + parsecache._kTailSize)
+    # Inside the URL of the first command, and inside the original request
+    # URL near the end of the last one.
+    for distance_from_start, distance_from_end in ((30, None), (None, 20)):
+      cache = ParseCache(self.cache_directory_)
+      cache.GetNavigationRecords(self.path_)
+      position = distance_from_start if distance_from_end is None else os.path.getsize(self.path_) - distance_from_end
+      ChangeByte(self.path_, position)
+      AppendCommands(self.path_, NavigationCommands(20, 21))
+      miss_count = cache.miss_count()
+      records = cache.GetNavigationRecords(self.path_)
+      self.assertEqual((cache.miss_count(), cache.append_count()), (miss_count + 1, 0), position)
+      self.assertEqual(records, self.__Uncached(self.path_), position)
+
+  def testLeastRecentlyUsedEntriesAreEvicted(self):
+    paths = [WriteSessionFile(self.directory_.name, NavigationCommands(0, 4), name=name) for name in ('a', 'b', 'c')]
+    cache = ParseCache(self.cache_directory_)
+    for path in paths[:2]:
+      cache.GetNavigationRecords(path)
+    entries = [os.path.join(self.cache_directory_, hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json') for path in paths]
+    # a was used before b.
+    for when, entry in enumerate(entries[:2], 1):
+      os.utime(entry, ns=(when * 1000000000, when * 1000000000))
+    entry_size = os.path.getsize(entries[0])
+
+    cache = ParseCache(self.cache_directory_, max_bytes=2 * entry_size)
+    cache.GetNavigationRecords(paths[2])
+    self.assertEqual([os.path.exists(entry) for entry in entries], [False, True, True])
+    cache.GetNavigationRecords(paths[1])
+    self.assertEqual((cache.miss_count(), cache.hit_count()), (1, 1))
+
+if __name__ == '__main__':
+  unittest.main()
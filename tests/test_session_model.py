@@ -0,0 +1,228 @@
+import struct
+import tempfile
+import unittest
+
+from sessionfixtures import MakeNavigation, NavigationPickleBytes, WriteSessionFile
+from chromepickle import Pickle
+from session import SessionCommand, SessionFileReader
+from constants import SessionType, const
+from sessionmodel import SessionModelBuilder, TimeFromInternalValue
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# A base::Time, in microseconds since the Windows epoch.
+kTimestamp = 13245000000000000
+
+# Returns a command whose payload is |values| packed with the struct |format|.
+# The padding of the C++ structs is spelled out in |format|.
+def StructCommand(command_id : int, format : str, *values) -> SessionCommand:
+  return SessionCommand(command_id, struct.pack('=' + format, *values))
+
+# Returns a command whose payload is the pickle of an id and a string.
+def IdAndStringCommand(command_id : int, id : int, value : str) -> SessionCommand:
+  pickle = Pickle()
+  pickle.WriteInt(id)
+  pickle.WriteString(value)
+  return SessionCommand(command_id, pickle)
+
+# Returns the URL of navigation |index| of the tab with id |tab_id|.
+def NavigationUrl(tab_id : int, index : int) -> str:
+  return 'https://example.com/tab%d/%d' % (tab_id, index)
+
+# Returns a kCommandUpdateTabNavigation command of navigation |index| of the
+# tab with id |tab_id|.
+def NavigationCommand(command_id : int, tab_id : int, index : int) -> SessionCommand:
+  navigation = MakeNavigation(index)
+  navigation.set_virtual_url(NavigationUrl(tab_id, index))
+  return SessionCommand(command_id, NavigationPickleBytes(navigation, tab_id))
+
+# Writes |commands| to a session file named |name|, reads them back and
+# replays them with a SessionModelBuilder of |session_type|.
+def BuildFromFile(commands : list, name : str, session_type : SessionType) -> SessionModelBuilder:
+  with tempfile.TemporaryDirectory() as directory:
+    reader = SessionFileReader(WriteSessionFile(directory, commands, name=name))
+    builder = SessionModelBuilder(session_type)
+    builder.AddCommands(reader.IterCommands(session_type))
+    reader.Close()
+  return builder
+
+class TabRestoreModelTest(unittest.TestCase):
+  def testWindowsTabsAndRestoredEntries(self):
+    commands = [
+      # A closed window with two tabs, written as WindowPayload2. The int64
+      # timestamp is aligned, so 4 bytes of padding follow num_tabs.
+      StructCommand(const.TabNavigation_kCommandWindow, 'iii4xq', 10, 1, 2, kTimestamp),
+      StructCommand(const.TabNavigation_kCommandSelectedNavigationInTab, 'iiq', 1, 1, kTimestamp),
+      SessionCommand(const.TabNavigation_kCommandPinnedState, struct.pack('=?', True)),
+      IdAndStringCommand(const.TabNavigation_kCommandSetExtensionAppID, 1, 'app-id'),
+      NavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 1, 0),
+      NavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 1, 1),
+      StructCommand(const.TabNavigation_kCommandSelectedNavigationInTab, 'ii', 2, 0),
+      NavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 2, 0),
+      # A closed tab outside any window.
+      StructCommand(const.TabNavigation_kCommandSelectedNavigationInTab, 'ii', 3, 0),
+      IdAndStringCommand(const.TabNavigation_kCommandSetTabUserAgentOverride, 3, 'agent'),
+      NavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 3, 0),
+      # A window written as WindowPayload, then restored.
+      StructCommand(const.TabNavigation_kCommandWindow, 'iii', 20, 0, 1),
+      StructCommand(const.TabNavigation_kCommandSelectedNavigationInTab, 'ii', 4, 0),
+      NavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 4, 0),
+      StructCommand(const.TabNavigation_kCommandRestoredEntry, 'i', 20),
+      # WindowPayload2 without its padding is not a valid payload.
+      StructCommand(const.TabNavigation_kCommandWindow, 'iiiq', 30, 0, 0, kTimestamp),
+    ]
+    builder = BuildFromFile(commands, const.kCurrentTabSessionFileName, SessionType.TAB_RESTORE)
+    model = builder.model()
+    self.assertEqual(builder.failed_count(), 1)
+
+    self.assertEqual([window.window_id() for window in model.windows()], [10])
+    window = model.GetWindow(10)
+    self.assertEqual(window.timestamp(), TimeFromInternalValue(kTimestamp))
+    self.assertEqual([tab.tab_id() for tab in window.tabs()], [1, 2])
+    self.assertIs(window.selected_tab(), model.GetTab(2))
+
+    self.assertEqual([tab.tab_id() for tab in model.tabs()], [1, 2, 3])
+    tab = model.GetTab(1)
+    self.assertTrue(tab.pinned())
+    self.assertEqual(tab.extension_app_id(), 'app-id')
+    self.assertEqual(tab.timestamp(), TimeFromInternalValue(kTimestamp))
+    self.assertEqual([navigation.index() for navigation in tab.navigations()], [0, 1])
+    self.assertEqual(tab.current_navigation().virtual_url(), NavigationUrl(1, 1))
+
+    tab = model.GetTab(3)
+    self.assertEqual(tab.window_id(), -1)
+    self.assertFalse(tab.pinned())
+    self.assertEqual(tab.user_agent_override(), 'agent')
+    self.assertEqual(tab.current_navigation().virtual_url(), NavigationUrl(3, 0))
+    self.assertIsNone(model.GetTab(4))
+
+  def testPinnedStateWithoutTabFails(self):
+    builder = SessionModelBuilder(SessionType.TAB_RESTORE)
+    self.assertFalse(builder.AddCommand(SessionCommand(const.TabNavigation_kCommandPinnedState, struct.pack('=?', True))))
+    self.assertEqual(builder.failed_count(), 1)
+
+  def testUnsupportedSessionType(self):
+    with self.assertRaises(ValueError):
+      SessionModelBuilder(2)
+
+class SessionRestoreModelTest(unittest.TestCase):
+  def testWindowsTabsAndPrunedNavigations(self):
+    commands = [
+      # WindowBoundsPayload2 pads its trailing bool to 4 bytes.
+      StructCommand(const.kCommandSetWindowBounds2, 'iiiii?3x', 1, 10, 20, 800, 600, True),
+      StructCommand(const.kCommandSetWindowBounds3, 'iiiiii', 2, 30, 40, 1024, 768, 1),
+      StructCommand(const.kCommandSetWindowType, 'ii', 1, 0),
+      IdAndStringCommand(const.kCommandSetWindowAppName, 2, 'app-name'),
+      StructCommand(const.kCommandSetTabWindow, 'ii', 1, 11),
+      StructCommand(const.kCommandSetTabWindow, 'ii', 1, 12),
+      StructCommand(const.kCommandSetTabWindow, 'ii', 2, 21),
+      StructCommand(const.kCommandSetTabWindow, 'ii', 2, 22),
+      StructCommand(const.kCommandSetTabWindow, 'ii', 3, 31),
+      StructCommand(const.kCommandSetTabIndexInWindow, 'ii', 11, 1),
+      StructCommand(const.kCommandSetTabIndexInWindow, 'ii', 12, 0),
+      StructCommand(const.kCommandSetSelectedTabInIndex, 'ii', 1, 0),
+      StructCommand(const.kCommandSetSelectedTabInIndex, 'ii', 2, 0),
+      # PinnedStatePayload pads its trailing bool to 4 bytes.
+      StructCommand(const.kCommandSetPinnedState, 'i?3x', 12, True),
+      IdAndStringCommand(const.kCommandSessionStorageAssociated, 11, 'storage-id'),
+    ]
+    commands += [NavigationCommand(const.kCommandUpdateTabNavigation, 11, index) for index in range(5)]
+    commands += [NavigationCommand(const.kCommandUpdateTabNavigation, 12, index) for index in range(4)]
+    commands += [NavigationCommand(const.kCommandUpdateTabNavigation, 22, 0)]
+    commands += [
+      StructCommand(const.kCommandSetSelectedNavigationIndex, 'ii', 11, 3),
+      StructCommand(const.kCommandTabNavigationPathPrunedFromFront, 'ii', 11, 2),
+      StructCommand(const.kCommandSetSelectedNavigationIndex, 'ii', 12, 1),
+      StructCommand(const.kCommandTabNavigationPathPrunedFromBack, 'ii', 12, 2),
+      # The obsolete closed commands (ids 3 and 4) carry a ClosedPayload: the
+      # int64 close time is aligned after 4 bytes of padding.
+      StructCommand(const.kCommandTabClosedObsolete, 'i4xq', 21, kTimestamp),
+      StructCommand(const.kCommandWindowClosedObsolete, 'i4xq', 3, kTimestamp),
+      # Payloads without their padding are rejected.
+      StructCommand(const.kCommandTabClosed, 'iq', 22, kTimestamp),
+      StructCommand(const.kCommandSetPinnedState, 'i?', 11, True),
+      StructCommand(const.kCommandTabNavigationPathPrunedFromFront, 'ii', 22, -1),
+    ]
+    builder = BuildFromFile(commands, const.kCurrentSessionFileName, SessionType.SESSION_RESTORE)
+    model = builder.model()
+    self.assertEqual(builder.failed_count(), 3)
+
+    self.assertEqual([window.window_id() for window in model.windows()], [1, 2])
+    window = model.GetWindow(1)
+    self.assertEqual(window.bounds(), (10, 20, 800, 600))
+    self.assertEqual(window.show_state(), 3)
+    self.assertEqual([tab.tab_id() for tab in window.tabs()], [12, 11])
+    self.assertIs(window.selected_tab(), model.GetTab(12))
+    window = model.GetWindow(2)
+    self.assertEqual(window.bounds(), (30, 40, 1024, 768))
+    self.assertEqual(window.show_state(), 1)
+    self.assertEqual(window.app_name(), 'app-name')
+    self.assertEqual([tab.tab_id() for tab in window.tabs()], [22])
+
+    self.assertEqual([tab.tab_id() for tab in model.tabs()], [11, 12, 22])
+    self.assertIsNone(model.GetTab(21))
+    self.assertIsNone(model.GetTab(31))
+
+    # Pruning two navigations from the front shifts the indices down.
+    tab = model.GetTab(11)
+    self.assertFalse(tab.pinned())
+    self.assertEqual(tab.session_storage_persistent_id(), 'storage-id')
+    self.assertEqual([navigation.index() for navigation in tab.navigations()], [0, 1, 2])
+    self.assertEqual([navigation.virtual_url() for navigation in tab.navigations()], [NavigationUrl(11, index) for index in (2, 3, 4)])
+    self.assertEqual(tab.current_navigation_index(), 1)
+    self.assertEqual(tab.current_navigation().virtual_url(), NavigationUrl(11, 3))
+
+    # Pruning from the back drops index 2 and after.
+    tab = model.GetTab(12)
+    self.assertTrue(tab.pinned())
+    self.assertEqual([navigation.index() for navigation in tab.navigations()], [0, 1])
+    self.assertEqual(tab.current_navigation().virtual_url(), NavigationUrl(12, 1))
+
+  def testCommandIdsDispatchOnSessionType(self):
+    # Ids 3 and 4 are kCommandWindow and kCommandSelectedNavigationInTab in
+    # tab restore files, and the obsolete closed commands in session files.
+    self.assertEqual((const.kCommandTabClosedObsolete, const.kCommandWindowClosedObsolete),
+                     (const.TabNavigation_kCommandWindow, const.TabNavigation_kCommandSelectedNavigationInTab))
+    builder = SessionModelBuilder(SessionType.SESSION_RESTORE)
+    builder.AddCommand(StructCommand(const.kCommandSetTabWindow, 'ii', 5, 6))
+    self.assertTrue(builder.AddCommand(StructCommand(const.kCommandTabClosedObsolete, 'i4xq', 6, kTimestamp)))
+    self.assertIsNone(builder.model().GetTab(6))
+    self.assertTrue(builder.AddCommand(StructCommand(const.kCommandWindowClosedObsolete, 'i4xq', 5, kTimestamp)))
+    self.assertIsNone(builder.model().GetWindow(5))
+    self.assertFalse(builder.AddCommand(StructCommand(const.TabNavigation_kCommandWindow, 'iii', 5, 0, 1)))
+
+    builder = SessionModelBuilder(SessionType.TAB_RESTORE)
+    self.assertTrue(builder.AddCommand(StructCommand(const.TabNavigation_kCommandWindow, 'iii', 5, 0, 1)))
+    self.assertTrue(builder.AddCommand(StructCommand(const.TabNavigation_kCommandSelectedNavigationInTab, 'ii', 6, 0)))
+    self.assertEqual([tab.tab_id() for tab in builder.model().GetWindow(5).tabs()], [6])
+    self.assertFalse(builder.AddCommand(StructCommand(const.kCommandTabClosedObsolete, 'i4xq', 6, kTimestamp)))
+
+    self.assertFalse(SessionModelBuilder.IsKnownCommand(SessionType.TAB_RESTORE, const.kCommandSessionStorageAssociated))
+    self.assertFalse(builder.AddCommand(IdAndStringCommand(const.kCommandSessionStorageAssociated, 6, 'storage-id')))
+    self.assertEqual(builder.failed_count(), 2)
+
+if __name__ == '__main__':
+  unittest.main()
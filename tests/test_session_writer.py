@@ -0,0 +1,130 @@
+import tempfile
+import unittest
+
+from sessionfixtures import kTitle, MakeNavigation, WriteSessionFile
+from chromepickle import Pickle, PickleIterator, FastPickleIterator
+from session import SessionCommand, SessionFileReader
+from constants import SessionType, SizeOf, PageTransition, const
+from tabnavigation import TabNavigation, LazyTabNavigation, CreateUpdateTabNavigationCommand
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Returns the persisted fields of |navigation|.
+def NavigationFields(navigation) -> tuple:
+  referrer = navigation.referrer()
+  return (navigation.index(), navigation.virtual_url(), navigation.title(), bytes(navigation.content_state()),
+          int(navigation.transition_type()), bool(navigation.has_post_data()),
+          None if referrer is None else (referrer.url_, int(referrer.policy_)),
+          navigation.original_request_url(), bool(navigation.is_overriding_user_agent()))
+
+# Reads the tab id and a |navigation_class| from each command of the file.
+def ReadNavigations(path : str, navigation_class = TabNavigation, iterator_class = PickleIterator) -> list:
+  reader = SessionFileReader(path)
+  navigations = []
+  for command in reader.IterCommands(SessionType.TAB_RESTORE):
+    iterator = iterator_class(command.PayloadAsPickle())
+    status, tab_id = iterator.ReadInt()
+    navigation = navigation_class()
+    if not status or not navigation.ReadFromPickle(iterator):
+      raise AssertionError('could not read navigation of command %d' % (command.command_id(),))
+    navigations.append((command.command_id(), tab_id, NavigationFields(navigation)))
+  reader.Close()
+  return navigations
+
+# Writes navigations with SessionFileWriter and TabNavigation.WriteToPickle,
+# and checks that SessionFileReader and ReadFromPickle return the same
+# fields.
+class SessionWriterRoundTripTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def testNavigationRoundTrip(self):
+    navigations = [MakeNavigation(index) for index in range(5)]
+    commands = [CreateUpdateTabNavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 7, navigation)
+                for navigation in navigations]
+    path = WriteSessionFile(self.directory_.name, commands)
+    expected = [(const.TabNavigation_kCommandUpdateTabNavigation, 7, NavigationFields(navigation)) for navigation in navigations]
+    for navigation_class in (TabNavigation, LazyTabNavigation):
+      for iterator_class in (PickleIterator, FastPickleIterator):
+        self.assertEqual(ReadNavigations(path, navigation_class, iterator_class), expected)
+
+  def testLegacyNavigationWithoutTypeMask(self):
+    pickle = Pickle()
+    pickle.WriteInt(7)
+    pickle.WriteInt(0)
+    pickle.WriteString('https://example.com/')
+    pickle.WriteString16(kTitle)
+    pickle.WriteData(b'state', 5)
+    pickle.WriteInt(int(PageTransition.PAGE_TRANSITION_TYPED))
+    path = WriteSessionFile(self.directory_.name, [SessionCommand(const.TabNavigation_kCommandUpdateTabNavigation, pickle)])
+    for navigation_class in (TabNavigation, LazyTabNavigation):
+      (command_id, tab_id, fields), = ReadNavigations(path, navigation_class, FastPickleIterator)
+      self.assertEqual(fields, (0, 'https://example.com/', kTitle, b'state', int(PageTransition.PAGE_TRANSITION_TYPED),
+                                False, None, None, False))
+
+  def testTruncatedTrailingCommandIsIgnored(self):
+    commands = [CreateUpdateTabNavigationCommand(const.TabNavigation_kCommandUpdateTabNavigation, 7, MakeNavigation(index))
+                for index in range(3)]
+    complete = WriteSessionFile(self.directory_.name, commands)
+    with open(complete, 'rb') as f:
+      data = f.read()
+    expected = ReadNavigations(complete)
+    last_size = commands[-1].size() + SizeOf.SIZE_TYPE + SizeOf.ID_TYPE
+    # Cut inside the size prefix, inside the id and inside the contents of
+    # the last command.
+    for cut in (1, last_size - 2, last_size - 1 - SizeOf.SIZE_TYPE - SizeOf.ID_TYPE):
+      with open(complete, 'wb') as f:
+        f.write(data[:len(data) - last_size + cut])
+      self.assertEqual(ReadNavigations(complete), expected[:-1])
+
+# Checks the lengths Pickle writes for UTF-16 and UTF-32 strings: they count
+# code units (characters for UTF-32), not bytes, so strings with characters
+# outside the BMP read back intact.
+class PickleStringTest(unittest.TestCase):
+  def testString16AndWStringRoundTrip(self):
+    values = ['', 'a', kTitle, '\U0001F600' * 3]
+    pickle = Pickle()
+    for value in values:
+      self.assertTrue(pickle.WriteString16(value))
+      self.assertTrue(pickle.WriteWString(value))
+    for iterator_class in (PickleIterator, FastPickleIterator):
+      iterator = iterator_class(Pickle(pickle.data()[:pickle.size()]))
+      for value in values:
+        self.assertEqual(iterator.ReadString16(), (True, value))
+        self.assertEqual(iterator.ReadWString(), (True, value))
+
+  def testString16LengthIsInCodeUnits(self):
+    pickle = Pickle()
+    pickle.WriteString16('\U0001F600')
+    status, length = PickleIterator(Pickle(pickle.data()[:pickle.size()])).ReadInt()
+    self.assertEqual((status, length), (True, 2))
+
+if __name__ == '__main__':
+  unittest.main()
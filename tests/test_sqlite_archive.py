@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import tarfile
+import tempfile
+import unittest
+
+from sessionfixtures import RunChromeTabs, WriteSyntheticSessionFile
+from constants import SessionType
+
+#
+# MIT License
+#
+# https://opensource.org/licenses/MIT
+#
+# Copyright 2020 Rene Sugar
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Exports a directory holding a tarball of two profiles with --sqlite, and
+# checks that every session file in the tarball gets its rows, named by the
+# tarball path followed by the member name.
+class SQLiteArchiveExportTest(unittest.TestCase):
+  def setUp(self):
+    self.directory_ = tempfile.TemporaryDirectory()
+    directory = self.directory_.name
+    for name, session_type in (('Current Tabs', SessionType.TAB_RESTORE), ('Current Session', SessionType.SESSION_RESTORE)):
+      WriteSyntheticSessionFile(directory, name, session_type, seed=1, windows=1, tabs_per_window=3, navigations_per_tab=4)
+    self.archive_path_ = os.path.join(directory, 'backup', 'profiles.tar.gz')
+    os.mkdir(os.path.dirname(self.archive_path_))
+    with tarfile.open(self.archive_path_, 'w:gz') as archive:
+      archive.add(os.path.join(directory, 'Current Tabs'), 'User1/Default/Current Tabs')
+      archive.add(os.path.join(directory, 'Current Session'), 'User2/Default/Current Session')
+    self.database_path_ = os.path.join(directory, 'export.db')
+
+  def tearDown(self):
+    self.directory_.cleanup()
+
+  def testExportsArchiveMembers(self):
+    process = RunChromeTabs('--path', os.path.dirname(self.archive_path_), '--sqlite', self.database_path_)
+    self.assertEqual(process.returncode, 0, process.stderr)
+
+    connection = sqlite3.connect(self.database_path_)
+    try:
+      rows = connection.execute("""SELECT files.path, files.session_type, COUNT(navigations.tab_id)
+                                   FROM files LEFT JOIN navigations USING (file_id)
+                                   GROUP BY files.path ORDER BY files.path""").fetchall()
+    finally:
+      connection.close()
+    self.assertEqual(rows, [
+      (os.path.join(self.archive_path_, 'User1/Default/Current Tabs'), int(SessionType.TAB_RESTORE), 12),
+      (os.path.join(self.archive_path_, 'User2/Default/Current Session'), int(SessionType.SESSION_RESTORE), 12),
+    ])
+
+if __name__ == '__main__':
+  unittest.main()